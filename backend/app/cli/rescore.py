@@ -0,0 +1,180 @@
+"""Re-score Listening/Reading of stored sessions with the current scoring rules.
+
+Use after changing answer normalization (bump ANSWER_KEY_VERSION in
+app/services/answer_key.py so stored answer keys are recompiled) or the
+LISTENING_BANDS/READING_BANDS tables. Sessions are streamed from the database in batches (keyset pagination
+on id), scored with BulkObjectiveScorer and written back with one bulk UPDATE
+per batch. final_results bands and overall are refreshed to match; the stored
+detailed analysis text is left as it was. Speaking/Writing (Gemini) scores are
+not touched.
+
+Run from backend/:
+    python -m app.cli.rescore --dry-run        # print what would change
+    python -m app.cli.rescore [--batch-size 1000] [--limit N]
+"""
+import argparse
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import or_, update
+
+from app.database import SessionLocal
+from app.models.test_session import TestSession, Phase
+from app.services.bulk_scoring import BulkObjectiveScorer
+
+OBJECTIVE_SKILL = {Phase.LISTENING_SPEAKING: "listening", Phase.READING_WRITING: "reading"}
+SKILLS = ("listening", "reading", "writing", "speaking")
+
+
+def phase_types(selected_phase: Optional[Phase]):
+    """(phase 1 type, phase 2 type) of a session"""
+    if selected_phase == Phase.LISTENING_SPEAKING:
+        return Phase.LISTENING_SPEAKING, Phase.READING_WRITING
+    if selected_phase == Phase.READING_WRITING:
+        return Phase.READING_WRITING, Phase.LISTENING_SPEAKING
+    return None, None
+
+
+def refresh_final_results(
+    final_results: Optional[Dict[str, Any]], skill: str, band: float
+) -> Optional[Dict[str, Any]]:
+    """Replace one skill band in final_results and recompute overall as aggregate_results does"""
+    if not final_results:
+        return final_results
+    final_results = dict(final_results)
+    final_results[skill] = band
+    final_results["overall"] = round(
+        sum(final_results.get(s, 0.0) for s in SKILLS) / 4.0, 1
+    )
+    return final_results
+
+
+def rescore_batch(scorer: BulkObjectiveScorer, rows) -> List[Dict[str, Any]]:
+    """New column values for the sessions of a batch whose objective scores changed"""
+    # Collect (row, phase number) per skill so each skill is scored in one call
+    pending = {"listening": [], "reading": []}
+    for i, row in enumerate(rows):
+        for phase, phase_type in enumerate(phase_types(row.selected_phase), start=1):
+            scores = getattr(row, f"phase{phase}_scores")
+            skill = OBJECTIVE_SKILL.get(phase_type)
+            if skill and scores and skill in scores:
+                pending[skill].append((i, phase))
+
+    updates: Dict[int, Dict[str, Any]] = {}
+    for skill, targets in pending.items():
+        if not targets:
+            continue
+        changed = scorer.rescore(
+            skill,
+            [
+                (
+                    getattr(rows[i], f"phase{phase}_content") or {},
+                    getattr(rows[i], f"phase{phase}_answers") or {},
+                )
+                for i, phase in targets
+            ],
+            [getattr(rows[i], f"phase{phase}_scores")[skill] for i, phase in targets],
+        )
+        for target, result in changed.items():
+            i, phase = targets[target]
+            row = rows[i]
+            change = updates.setdefault(
+                row.id,
+                {
+                    "id": row.id,
+                    "phase1_scores": row.phase1_scores,
+                    "phase2_scores": row.phase2_scores,
+                    "final_results": row.final_results,
+                    "diff": [],
+                },
+            )
+            old = change[f"phase{phase}_scores"][skill] or {}
+            change[f"phase{phase}_scores"] = {
+                **change[f"phase{phase}_scores"],
+                skill: result,
+            }
+            change["final_results"] = refresh_final_results(
+                change["final_results"], skill, result["band"]
+            )
+            change["diff"].append(
+                f"phase{phase} {skill}: raw {old.get('raw_score')} -> {result['raw_score']}, "
+                f"band {old.get('band')} -> {result['band']}"
+            )
+    return [change for change in updates.values() if change["diff"]]
+
+
+def run(batch_size: int, dry_run: bool, limit: Optional[int]) -> Dict[str, Any]:
+    scorer = BulkObjectiveScorer()
+    stats = {"scanned": 0, "changed": 0}
+    start = time.perf_counter()
+    last_id = 0
+    db = SessionLocal()
+    try:
+        while limit is None or stats["scanned"] < limit:
+            size = batch_size if limit is None else min(batch_size, limit - stats["scanned"])
+            rows = (
+                db.query(
+                    TestSession.id,
+                    TestSession.selected_phase,
+                    TestSession.phase1_content,
+                    TestSession.phase1_answers,
+                    TestSession.phase1_scores,
+                    TestSession.phase2_content,
+                    TestSession.phase2_answers,
+                    TestSession.phase2_scores,
+                    TestSession.final_results,
+                )
+                .filter(
+                    TestSession.id > last_id,
+                    or_(
+                        TestSession.phase1_scores.isnot(None),
+                        TestSession.phase2_scores.isnot(None),
+                    ),
+                )
+                .order_by(TestSession.id)
+                .limit(size)
+                .all()
+            )
+            if not rows:
+                break
+            last_id = rows[-1].id
+            stats["scanned"] += len(rows)
+
+            changes = rescore_batch(scorer, rows)
+            stats["changed"] += len(changes)
+            for change in changes:
+                for line in change.pop("diff"):
+                    if dry_run:
+                        print(f"session {change['id']} {line}")
+            if changes and not dry_run:
+                db.execute(update(TestSession), changes)
+                db.commit()
+            print(f"... {stats['scanned']} sessions scanned, {stats['changed']} changed")
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = round(elapsed, 2)
+    stats["sessions_per_second"] = round(stats["scanned"] / elapsed) if elapsed else 0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--dry-run", action="store_true", help="print the changes without writing them"
+    )
+    parser.add_argument("--limit", type=int, help="stop after this many sessions")
+    args = parser.parse_args()
+
+    stats = run(args.batch_size, args.dry_run, args.limit)
+    verb = "would change" if args.dry_run else "changed"
+    print(
+        f"{stats['scanned']} sessions scanned, {stats['changed']} {verb} "
+        f"in {stats['seconds']}s ({stats['sessions_per_second']} sessions/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,50 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 import os
+import time
+import logging
 from dotenv import load_dotenv
+from app.metrics import DB_POOL_CHECKED_OUT, DB_POOL_CHECKOUT_WAIT
+from app.serialization import loads
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits (db_pool_checkout_wait_seconds)"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test_session.db")
 
+# Connection pool sizing. Handlers release their connection while waiting on the
+# LLM, so a small pool serves many concurrent sessions; a request that finds it
+# exhausted waits up to DB_POOL_TIMEOUT seconds before failing
+POOL_SETTINGS = {
+    "poolclass": TimedQueuePool,
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+}
+
 # Use SQLite for development, PostgreSQL for production (Railway/Render)
 if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        json_deserializer=loads,  # JSON columns hold whole tests; orjson parses them much faster
+        **POOL_SETTINGS,
+    )
 elif DATABASE_URL.startswith("postgresql") or DATABASE_URL.startswith("postgres"):
     # PostgreSQL connection with pooling for serverless
     # Railway automatically provides DATABASE_URL if PostgreSQL service is added
@@ -19,19 +53,50 @@ elif DATABASE_URL.startswith("postgresql") or DATABASE_URL.startswith("postgres"
             DATABASE_URL,
             pool_pre_ping=True,  # Verify connections before using
             pool_recycle=300,    # Recycle connections after 5 minutes
+            json_deserializer=loads,
+            **POOL_SETTINGS,
         )
     except Exception as e:
-        print(f"Error creating PostgreSQL engine: {e}")
-        print("Falling back to SQLite...")
+        logger.error("Error creating PostgreSQL engine: %s", e)
+        logger.warning("Falling back to SQLite...")
         # Fallback to SQLite if PostgreSQL fails
-        engine = create_engine("sqlite:///./test_session.db", connect_args={"check_same_thread": False})
+        engine = create_engine(
+            "sqlite:///./test_session.db",
+            connect_args={"check_same_thread": False},
+            json_deserializer=loads,
+            **POOL_SETTINGS,
+        )
 else:
-    engine = create_engine(DATABASE_URL)
+    engine = create_engine(DATABASE_URL, json_deserializer=loads, **POOL_SETTINGS)
+
+DB_POOL_CHECKED_OUT.function = lambda: engine.pool.checkedout()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def add_missing_columns():
+    """Add nullable columns that were added to models after their table was created.
+
+    create_all only creates missing tables, so existing databases would otherwise
+    lack new columns. Run after create_all at startup.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(
+                    text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+                )
+                logger.info("Added column %s.%s", table.name, column.name)
+
+
 def get_db():
     """Dependency to get database session"""
     db = SessionLocal()
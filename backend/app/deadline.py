@@ -0,0 +1,53 @@
+"""Deadlines carried through a request (or background job) down to the LLM calls.
+
+The absolute deadline (time.monotonic()) lives in a contextvar: set by
+RequestContextMiddleware for HTTP requests and by the job queue for jobs, and
+inherited by every task created underneath. LLM backends bound each call by
+the earlier of this deadline and the per-purpose timeout (see LLMBackend.call_deadline).
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """Code in the block must finish within `seconds`.
+
+    Never extends an enclosing deadline; None or <= 0 keeps the current one.
+    """
+    at = current_deadline()
+    if seconds is not None and seconds > 0:
+        own = time.monotonic() + seconds
+        at = own if at is None else min(at, own)
+    token = _deadline.set(at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def detached_deadline(seconds: Optional[float]):
+    """Like deadline, but replaces the enclosing deadline instead of tightening it
+    (None or <= 0: no deadline). For work shared by several requests, which must
+    not be cut short by the limit of the one that happened to start it."""
+    at = time.monotonic() + seconds if seconds is not None and seconds > 0 else None
+    token = _deadline.set(at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def current_deadline() -> Optional[float]:
+    """Absolute deadline (time.monotonic()) of the current context, None if unbounded"""
+    return _deadline.get()
+
+
+def time_left(at: float) -> float:
+    """Seconds until `at` (never negative)"""
+    return max(at - time.monotonic(), 0.0)
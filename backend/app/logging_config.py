@@ -0,0 +1,161 @@
+"""Structured logging that stays off the request thread.
+
+Application loggers (`logging.getLogger(__name__)` under `app.`) hand records to
+a bounded in-memory queue; a background listener thread formats them (JSON by
+default) and writes them to stdout. Every line carries the request id, session
+id and Gemini key index of the code that logged it, taken from contextvars set
+by RequestContextMiddleware, the job queue and GeminiService.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+from dotenv import load_dotenv
+
+from app.metrics import LOG_RECORDS_DROPPED
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # json | text
+# Share of requests whose DEBUG/INFO lines are kept (warnings and errors always are)
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+CONTEXT_FIELDS = ("request_id", "session_id", "key_index")
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+session_id_var: ContextVar[Optional[int]] = ContextVar("session_id", default=None)
+key_index_var: ContextVar[Optional[int]] = ContextVar("key_index", default=None)
+_vars = {
+    "request_id": request_id_var,
+    "session_id": session_id_var,
+    "key_index": key_index_var,
+}
+
+
+@contextmanager
+def log_context(**fields):
+    """Attach request_id / session_id / key_index to every line logged inside the block.
+
+    Not for use across `yield` in async generators: pass `extra={"key_index": ...}` there.
+    """
+    tokens = [(_vars[name], _vars[name].set(value)) for name, value in fields.items()]
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def _sampled(request_id: Optional[str]) -> bool:
+    """Keep all or none of a request's lines, so a kept request reads end to end"""
+    if LOG_SAMPLE_RATE >= 1.0:
+        return True
+    if request_id is None:
+        return random.random() < LOG_SAMPLE_RATE
+    return (zlib.crc32(request_id.encode()) % 10000) < LOG_SAMPLE_RATE * 10000
+
+
+class ContextFilter(logging.Filter):
+    """Copy the context fields onto the record and apply sampling (runs on the caller's thread)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for name, var in _vars.items():
+            if getattr(record, name, None) is None:
+                setattr(record, name, var.get())
+        if record.levelno >= logging.WARNING:
+            return True
+        return _sampled(record.request_id)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only merge the message arguments here; tracebacks are formatted by
+        # the listener thread (the queue never leaves the process)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for name in CONTEXT_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s%(context)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        context = " ".join(
+            f"{name}={getattr(record, name)}"
+            for name in CONTEXT_FIELDS
+            if getattr(record, name, None) is not None
+        )
+        record.context = f" [{context}]" if context else ""
+        return super().format(record)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging():
+    """Install the queue handler on the `app` logger and start the writer thread (idempotent)"""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JSONFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+        log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        handler = _QueueHandler(log_queue)
+        handler.addFilter(ContextFilter())
+
+        logger = logging.getLogger("app")
+        logger.setLevel(LOG_LEVEL)
+        logger.addHandler(handler)
+        logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, output)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
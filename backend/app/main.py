@@ -1,20 +1,49 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
+from fastapi.responses import PlainTextResponse
+from app import metrics
+from app.logging_config import configure_logging
+
+# Before the other app modules, which log while being imported
+configure_logging()
+
+from app.database import engine, Base, add_missing_columns
 from app.routes.test_session import router
+from app.routes.jobs import router as jobs_router
+from app.middleware import (
+    CompressionMiddleware,
+    IdempotencyMiddleware,
+    MetricsMiddleware,
+    RequestContextMiddleware,
+)
+from app.serialization import FastJSONResponse
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+add_missing_columns()
 
 app = FastAPI(
     title="IELTS Test API",
     description="API for IELTS Test with Gemini AI",
     version="1.0.0",
+    default_response_class=FastJSONResponse,
 )
 
-# CORS middleware
 import os
 
+# Innermost: retries with the same Idempotency-Key get the stored (uncompressed) response
+app.add_middleware(IdempotencyMiddleware)
+
+# Compress responses (brotli if installed, else gzip) above a size threshold
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024")),
+    gzip_level=int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+    brotli_quality=int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5")),
+)
+
+# CORS middleware
+
 allowed_origins = [
     "http://localhost:3000",
     "http://localhost:3001",
@@ -44,10 +73,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Idempotent-Replayed"],
+)
+
+# Per-route latency and in-flight requests for GET /metrics (wraps everything
+# but RequestContextMiddleware, so its log lines carry the request id)
+app.add_middleware(MetricsMiddleware, routes=app.router.routes)
+# Outermost (added last): request id / session id on every log line of the
+# request, and its deadline for LLM calls
+app.add_middleware(
+    RequestContextMiddleware,
+    timeout=float(os.getenv("REQUEST_TIMEOUT", "150")),
 )
 
 # Include routers
 app.include_router(router, prefix="/api", tags=["test-session"])
+app.include_router(jobs_router, prefix="/api", tags=["jobs"])
 
 
 @app.get("/")
@@ -58,3 +99,9 @@ def read_root():
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
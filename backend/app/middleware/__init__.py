@@ -0,0 +1,11 @@
+from .compression import CompressionMiddleware
+from .idempotency import IdempotencyMiddleware
+from .metrics import MetricsMiddleware
+from .request_context import RequestContextMiddleware
+
+__all__ = [
+    "CompressionMiddleware",
+    "IdempotencyMiddleware",
+    "MetricsMiddleware",
+    "RequestContextMiddleware",
+]
@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.idempotency import (
+    DONE,
+    MISMATCH,
+    NEW,
+    IdempotencyStore,
+    StoredResponse,
+)
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+REPLAYED_HEADER = "idempotent-replayed"
+IDEMPOTENT_METHODS = ("POST", "PATCH")
+# Keys are client supplied: bound their length
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyMiddleware:
+    """Run a POST/PATCH sent with an Idempotency-Key header once; repeats get its response.
+
+    The response (status, headers, body) is stored per method, path and key,
+    and replayed with an Idempotent-Replayed header to any later request with
+    the same key. A duplicate that arrives while the first request is still
+    running waits for it and shares its response, in this process (one
+    future per key) or in another one (polling the stored row). Reusing a key
+    with a different body is rejected with 422. Server errors are not stored,
+    so a retry runs the request again.
+    """
+
+    def __init__(self, app: ASGIApp, store: Optional[IdempotencyStore] = None):
+        self.app = app
+        self.store = store or IdempotencyStore()
+        self.poll_interval = 0.25
+        # Record id -> (request hash, response of the request in flight in this process)
+        self._inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in IDEMPOTENT_METHODS:
+            await self.app(scope, receive, send)
+            return
+        key = Headers(scope=scope).get(IDEMPOTENCY_HEADER)
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await _send_error(send, 400, f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters")
+            return
+
+        body = await _read_body(receive)
+        request_hash = hashlib.sha256(body).hexdigest()
+        query = scope.get("query_string", b"").decode("latin-1")
+        record_id = hashlib.sha256(
+            f"{scope['method']} {scope['path']}?{query} {key}".encode("utf-8")
+        ).hexdigest()
+
+        inflight = self._inflight.get(record_id)
+        if inflight is not None:
+            inflight_hash, future = inflight
+            if inflight_hash != request_hash:
+                await _send_mismatch(send)
+                return
+            response = await asyncio.shield(future)
+            await _replay(send, response)
+            return
+
+        waited = 0.0
+        while True:
+            state, response = await asyncio.to_thread(self.store.begin, record_id, request_hash)
+            if state == NEW:
+                break
+            if state == MISMATCH:
+                await _send_mismatch(send)
+                return
+            if state == DONE:
+                await _replay(send, response)
+                return
+            # Running in another process
+            if waited >= self.store.lock_timeout:
+                await _send_error(
+                    send, 409, "A request with this Idempotency-Key is still in progress"
+                )
+                return
+            await asyncio.sleep(self.poll_interval)
+            waited += self.poll_interval
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[record_id] = (request_hash, future)
+        try:
+            response = await self._run(scope, body, receive, send)
+        except BaseException as e:
+            await asyncio.to_thread(self.store.abandon, record_id)
+            future.set_exception(e if isinstance(e, Exception) else RuntimeError("Request cancelled"))
+            # Nobody may be waiting for it
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(record_id, None)
+
+        status_code, _, response_body = response
+        if status_code < 500 and len(response_body) <= self.store.max_body_size:
+            await asyncio.to_thread(self.store.complete, record_id, response)
+        else:
+            await asyncio.to_thread(self.store.abandon, record_id)
+        future.set_result(response)
+
+    async def _run(self, scope: Scope, body: bytes, receive: Receive, send: Send) -> StoredResponse:
+        """Run the request, sending its response while keeping a copy"""
+        status_code = 500
+        headers: List[List[str]] = []
+        chunks: List[bytes] = []
+        body_sent = False
+
+        async def receive_wrapper() -> Message:
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code, headers
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = [
+                    [name.decode("latin-1"), value.decode("latin-1")]
+                    for name, value in message.get("headers", [])
+                ]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive_wrapper, send_wrapper)
+        return status_code, headers, b"".join(chunks)
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+async def _replay(send: Send, response: StoredResponse):
+    status_code, headers, body = response
+    raw_headers = [
+        (name.encode("latin-1"), value.encode("latin-1")) for name, value in headers
+    ]
+    raw_headers.append((REPLAYED_HEADER.encode(), b"true"))
+    await send({"type": "http.response.start", "status": status_code, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_error(send: Send, status_code: int, detail: str):
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_mismatch(send: Send):
+    await _send_error(send, 422, "Idempotency-Key was already used with a different request body")
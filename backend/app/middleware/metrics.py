@@ -0,0 +1,59 @@
+import time
+from typing import Sequence
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT
+
+
+def route_template(routes: Sequence[BaseRoute], scope: Scope) -> str:
+    """Path template of the route serving a request ("/api/sessions/{session_id}"),
+    so that metrics have one series per route instead of one per session id"""
+    partial = None
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+        if match == Match.PARTIAL and partial is None:
+            partial = getattr(route, "path", None)  # e.g. wrong method -> 405
+    return partial or "unmatched"
+
+
+class MetricsMiddleware:
+    """Per-route latency histogram and in-flight gauge for HTTP requests.
+
+    Wraps every middleware but RequestContextMiddleware (see app.main): timings
+    include compression and, for event streams, the whole stream.
+    """
+
+    def __init__(self, app: ASGIApp, routes: Sequence[BaseRoute]):
+        self.app = app
+        self.routes = routes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(self.routes, scope)
+        status = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        HTTP_REQUESTS_IN_FLIGHT.inc(method=method, route=route)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec(method=method, route=route)
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                method=method,
+                route=route,
+                status=str(status),
+            )
@@ -0,0 +1,66 @@
+import re
+import uuid
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.deadline import deadline
+from app.logging_config import log_context
+
+REQUEST_ID_HEADER = "x-request-id"
+# Lets a client with a shorter timeout of its own tighten the request deadline
+REQUEST_TIMEOUT_HEADER = "x-request-timeout"
+_SESSION_PATH = re.compile(r"/sessions/(\d+)")
+# Client-supplied ids are echoed into logs: keep them short and printable
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+
+class RequestContextMiddleware:
+    """Give every request an id (X-Request-ID, generated if missing or malformed)
+    and expose it, with the session id from the path, to the logging context.
+
+    The id is returned in the X-Request-ID response header so client reports
+    can be matched with server logs. The request also gets a deadline for the
+    LLM calls made on its behalf: `timeout` seconds, or the X-Request-Timeout
+    header if the client sends a shorter one.
+    """
+
+    def __init__(self, app: ASGIApp, timeout: float = 0):
+        self.app = app
+        self.timeout = timeout
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        timeout = self.timeout
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER.encode():
+                request_id = value.decode("latin-1")
+            elif name == REQUEST_TIMEOUT_HEADER.encode():
+                timeout = _client_timeout(value, timeout)
+        if not request_id or not _VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex[:16]
+
+        match = _SESSION_PATH.search(scope["path"])
+        session_id = int(match.group(1)) if match else None
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[REQUEST_ID_HEADER] = request_id
+            await send(message)
+
+        with log_context(request_id=request_id, session_id=session_id), deadline(timeout):
+            await self.app(scope, receive, send_wrapper)
+
+
+def _client_timeout(value: bytes, timeout: float) -> float:
+    """The X-Request-Timeout header, if valid and shorter than the server's timeout"""
+    try:
+        seconds = float(value)
+    except ValueError:
+        return timeout
+    if seconds <= 0 or seconds != seconds:
+        return timeout
+    return seconds if timeout <= 0 else min(seconds, timeout)
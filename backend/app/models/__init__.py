@@ -1,4 +1,17 @@
 from .test_session import TestSession
+from .content_pool import ContentPoolItem
+from .job import Job
+from .llm_cache import LLMCacheEntry
+from .llm_usage import LLMUsage
+from .lease import Lease
+from .idempotency import IdempotencyRecord
 
-__all__ = ["TestSession"]
-
+__all__ = [
+    "TestSession",
+    "ContentPoolItem",
+    "Job",
+    "LLMCacheEntry",
+    "LLMUsage",
+    "Lease",
+    "IdempotencyRecord",
+]
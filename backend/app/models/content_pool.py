@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, DateTime, JSON, Enum, Index
+from sqlalchemy.sql import func
+from app.database import Base
+from app.models.test_session import Level, Phase
+
+
+class ContentPoolItem(Base):
+    """Pre-generated test content waiting to be handed out to a session"""
+
+    __tablename__ = "content_pool"
+
+    id = Column(Integer, primary_key=True, index=True)
+    level = Column(Enum(Level), nullable=False)
+    phase = Column(Enum(Phase), nullable=False)
+    content = Column(JSON, nullable=False)
+    # Set for speculative phase 2 content generated for one session: only that
+    # session can claim it until it is released back to the shared pool
+    session_id = Column(Integer, nullable=True, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (Index("ix_content_pool_level_phase", "level", "phase"),)
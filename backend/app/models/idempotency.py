@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, LargeBinary
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class IdempotencyRecord(Base):
+    """Response stored for an Idempotency-Key, replayed to retries of the request"""
+
+    __tablename__ = "idempotency_keys"
+
+    # sha256 of method, path and the client's key
+    id = Column(String(64), primary_key=True)
+    # sha256 of the request body: the same key with another body is rejected
+    request_hash = Column(String(64), nullable=False)
+    # NULL while the first request is still running
+    status_code = Column(Integer, nullable=True)
+    headers = Column(JSON, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
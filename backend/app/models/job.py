@@ -0,0 +1,58 @@
+from sqlalchemy import Column, Integer, DateTime, Text, Enum, Index, text
+from sqlalchemy.sql import func
+from app.database import Base
+import enum
+
+
+class JobKind(str, enum.Enum):
+    SCORE_PHASE1 = "score_phase1"
+    SCORE_PHASE2 = "score_phase2"
+    # Jobs of this kind are from before band aggregation became synchronous;
+    # they run the same as ANALYSIS
+    AGGREGATE = "aggregate"
+    ANALYSIS = "analysis"
+    # Speculative: phase 2 content built while the learner works on phase 1
+    GENERATE_PHASE2 = "generate_phase2"
+
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class Job(Base):
+    """Background job (scoring/analysis/generation) persisted in the database"""
+
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, nullable=False, index=True)
+    # Stored as plain strings so new kinds don't need a database enum migration
+    kind = Column(Enum(JobKind, native_enum=False, length=32), nullable=False)
+    status = Column(
+        Enum(JobStatus, native_enum=False, length=16),
+        nullable=False,
+        default=JobStatus.QUEUED,
+    )
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_jobs_status_id", "status", "id"),
+        # At most one live (not failed) job per session and kind; see JobQueue.enqueue.
+        # Enum columns store the member name
+        Index(
+            "uq_jobs_session_kind_live",
+            "session_id",
+            "kind",
+            unique=True,
+            postgresql_where=text(f"status != '{JobStatus.FAILED.name}'"),
+            sqlite_where=text(f"status != '{JobStatus.FAILED.name}'"),
+        ),
+    )
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, DateTime
+from app.database import Base
+
+
+class Lease(Base):
+    """Named lock shared by all API processes, held until released or expired"""
+
+    __tablename__ = "leases"
+
+    name = Column(String(128), primary_key=True)
+    # Random token of the holder: only it can release the lease
+    token = Column(String(32), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, String, DateTime, Text
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class LLMCacheEntry(Base):
+    """Cached Gemini response, addressed by a hash of model, prompt and generation config"""
+
+    __tablename__ = "llm_cache_entries"
+
+    key = Column(String(64), primary_key=True)
+    response = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
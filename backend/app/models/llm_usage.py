@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class LLMUsage(Base):
+    """Token counts of one LLM call, attributed to the session it was made for"""
+
+    __tablename__ = "llm_usage"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # None for calls made outside a session (content pool refills, warm-up)
+    session_id = Column(Integer, nullable=True)
+    purpose = Column(String(64), nullable=False)
+    backend = Column(String(32), nullable=False)
+    model = Column(String(64), nullable=True)
+    key_index = Column(Integer, nullable=True)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    # Includes thinking tokens, which are billed as output
+    output_tokens = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(Integer, nullable=False, default=0)
+    latency_ms = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    __table_args__ = (Index("ix_llm_usage_session_id", "session_id"),)
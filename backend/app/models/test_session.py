@@ -1,4 +1,5 @@
 from sqlalchemy import Column, Integer, String, DateTime, JSON, Enum
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
@@ -37,18 +38,25 @@ class TestSession(Base):
     selected_phase = Column(Enum(Phase), nullable=True)
     status = Column(Enum(SessionStatus), default=SessionStatus.INITIALIZED)
     
+    # The JSON blobs are deferred: they are only loaded when accessed or
+    # explicitly requested with undefer(), so status checks stay cheap.
+
     # Phase 1 data
-    phase1_content = Column(JSON, nullable=True)  # Generated questions/content
-    phase1_answers = Column(JSON, nullable=True)  # User answers
-    phase1_scores = Column(JSON, nullable=True)  # Scoring results
+    phase1_content = deferred(Column(JSON, nullable=True))  # Generated questions/content
+    phase1_answers = deferred(Column(JSON, nullable=True))  # User answers
+    phase1_scores = deferred(Column(JSON, nullable=True))  # Scoring results
     
     # Phase 2 data
-    phase2_content = Column(JSON, nullable=True)
-    phase2_answers = Column(JSON, nullable=True)
-    phase2_scores = Column(JSON, nullable=True)
+    phase2_content = deferred(Column(JSON, nullable=True))
+    phase2_answers = deferred(Column(JSON, nullable=True))
+    phase2_scores = deferred(Column(JSON, nullable=True))
+    
+    # sha256 of the content, used as its ETag (content never changes once stored)
+    phase1_content_hash = Column(String(64), nullable=True)
+    phase2_content_hash = Column(String(64), nullable=True)
     
     # Final results
-    final_results = Column(JSON, nullable=True)  # Aggregated IELTS scores
+    final_results = deferred(Column(JSON, nullable=True))  # Aggregated IELTS scores
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -1,4 +1,4 @@
 from .test_session import router
+from .jobs import router as jobs_router
 
-__all__ = ["router"]
-
+__all__ = ["router", "jobs_router"]
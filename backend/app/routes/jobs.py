@@ -0,0 +1,68 @@
+import os
+import json
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.database import get_db, SessionLocal
+from app.models.job import Job, JobStatus
+from app.schemas.job import JobResponse
+from app.routes.sse import sse_event, sse_response
+
+router = APIRouter()
+
+# How often the SSE stream re-reads the job, and how often it sends a keep-alive
+SSE_POLL_INTERVAL = float(os.getenv("JOB_SSE_POLL_INTERVAL", "0.5"))
+SSE_KEEPALIVE_SECONDS = 15.0
+
+
+def _load_job(job_id: int) -> Optional[JobResponse]:
+    db = SessionLocal()
+    try:
+        job = db.query(Job).filter(Job.id == job_id).first()
+        return JobResponse.model_validate(job) if job else None
+    finally:
+        db.close()
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    """Lấy trạng thái job chấm điểm/phân tích"""
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: int, request: Request):
+    """Server-Sent Events: gửi `status` mỗi khi job thay đổi, đóng stream khi job kết thúc
+    (hoặc gửi `error` nếu job bị xoá)"""
+    if await asyncio.to_thread(_load_job, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        last_payload = None
+        idle = 0.0
+        while not await request.is_disconnected():
+            job = await asyncio.to_thread(_load_job, job_id)
+            if job is None:
+                # Deleted meanwhile (e.g. with its session)
+                yield sse_event("error", json.dumps({"detail": "Job not found"}))
+                break
+            payload = job.model_dump_json()
+            if payload != last_payload:
+                last_payload = payload
+                idle = 0.0
+                yield sse_event("status", payload)
+            elif idle >= SSE_KEEPALIVE_SECONDS:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+
+            if job.status in (JobStatus.SUCCEEDED, JobStatus.FAILED):
+                break
+            await asyncio.sleep(SSE_POLL_INTERVAL)
+            idle += SSE_POLL_INTERVAL
+
+    return sse_response(events())
@@ -0,0 +1,14 @@
+from typing import AsyncIterator
+from fastapi.responses import StreamingResponse
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(event: str, data: str) -> str:
+    """Format one Server-Sent Event (data must be a single line, e.g. compact JSON)"""
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """Stream Server-Sent Events without proxy buffering"""
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
@@ -1,24 +1,288 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.orm import Session, undefer
 from datetime import datetime
-from typing import Dict, Any
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.models.test_session import TestSession, Level, Phase, SessionStatus
+from app.models.job import Job, JobKind, JobStatus
+from app.models.content_pool import ContentPoolItem
 from app.schemas.test_session import (
     SessionCreate,
     SessionResponse,
     PhaseSelection,
     AnswersSubmit,
+    AnswersPatch,
     SessionStatusResponse,
+    SessionSummaryResponse,
+    AnalysisStatusResponse,
 )
+from app.schemas.job import JobResponse
+from app.schemas.usage import SessionUsageResponse
 from app.services.test_generator import TestGeneratorService
 from app.services.scoring_service import ScoringService
+from app.services.content_pool import ContentPoolService
+from app.services.job_queue import JobQueue
+from app.services.llm_backend import PURPOSE_TIMEOUTS
+from app.services.single_flight import SingleFlight
+from app.services.usage import usage_recorder
+from app.services.json_stream import iter_sections, path_to_str
+from app.routes.sse import sse_event, sse_response
+from app.serialization import FastJSONResponse, model_response
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 test_generator = TestGeneratorService()
 scoring_service = ScoringService()
+content_pool = ContentPoolService(test_generator)
+job_queue = JobQueue()
+# One generation per session and phase, however many requests ask for it at once
+single_flight = SingleFlight()
+
+# Keeps streaming generation tasks alive after the client disconnects
+_background_tasks = set()
+
+# Speculative phase 2 generation running in this process, by session id
+_phase2_prefetch: Dict[int, asyncio.Future] = {}
+
+
+# JSON columns serialized by SessionResponse (answers are not part of it); the
+# blobs are deferred on the model, so endpoints returning a session load them
+# together with the row instead of one query per column
+SESSION_RESPONSE_LOAD = [
+    undefer(TestSession.phase1_content),
+    undefer(TestSession.phase2_content),
+    undefer(TestSession.phase1_scores),
+    undefer(TestSession.phase2_scores),
+    undefer(TestSession.final_results),
+]
+
+
+# Generated content never changes, so clients may cache it for good
+CONTENT_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+# Generation ran past its deadline (LLM_TIMEOUT_GENERATE or the request's), raised as
+# LLMTimeoutError or, for a request waiting on a shared generation, TimeoutError: 504, safe to retry
+GENERATION_TIMEOUT_DETAIL = "Generation timed out, please try again"
+
+
+def content_hash(content: Dict[str, Any]) -> str:
+    """Stable hash of generated content, used as its ETag"""
+    canonical = json.dumps(
+        content, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def set_phase_content(session: TestSession, phase: int, content: Dict[str, Any]):
+    """Store phase 1/2 content together with its hash"""
+    if phase == 1:
+        session.phase1_content = content
+        session.phase1_content_hash = content_hash(content)
+    else:
+        session.phase2_content = content
+        session.phase2_content_hash = content_hash(content)
+
+
+def merge_answers(
+    stored: Optional[Dict[str, Any]], delta: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Apply an answers delta: set changed answers, drop those sent as null"""
+    merged = dict(stored or {})
+    for key, value in delta.items():
+        if value is None:
+            merged.pop(key, None)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(
+        tag.removeprefix("W/") == etag for tag in candidates
+    )
+
+
+def get_phase2_type(selected_phase: Phase) -> Phase:
+    """Phase 2 is whichever phase was not selected first"""
+    return (
+        Phase.READING_WRITING
+        if selected_phase == Phase.LISTENING_SPEAKING
+        else Phase.LISTENING_SPEAKING
+    )
+
+
+# Handlers that await the LLM do their database work in short transactions on
+# either side of the call (run in a worker thread): a connection is only
+# checked out for the read and for the write, never while waiting on Gemini
+
+
+def _read_session(session_id: int, *options) -> Optional[TestSession]:
+    """Load a session in a short transaction of its own; the returned object is
+    detached, so pass options for every deferred column the caller reads"""
+    db = SessionLocal()
+    try:
+        return (
+            db.query(TestSession)
+            .options(*options)
+            .filter(TestSession.id == session_id)
+            .first()
+        )
+    finally:
+        db.close()
+
+
+async def _take_speculative_phase2(session_id: int) -> Optional[Dict[str, Any]]:
+    """Phase 2 content generated for the session during phase 1, if any.
+
+    Waits for the generation if it is still running in this process: it started
+    earlier than anything this request could start now.
+    """
+    pending = _phase2_prefetch.get(session_id)
+    if pending is not None:
+        # Shielded: a client disconnect must not cancel the shared generation
+        await asyncio.shield(pending)
+    return await content_pool.atake_reserved(session_id)
+
+
+def _read_prefetch_target(session_id: int) -> Optional[Tuple[Level, Phase]]:
+    """(level, phase 2 type) if phase 2 content should be built speculatively:
+    phase 1 is under way and the session has no phase 2 content, reserved or stored"""
+    db = SessionLocal()
+    try:
+        row = (
+            db.query(
+                TestSession.level,
+                TestSession.selected_phase,
+                TestSession.status,
+                TestSession.phase2_content.isnot(None),
+            )
+            .filter(TestSession.id == session_id)
+            .first()
+        )
+        if row is None:
+            return None
+        level, selected_phase, status, has_phase2 = row
+        if has_phase2 or status not in (
+            SessionStatus.PHASE1_IN_PROGRESS,
+            SessionStatus.PHASE1_COMPLETED,
+        ):
+            return None
+        reserved = (
+            db.query(ContentPoolItem.id)
+            .filter(ContentPoolItem.session_id == session_id)
+            .first()
+        )
+        if reserved is not None:
+            return None
+        return level, get_phase2_type(selected_phase)
+    finally:
+        db.close()
+
+
+def _store_scores(session_id: int, phase: int, scores: Dict[str, Any]):
+    """Save phase 1/2 scores unless a concurrent run saved them first"""
+    db = SessionLocal()
+    try:
+        session, has_phase1, has_phase2 = (
+            db.query(
+                TestSession,
+                TestSession.phase1_scores.isnot(None),
+                TestSession.phase2_scores.isnot(None),
+            )
+            .filter(TestSession.id == session_id)
+            .first()
+        )
+        if phase == 1 and not has_phase1:
+            session.phase1_scores = scores
+            session.status = SessionStatus.PHASE1_COMPLETED
+        elif phase == 2 and not has_phase2:
+            session.phase2_scores = scores
+            session.status = SessionStatus.PHASE2_COMPLETED
+        db.commit()
+    finally:
+        db.close()
+
+
+def _aggregate_bands(db: Session, session_id: int, queue_analysis: bool = True):
+    """Store the band scores (arithmetic only, no LLM) as final_results and queue
+    the detailed analysis, which is added to them when ready. Commits."""
+    session = (
+        db.query(TestSession)
+        .options(
+            undefer(TestSession.phase1_scores),
+            undefer(TestSession.phase2_scores),
+            undefer(TestSession.final_results),
+        )
+        .filter(TestSession.id == session_id)
+        .with_for_update()
+        .first()
+    )
+    if not session.final_results:
+        session.final_results = scoring_service.aggregate_results(
+            session.phase1_scores,
+            session.phase2_scores,
+            session.selected_phase,
+            get_phase2_type(session.selected_phase),
+        )
+        session.status = SessionStatus.COMPLETED
+    if queue_analysis:
+        job_queue.enqueue(db, session_id, JobKind.ANALYSIS)
+    else:
+        db.commit()
+
+
+def _store_bands(session_id: int, queue_analysis: bool = True):
+    """_aggregate_bands in a short session of its own"""
+    db = SessionLocal()
+    try:
+        _aggregate_bands(db, session_id, queue_analysis)
+    finally:
+        db.close()
+
+
+def _store_detailed_analysis(session_id: int, detailed_analysis: Dict[str, Any]):
+    """Add detailed analysis to the saved final results"""
+    db = SessionLocal()
+    try:
+        session = (
+            db.query(TestSession)
+            .options(undefer(TestSession.final_results))
+            .filter(TestSession.id == session_id)
+            .first()
+        )
+        # Assign a new dict: in-place changes to a JSON column are not persisted
+        session.final_results = {
+            **session.final_results,
+            "detailed_analysis": detailed_analysis,
+        }
+        db.commit()
+    finally:
+        db.close()
+
+
+@router.on_event("startup")
+async def start_background_workers():
+    await test_generator.llm.awarm_up()
+    content_pool.start()
+    usage_recorder.start()
+    await job_queue.start()
+
+
+@router.on_event("shutdown")
+async def stop_background_workers():
+    content_pool.stop()
+    await job_queue.stop()
+    usage_recorder.stop()
 
 
 @router.post("/sessions", response_model=SessionResponse)
@@ -27,8 +291,14 @@ def create_session(session_data: SessionCreate, db: Session = Depends(get_db)):
     session = TestSession(level=session_data.level, status=SessionStatus.INITIALIZED)
     db.add(session)
     db.commit()
-    db.refresh(session)
-    return session
+    # Reload with the response columns in one query (they are deferred on the model)
+    session = (
+        db.query(TestSession)
+        .options(*SESSION_RESPONSE_LOAD)
+        .filter(TestSession.id == session.id)
+        .first()
+    )
+    return model_response(SessionResponse, session)
 
 
 @router.post("/sessions/{session_id}/select-phase", response_model=SessionResponse)
@@ -36,7 +306,12 @@ def select_phase(
     session_id: int, phase_data: PhaseSelection, db: Session = Depends(get_db)
 ):
     """2. Chọn phần làm trước: User chọn phase (Listening & Speaking hoặc Reading & Writing)"""
-    session = db.query(TestSession).filter(TestSession.id == session_id).first()
+    session = (
+        db.query(TestSession)
+        .options(*SESSION_RESPONSE_LOAD)
+        .filter(TestSession.id == session_id)
+        .first()
+    )
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
@@ -47,13 +322,13 @@ def select_phase(
     session.status = SessionStatus.PHASE1_SELECTED
     db.commit()
     db.refresh(session)
-    return session
+    return model_response(SessionResponse, session)
 
 
 @router.post("/sessions/{session_id}/generate", response_model=SessionResponse)
-def generate_phase_content(session_id: int, db: Session = Depends(get_db)):
+async def generate_phase_content(session_id: int):
     """3. Generate đề: Tạo đề cho phase đã chọn (chỉ gọi AI 1 lần)"""
-    session = db.query(TestSession).filter(TestSession.id == session_id).first()
+    session = await asyncio.to_thread(_read_session, session_id, *SESSION_RESPONSE_LOAD)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
@@ -62,139 +337,403 @@ def generate_phase_content(session_id: int, db: Session = Depends(get_db)):
 
     # Check if phase 1 already generated
     if session.phase1_content:
-        return session
+        return model_response(SessionResponse, session)
 
-    # Generate content for selected phase
+    # Take content for selected phase from the pool (generates on demand if empty)
     try:
-        if session.selected_phase == Phase.LISTENING_SPEAKING:
-            content = test_generator.generate_listening_speaking(session.level)
-        elif session.selected_phase == Phase.READING_WRITING:
-            content = test_generator.generate_reading_writing(session.level)
-        else:
-            raise HTTPException(status_code=400, detail="Invalid phase")
+        await _generate_once(session_id, 1, session.level, session.selected_phase)
+        session = await asyncio.to_thread(_read_session, session_id, *SESSION_RESPONSE_LOAD)
+        return model_response(SessionResponse, session)
+    except TimeoutError:
+        raise HTTPException(status_code=504, detail=GENERATION_TIMEOUT_DETAIL)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Generation error: {str(e)}")
 
-        session.phase1_content = content
-        session.status = SessionStatus.PHASE1_GENERATED
+
+def _store_phase_content(session_id: int, phase: int, content: Dict[str, Any]):
+    """Save generated content for phase 1/2 unless the session already has some"""
+    db = SessionLocal()
+    try:
+        session, has_phase1, has_phase2 = (
+            db.query(
+                TestSession,
+                TestSession.phase1_content.isnot(None),
+                TestSession.phase2_content.isnot(None),
+            )
+            .filter(TestSession.id == session_id)
+            .first()
+        )
+        if phase == 1 and not has_phase1:
+            set_phase_content(session, 1, content)
+            session.status = SessionStatus.PHASE1_GENERATED
+        elif phase == 2 and not has_phase2:
+            set_phase_content(session, 2, content)
+            session.status = SessionStatus.PHASE2_GENERATED
         db.commit()
-        db.refresh(session)
-        return session
+    finally:
+        db.close()
+
+
+def _read_phase_content(session_id: int, phase: int) -> Optional[Dict[str, Any]]:
+    """Stored content of phase 1/2, None if not generated yet"""
+    column = TestSession.phase1_content if phase == 1 else TestSession.phase2_content
+    db = SessionLocal()
+    try:
+        return db.query(column).filter(TestSession.id == session_id).scalar()
+    finally:
+        db.close()
+
+
+async def _generate_shared(
+    session_id: int, phase: int, work: Callable[[], Awaitable[Dict[str, Any]]]
+) -> Dict[str, Any]:
+    """work() unless it is already running for this session and phase (in any
+    process), in which case its stored content is returned when ready.
+
+    The shared generation gets the generation timeout of its own; each request
+    waits for it until its own deadline (TimeoutError).
+    """
+    return await single_flight.do(
+        f"generate:{session_id}:{phase}",
+        work,
+        lambda: asyncio.to_thread(_read_phase_content, session_id, phase),
+        timeout=PURPOSE_TIMEOUTS["generate"],
+    )
+
+
+async def _generate_once(
+    session_id: int, phase: int, level: Level, phase_type: Phase
+) -> Dict[str, Any]:
+    """Get and store the content of phase 1/2. Concurrent requests for the same
+    session and phase, in this or another process, share a single generation."""
+
+    async def work():
+        content = await _take_speculative_phase2(session_id) if phase == 2 else None
+        if content is None:
+            content = await content_pool.aacquire(level, phase_type)
+        await asyncio.to_thread(_store_phase_content, session_id, phase, content)
+        return content
+
+    return await _generate_shared(session_id, phase, work)
+
+
+def _put_sections(queue: asyncio.Queue, content: Dict[str, Any], phase_type: Phase):
+    for path, value in iter_sections(content, test_generator.SECTION_PATHS[phase_type]):
+        queue.put_nowait(("section", {"path": path_to_str(path), "data": value}))
+
+
+async def _stream_generate(
+    session_id: int, phase: int, level: Level, phase_type: Phase, queue: asyncio.Queue
+):
+    """Run streaming generation, forwarding sections to the queue and saving the result.
+
+    Shares the generation like _generate_once: if another request is already
+    generating this phase, its content is replayed section by section when stored.
+    """
+    streamed = False
+
+    async def work():
+        nonlocal streamed
+        streamed = True
+        content = None
+        async for kind, payload in test_generator.astream_content(level, phase_type):
+            if kind == "section":
+                queue.put_nowait(("section", payload))
+            else:
+                content = payload
+        await asyncio.to_thread(_store_phase_content, session_id, phase, content)
+        return content
+
+    try:
+        content = await _generate_shared(session_id, phase, work)
+        if not streamed:
+            _put_sections(queue, content, phase_type)
+        queue.put_nowait(("complete", None))
+    except TimeoutError:
+        queue.put_nowait(("error", GENERATION_TIMEOUT_DETAIL))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Generation error: {str(e)}")
+        logger.exception("Streaming generation error")
+        queue.put_nowait(("error", f"Generation error: {str(e)}"))
+
+
+@router.get("/sessions/{session_id}/generate/stream")
+async def stream_phase_content(session_id: int, phase: int = 1):
+    """3b. Generate đề dạng stream (SSE): gửi từng section/passage/part ngay khi tạo xong
+
+    Events: `section` ({"path", "data"}), sau đó `complete` hoặc `error`.
+    """
+    if phase not in (1, 2):
+        raise HTTPException(status_code=400, detail="phase must be 1 or 2")
+
+    session = await asyncio.to_thread(
+        _read_session,
+        session_id,
+        undefer(TestSession.phase1_content),
+        undefer(TestSession.phase2_content),
+    )
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if not session.selected_phase:
+        raise HTTPException(status_code=400, detail="Please select a phase first")
+
+    if phase == 1:
+        phase_type = session.selected_phase
+        content = session.phase1_content
+    else:
+        if not session.phase2_content and session.status != SessionStatus.PHASE1_COMPLETED:
+            raise HTTPException(status_code=400, detail="Please complete phase 1 first")
+        phase_type = get_phase2_type(session.selected_phase)
+        content = session.phase2_content
+    level = session.level
+
+    # Content from the pool is stored right away and replayed section by section
+    # (phase 2: the content generated speculatively during phase 1 first)
+    if content is None:
+        if phase == 2:
+            content = await content_pool.atake_reserved(session_id)
+        if content is None and content_pool.enabled:
+            content = await asyncio.to_thread(content_pool.claim_once, level, phase_type)
+        if content is not None:
+            await asyncio.to_thread(_store_phase_content, session_id, phase, content)
+
+    queue: asyncio.Queue = asyncio.Queue()
+    if content is not None:
+        _put_sections(queue, content, phase_type)
+        queue.put_nowait(("complete", None))
+    else:
+        task = asyncio.create_task(
+            _stream_generate(session_id, phase, level, phase_type, queue)
+        )
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    async def events():
+        while True:
+            kind, payload = await queue.get()
+            if kind == "section":
+                yield sse_event("section", json.dumps(payload, ensure_ascii=False))
+            elif kind == "complete":
+                yield sse_event("complete", json.dumps({"session_id": session_id, "phase": phase}))
+                break
+            else:
+                yield sse_event("error", json.dumps({"detail": payload}, ensure_ascii=False))
+                break
+
+    return sse_response(events())
 
 
 @router.get("/sessions/{session_id}", response_model=SessionResponse)
 def get_session(session_id: int, db: Session = Depends(get_db)):
     """Lấy thông tin session"""
-    session = db.query(TestSession).filter(TestSession.id == session_id).first()
+    session = (
+        db.query(TestSession)
+        .options(*SESSION_RESPONSE_LOAD)
+        .filter(TestSession.id == session_id)
+        .first()
+    )
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return model_response(SessionResponse, session)
+
+
+@router.get("/sessions/{session_id}/summary", response_model=SessionSummaryResponse)
+def get_session_summary(session_id: int, db: Session = Depends(get_db)):
+    """Lấy thông tin session không kèm đề (đề lấy qua /content/{phase}, được cache)"""
+    session = (
+        db.query(TestSession)
+        .options(
+            undefer(TestSession.phase1_scores),
+            undefer(TestSession.phase2_scores),
+            undefer(TestSession.final_results),
+        )
+        .filter(TestSession.id == session_id)
+        .first()
+    )
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    return session
+    return model_response(SessionSummaryResponse, session)
+
+
+@router.get("/sessions/{session_id}/content/{phase}")
+def get_phase_content(
+    session_id: int, phase: int, request: Request, db: Session = Depends(get_db)
+):
+    """Lấy đề của phase 1/2. Đề không đổi sau khi tạo nên trả về ETag (hash nội dung)
+    và Cache-Control immutable; If-None-Match trùng ETag → 304, không đọc đề từ DB"""
+    if phase not in (1, 2):
+        raise HTTPException(status_code=400, detail="phase must be 1 or 2")
+    content_column = TestSession.phase1_content if phase == 1 else TestSession.phase2_content
+    hash_column = (
+        TestSession.phase1_content_hash if phase == 1 else TestSession.phase2_content_hash
+    )
+
+    row = (
+        db.query(hash_column, content_column.isnot(None))
+        .filter(TestSession.id == session_id)
+        .first()
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="Session not found")
+    stored_hash, has_content = row
+    if not has_content:
+        raise HTTPException(
+            status_code=404, detail=f"Phase {phase} content not generated"
+        )
+
+    content = None
+    if not stored_hash:
+        # Content stored before hashes were recorded: hash it once and keep the hash
+        content = db.query(content_column).filter(TestSession.id == session_id).scalar()
+        stored_hash = content_hash(content)
+        db.query(TestSession).filter(TestSession.id == session_id).update(
+            {hash_column: stored_hash}, synchronize_session=False
+        )
+        db.commit()
+
+    etag = f'"{stored_hash}"'
+    headers = {"ETag": etag, "Cache-Control": CONTENT_CACHE_CONTROL}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if content is None:
+        content = db.query(content_column).filter(TestSession.id == session_id).scalar()
+    return FastJSONResponse(content, headers=headers)
 
 
 @router.post("/sessions/{session_id}/start-phase1")
 def start_phase1(session_id: int, db: Session = Depends(get_db)):
     """Bắt đầu làm phase 1"""
-    session = db.query(TestSession).filter(TestSession.id == session_id).first()
-    if not session:
+    # Only the row and whether content exists; the content itself is not loaded
+    row = (
+        db.query(TestSession, TestSession.phase1_content.isnot(None))
+        .filter(TestSession.id == session_id)
+        .first()
+    )
+    if not row:
         raise HTTPException(status_code=404, detail="Session not found")
+    session, has_content = row
 
-    if not session.phase1_content:
+    if not has_content:
         raise HTTPException(status_code=400, detail="Phase 1 content not generated")
 
     session.status = SessionStatus.PHASE1_IN_PROGRESS
     session.phase1_started_at = datetime.now()
-    db.commit()
+    if content_pool.prefetch_phase2:
+        # Phase 2 type is known: build its content while the learner works on phase 1
+        job_queue.enqueue(db, session_id, JobKind.GENERATE_PHASE2)
+    else:
+        db.commit()
     return {"message": "Phase 1 started", "session_id": session_id}
 
 
-@router.post("/sessions/{session_id}/submit-phase1", response_model=SessionResponse)
-def submit_phase1(
-    session_id: int, answers: AnswersSubmit, db: Session = Depends(get_db)
-):
-    """5. Nộp bài phase 1: AI chấm điểm và lưu kết quả"""
-    session = db.query(TestSession).filter(TestSession.id == session_id).first()
+@router.patch("/sessions/{session_id}/answers")
+def save_answers(session_id: int, patch: AnswersPatch, db: Session = Depends(get_db)):
+    """Lưu nháp bài làm (autosave): chỉ gửi các câu thay đổi, server gộp vào bài đã lưu"""
+    if patch.phase not in (1, 2):
+        raise HTTPException(status_code=400, detail="phase must be 1 or 2")
+    answers_column = (
+        TestSession.phase1_answers if patch.phase == 1 else TestSession.phase2_answers
+    )
+
+    # Row lock so concurrent deltas (and the final submit) don't overwrite each other
+    session = (
+        db.query(TestSession)
+        .options(undefer(answers_column))
+        .filter(TestSession.id == session_id)
+        .with_for_update()
+        .first()
+    )
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    if not session.phase1_content:
-        raise HTTPException(status_code=400, detail="Phase 1 content not generated")
+    if patch.phase == 1:
+        if session.phase1_completed_at is not None:
+            raise HTTPException(status_code=409, detail="Phase 1 already submitted")
+        session.phase1_answers = merge_answers(session.phase1_answers, patch.answers)
+        saved = len(session.phase1_answers)
+    else:
+        if session.phase2_completed_at is not None:
+            raise HTTPException(status_code=409, detail="Phase 2 already submitted")
+        session.phase2_answers = merge_answers(session.phase2_answers, patch.answers)
+        saved = len(session.phase2_answers)
+    db.commit()
+    return {"session_id": session_id, "phase": patch.phase, "saved": saved}
 
-    session.phase1_answers = answers.answers
-    session.phase1_completed_at = datetime.now()
 
-    # Score phase 1
-    try:
-        scores = {}
-        print(f"Starting scoring for phase 1, selected_phase: {session.selected_phase}")
+@router.get("/sessions/{session_id}/answers/{phase}")
+def get_answers(session_id: int, phase: int, db: Session = Depends(get_db)):
+    """Bài làm đã lưu của phase 1/2 (khôi phục sau khi tải lại trang)"""
+    if phase not in (1, 2):
+        raise HTTPException(status_code=400, detail="phase must be 1 or 2")
+    answers_column = (
+        TestSession.phase1_answers if phase == 1 else TestSession.phase2_answers
+    )
+    row = db.query(answers_column).filter(TestSession.id == session_id).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return row[0] or {}
 
-        if session.selected_phase == Phase.LISTENING_SPEAKING:
-            print("Scoring Listening & Speaking...")
-            scores["listening"] = scoring_service.score_listening(
-                session.phase1_content, answers.answers
-            )
-            print("Listening scored, starting Speaking...")
-            scores["speaking"] = scoring_service.score_speaking(
-                session.phase1_content, answers.answers
-            )
-            print("Speaking scored")
-        elif session.selected_phase == Phase.READING_WRITING:
-            print("Scoring Reading & Writing...")
-            scores["reading"] = scoring_service.score_reading(
-                session.phase1_content, answers.answers
-            )
-            print("Reading scored, starting Writing...")
-            scores["writing"] = scoring_service.score_writing(
-                session.phase1_content, answers.answers
-            )
-            print("Writing scored")
 
-        session.phase1_scores = scores
-        session.status = SessionStatus.PHASE1_COMPLETED
-        db.commit()
-        db.refresh(session)
-        print(f"Phase 1 scoring completed successfully")
-        return session
-    except Exception as e:
-        import traceback
+@router.post(
+    "/sessions/{session_id}/submit-phase1", response_model=JobResponse, status_code=202
+)
+def submit_phase1(
+    session_id: int,
+    answers: Optional[AnswersSubmit] = None,
+    db: Session = Depends(get_db),
+):
+    """5. Nộp bài phase 1: chấm bài đã lưu (autosave + phần gửi kèm), AI chấm điểm trong background job"""
+    row = (
+        db.query(TestSession, TestSession.phase1_content.isnot(None))
+        .filter(TestSession.id == session_id)
+        .with_for_update()
+        .first()
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="Session not found")
+    session, has_content = row
+
+    if not has_content:
+        raise HTTPException(status_code=400, detail="Phase 1 content not generated")
+
+    # Scores the autosaved answers; retries of the same submission keep them
+    # and reuse its job
+    if session.phase1_completed_at is None:
+        if answers and answers.answers:
+            session.phase1_answers = merge_answers(
+                session.phase1_answers, answers.answers
+            )
+        session.phase1_completed_at = datetime.now()
 
-        error_details = traceback.format_exc()
-        print(f"Scoring error: {error_details}")
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Scoring error: {str(e)}")
+    return job_queue.enqueue(db, session_id, JobKind.SCORE_PHASE1)
 
 
 @router.post("/sessions/{session_id}/generate-phase2", response_model=SessionResponse)
-def generate_phase2(session_id: int, db: Session = Depends(get_db)):
+async def generate_phase2(session_id: int):
     """6. Generate phase 2: Tạo đề cho phase còn lại"""
-    session = db.query(TestSession).filter(TestSession.id == session_id).first()
+    session = await asyncio.to_thread(_read_session, session_id, *SESSION_RESPONSE_LOAD)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
+    # Checked first: a duplicate request arriving after the content was stored
+    # gets it instead of an error
+    if session.phase2_content:
+        return model_response(SessionResponse, session)
+
     if session.status != SessionStatus.PHASE1_COMPLETED:
         raise HTTPException(status_code=400, detail="Please complete phase 1 first")
 
-    if session.phase2_content:
-        return session
-
     # Determine phase 2 type
-    phase2_type = (
-        Phase.READING_WRITING
-        if session.selected_phase == Phase.LISTENING_SPEAKING
-        else Phase.LISTENING_SPEAKING
-    )
+    phase2_type = get_phase2_type(session.selected_phase)
 
-    # Generate phase 2 content
+    # Use the content generated speculatively during phase 1, otherwise take it
+    # from the pool (generates on demand if empty)
     try:
-        if phase2_type == Phase.LISTENING_SPEAKING:
-            content = test_generator.generate_listening_speaking(session.level)
-        else:
-            content = test_generator.generate_reading_writing(session.level)
-
-        session.phase2_content = content
-        session.status = SessionStatus.PHASE2_GENERATED
-        db.commit()
-        db.refresh(session)
-        return session
+        await _generate_once(session_id, 2, session.level, phase2_type)
+        session = await asyncio.to_thread(_read_session, session_id, *SESSION_RESPONSE_LOAD)
+        return model_response(SessionResponse, session)
+    except TimeoutError:
+        raise HTTPException(status_code=504, detail=GENERATION_TIMEOUT_DETAIL)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Generation error: {str(e)}")
 
@@ -202,11 +741,17 @@ def generate_phase2(session_id: int, db: Session = Depends(get_db)):
 @router.post("/sessions/{session_id}/start-phase2")
 def start_phase2(session_id: int, db: Session = Depends(get_db)):
     """Bắt đầu làm phase 2"""
-    session = db.query(TestSession).filter(TestSession.id == session_id).first()
-    if not session:
+    # Only the row and whether content exists; the content itself is not loaded
+    row = (
+        db.query(TestSession, TestSession.phase2_content.isnot(None))
+        .filter(TestSession.id == session_id)
+        .first()
+    )
+    if not row:
         raise HTTPException(status_code=404, detail="Session not found")
+    session, has_content = row
 
-    if not session.phase2_content:
+    if not has_content:
         raise HTTPException(status_code=400, detail="Phase 2 content not generated")
 
     session.status = SessionStatus.PHASE2_IN_PROGRESS
@@ -215,169 +760,290 @@ def start_phase2(session_id: int, db: Session = Depends(get_db)):
     return {"message": "Phase 2 started", "session_id": session_id}
 
 
-@router.post("/sessions/{session_id}/submit-phase2", response_model=SessionResponse)
+@router.post(
+    "/sessions/{session_id}/submit-phase2", response_model=JobResponse, status_code=202
+)
 def submit_phase2(
-    session_id: int, answers: AnswersSubmit, db: Session = Depends(get_db)
+    session_id: int,
+    answers: Optional[AnswersSubmit] = None,
+    db: Session = Depends(get_db),
 ):
-    """7. Nộp bài phase 2: AI chấm điểm phase 2"""
-    session = db.query(TestSession).filter(TestSession.id == session_id).first()
-    if not session:
+    """7. Nộp bài phase 2: chấm bài đã lưu (autosave + phần gửi kèm), AI chấm điểm trong background job"""
+    row = (
+        db.query(TestSession, TestSession.phase2_content.isnot(None))
+        .filter(TestSession.id == session_id)
+        .with_for_update()
+        .first()
+    )
+    if not row:
         raise HTTPException(status_code=404, detail="Session not found")
+    session, has_content = row
 
-    if not session.phase2_content:
+    if not has_content:
         raise HTTPException(status_code=400, detail="Phase 2 content not generated")
 
-    session.phase2_answers = answers.answers
-    session.phase2_completed_at = datetime.now()
-
-    # Score phase 2
-    try:
-        scores = {}
-        phase2_type = (
-            Phase.READING_WRITING
-            if session.selected_phase == Phase.LISTENING_SPEAKING
-            else Phase.LISTENING_SPEAKING
-        )
-
-        if phase2_type == Phase.LISTENING_SPEAKING:
-            scores["listening"] = scoring_service.score_listening(
-                session.phase2_content, answers.answers
-            )
-            scores["speaking"] = scoring_service.score_speaking(
-                session.phase2_content, answers.answers
-            )
-        else:
-            scores["reading"] = scoring_service.score_reading(
-                session.phase2_content, answers.answers
-            )
-            scores["writing"] = scoring_service.score_writing(
-                session.phase2_content, answers.answers
+    # Scores the autosaved answers; retries of the same submission keep them
+    # and reuse its job
+    if session.phase2_completed_at is None:
+        if answers and answers.answers:
+            session.phase2_answers = merge_answers(
+                session.phase2_answers, answers.answers
             )
+        session.phase2_completed_at = datetime.now()
 
-        session.phase2_scores = scores
-        session.status = SessionStatus.PHASE2_COMPLETED
-        db.commit()
-        db.refresh(session)
-        return session
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Scoring error: {str(e)}")
+    return job_queue.enqueue(db, session_id, JobKind.SCORE_PHASE2)
 
 
 @router.post("/sessions/{session_id}/aggregate", response_model=SessionResponse)
 def aggregate_results(session_id: int, db: Session = Depends(get_db)):
-    """8. Tổng hợp kết quả: Tính IELTS equivalent và phân tích"""
+    """8. Tổng hợp kết quả: Tính band IELTS ngay (không gọi AI); phân tích chi tiết chạy trong background job"""
     session = db.query(TestSession).filter(TestSession.id == session_id).first()
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    if session.status != SessionStatus.PHASE2_COMPLETED:
+    if session.status not in (SessionStatus.PHASE2_COMPLETED, SessionStatus.COMPLETED):
         raise HTTPException(status_code=400, detail="Please complete both phases first")
 
-    if session.final_results:
-        return session
-
-    # Aggregate results
-    phase2_type = (
-        Phase.READING_WRITING
-        if session.selected_phase == Phase.LISTENING_SPEAKING
-        else Phase.LISTENING_SPEAKING
+    # Usually already done when phase 2 scoring finished
+    _aggregate_bands(db, session_id)
+    session = (
+        db.query(TestSession)
+        .options(*SESSION_RESPONSE_LOAD)
+        .filter(TestSession.id == session_id)
+        .first()
     )
+    return model_response(SessionResponse, session)
 
-    final_results = scoring_service.aggregate_results(
-        session.phase1_scores,
-        session.phase2_scores,
-        session.selected_phase,
-        phase2_type,
-    )
-
-    # Generate detailed analysis (optimized to reduce token usage)
-    try:
-        print("Generating detailed analysis...")
-        detailed_analysis = scoring_service.generate_detailed_analysis(
-            session.phase1_scores or {},
-            session.phase2_scores or {},
-            session.selected_phase,
-            phase2_type,
-            session.phase1_content or {},
-            session.phase2_content or {},
-            session.phase1_answers or {},
-            session.phase2_answers or {},
-            final_results,
-        )
-        final_results["detailed_analysis"] = detailed_analysis
-        print("Detailed analysis generated successfully")
-    except Exception as e:
-        print(f"Error generating detailed analysis (non-critical): {e}")
-        # Continue without analysis - it's optional
-        final_results["detailed_analysis"] = {"ielts_analysis": {}, "beyond_ielts": {}}
 
-    session.final_results = final_results
-    session.status = SessionStatus.COMPLETED
-    db.commit()
-    db.refresh(session)
-    return session
+def _has_detailed_analysis(final_results: Dict[str, Any]) -> bool:
+    """Whether the detailed analysis was generated (at least one part not empty)"""
+    detailed_analysis = final_results.get("detailed_analysis")
+    return bool(detailed_analysis) and any(detailed_analysis.values())
 
 
-@router.post("/sessions/{session_id}/generate-analysis", response_model=SessionResponse)
-def generate_detailed_analysis_endpoint(session_id: int, db: Session = Depends(get_db)):
-    """Generate detailed analysis (call this after displaying basic results)"""
-    session = db.query(TestSession).filter(TestSession.id == session_id).first()
-    if not session:
+def _analysis_status(db: Session, session_id: int, queue_missing: bool) -> AnalysisStatusResponse:
+    row = (
+        db.query(TestSession.id, TestSession.final_results)
+        .filter(TestSession.id == session_id)
+        .first()
+    )
+    if not row:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    if not session.final_results:
+    if not row.final_results:
         raise HTTPException(status_code=400, detail="Please aggregate results first")
 
-    # Check if analysis already exists
-    if session.final_results.get("detailed_analysis"):
-        return session
+    if _has_detailed_analysis(row.final_results):
+        detailed_analysis = row.final_results["detailed_analysis"]
+        return AnalysisStatusResponse(
+            session_id=session_id,
+            status="ready",
+            job_id=None,
+            detailed_analysis=detailed_analysis,
+        )
 
-    phase2_type = (
-        Phase.READING_WRITING
-        if session.selected_phase == Phase.LISTENING_SPEAKING
-        else Phase.LISTENING_SPEAKING
+    job = (
+        db.query(Job)
+        .filter(
+            Job.session_id == session_id,
+            Job.kind.in_((JobKind.ANALYSIS, JobKind.AGGREGATE)),
+        )
+        .order_by(Job.id.desc())
+        .first()
+    )
+    if job is None and queue_missing:
+        # Results aggregated before analysis jobs existed
+        job = job_queue.enqueue(db, session_id, JobKind.ANALYSIS)
+    return AnalysisStatusResponse(
+        session_id=session_id,
+        status="failed" if job is not None and job.status == JobStatus.FAILED else "pending",
+        job_id=job.id if job is not None else None,
+        detailed_analysis=None,
     )
 
-    # Generate detailed analysis
-    try:
-        detailed_analysis = scoring_service.generate_detailed_analysis(
-            session.phase1_scores,
-            session.phase2_scores,
-            session.selected_phase,
-            phase2_type,
-            session.phase1_content,
-            session.phase2_content,
-            session.phase1_answers or {},
-            session.phase2_answers or {},
-            session.final_results,
-        )
 
-        # Add detailed analysis to final results
-        session.final_results["detailed_analysis"] = detailed_analysis
-        db.commit()
-        db.refresh(session)
-        return session
-    except Exception as e:
-        # Log error but don't fail - analysis is optional
-        print(f"Error generating detailed analysis: {e}")
-        # Return session without analysis
-        return session
+@router.get("/sessions/{session_id}/generate-analysis", response_model=AnalysisStatusResponse)
+def get_analysis_status(session_id: int, db: Session = Depends(get_db)):
+    """Trạng thái phân tích chi tiết (pending / ready / failed), chỉ đọc, không gọi AI.
+
+    Phân tích được tạo trong background job ngay sau khi chấm xong phase 2;
+    `job_id` rỗng khi chưa có job nào (gọi POST để xếp job).
+    """
+    return _analysis_status(db, session_id, queue_missing=False)
+
+
+@router.post("/sessions/{session_id}/generate-analysis", response_model=AnalysisStatusResponse)
+def generate_analysis(session_id: int, db: Session = Depends(get_db)):
+    """Như GET, nhưng xếp job phân tích nếu session chưa có (session tổng hợp trước khi có job phân tích)"""
+    return _analysis_status(db, session_id, queue_missing=True)
 
 
 @router.get("/sessions/{session_id}/status", response_model=SessionStatusResponse)
 def get_session_status(session_id: int, db: Session = Depends(get_db)):
     """Lấy trạng thái session"""
-    session = db.query(TestSession).filter(TestSession.id == session_id).first()
-    if not session:
+    # Slim projection: NULL checks run in SQL, no JSON blob is read or parsed
+    row = (
+        db.query(
+            TestSession.id,
+            TestSession.status,
+            TestSession.level,
+            TestSession.selected_phase,
+            TestSession.phase1_content.isnot(None).label("phase1_available"),
+            TestSession.phase2_content.isnot(None).label("phase2_available"),
+            TestSession.phase1_scores.isnot(None).label("phase1_completed"),
+            TestSession.phase2_scores.isnot(None).label("phase2_completed"),
+        )
+        .filter(TestSession.id == session_id)
+        .first()
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    return SessionStatusResponse(**row._asdict())
+
+
+@router.get("/sessions/{session_id}/usage", response_model=SessionUsageResponse)
+def get_session_usage(session_id: int, db: Session = Depends(get_db)):
+    """Số lượt gọi LLM, token (prompt/output) và chi phí ước tính của session, theo từng mục đích"""
+    exists = db.query(TestSession.id).filter(TestSession.id == session_id).first()
+    if not exists:
         raise HTTPException(status_code=404, detail="Session not found")
+    return usage_recorder.session_summary(db, session_id)
+
+
+@router.get("/content-pool")
+def get_content_pool_status(db: Session = Depends(get_db)):
+    """Số đề có sẵn trong pool theo Level x Phase"""
+    return {
+        "enabled": content_pool.enabled,
+        "low_water": content_pool.low_water,
+        "available": content_pool.available_counts(db),
+    }
+
 
-    return SessionStatusResponse(
-        id=session.id,
-        status=session.status,
-        level=session.level,
-        selected_phase=session.selected_phase,
-        phase1_available=session.phase1_content is not None,
-        phase2_available=session.phase2_content is not None,
-        phase1_completed=session.phase1_scores is not None,
-        phase2_completed=session.phase2_scores is not None,
+@router.get("/gemini-keys")
+def get_gemini_key_status():
+    """Backend LLM đang dùng; Gemini: hạn mức và trạng thái từng key (không trả về key), stub: số lượt gọi/token giả lập"""
+    return test_generator.llm.status()
+
+
+@router.get("/llm-cache")
+def get_llm_cache_stats():
+    """Số lần hit/miss của cache kết quả Gemini (chấm điểm, phân tích)"""
+    return scoring_service.llm.cache_stats()
+
+
+# Background jobs: scoring, analysis and speculative generation run here instead
+# of inside the HTTP request
+
+
+@job_queue.handler(JobKind.SCORE_PHASE1)
+async def run_score_phase1(session_id: int):
+    session = await asyncio.to_thread(
+        _read_session,
+        session_id,
+        undefer(TestSession.phase1_content),
+        undefer(TestSession.phase1_answers),
+        undefer(TestSession.phase1_scores),
     )
+    if session.phase1_scores:
+        return
+
+    logger.info("Starting scoring for phase 1, selected_phase: %s", session.selected_phase)
+    # LLM failures fail the job so it is retried; fallback scores only on the last attempt
+    scores = await scoring_service.ascore_phase(
+        session.selected_phase,
+        session.phase1_content,
+        session.phase1_answers or {},
+        fallback=job_queue.is_last_attempt(),
+    )
+
+    await asyncio.to_thread(_store_scores, session_id, 1, scores)
+    logger.info("Phase 1 scoring completed")
+
+
+@job_queue.handler(JobKind.SCORE_PHASE2)
+async def run_score_phase2(session_id: int):
+    session = await asyncio.to_thread(
+        _read_session,
+        session_id,
+        undefer(TestSession.phase2_content),
+        undefer(TestSession.phase2_answers),
+        undefer(TestSession.phase2_scores),
+    )
+    if session.phase2_scores:
+        return
+
+    scores = await scoring_service.ascore_phase(
+        get_phase2_type(session.selected_phase),
+        session.phase2_content,
+        session.phase2_answers or {},
+        fallback=job_queue.is_last_attempt(),
+    )
+
+    await asyncio.to_thread(_store_scores, session_id, 2, scores)
+    # Band scores are ready right away; the detailed analysis starts now instead
+    # of waiting for the client to ask for results
+    await asyncio.to_thread(_store_bands, session_id)
+
+
+@job_queue.handler(JobKind.ANALYSIS)
+@job_queue.handler(JobKind.AGGREGATE)
+async def run_analysis(session_id: int):
+    # Analysis reads every blob of the session
+    session = await asyncio.to_thread(_read_session, session_id, undefer("*"))
+    if not session.final_results:
+        # AGGREGATE job queued before band scores were stored synchronously
+        await asyncio.to_thread(_store_bands, session_id, False)
+        session = await asyncio.to_thread(_read_session, session_id, undefer("*"))
+    if _has_detailed_analysis(session.final_results):
+        return
+
+    # Generate detailed analysis (optimized to reduce token usage); the band
+    # scores are already stored, so results can be shown while this runs
+    logger.info("Generating detailed analysis")
+    detailed_analysis = await scoring_service.agenerate_detailed_analysis(
+        session.phase1_scores or {},
+        session.phase2_scores or {},
+        session.selected_phase,
+        get_phase2_type(session.selected_phase),
+        session.phase1_content or {},
+        session.phase2_content or {},
+        session.phase1_answers or {},
+        session.phase2_answers or {},
+        session.final_results,
+        # LLM failures fail the job so it is retried; empty parts only on the last attempt
+        fallback=job_queue.is_last_attempt(),
+    )
+    if not any(detailed_analysis.values()):
+        # Stored, it would count as ready and never be generated again
+        raise RuntimeError("Detailed analysis is empty")
+    await asyncio.to_thread(_store_detailed_analysis, session_id, detailed_analysis)
+    logger.info("Detailed analysis generated")
+
+
+@job_queue.handler(JobKind.GENERATE_PHASE2)
+async def run_generate_phase2(session_id: int):
+    row = await asyncio.to_thread(_read_prefetch_target, session_id)
+    if row is None:
+        return
+    level, phase2_type = row
+
+    done = asyncio.get_running_loop().create_future()
+    _phase2_prefetch[session_id] = done
+    try:
+        content = await content_pool.aacquire(level, phase2_type)
+        # Reserved for this session unless it no longer needs it (taken phase 2
+        # content some other way meanwhile): then it simply goes to the pool
+        still_needed = await asyncio.to_thread(_read_prefetch_target, session_id) is not None
+        await asyncio.to_thread(
+            content_pool.add,
+            level,
+            phase2_type,
+            content,
+            session_id if still_needed else None,
+        )
+        logger.info("Speculative phase 2 content ready (%s)", phase2_type.value)
+    finally:
+        _phase2_prefetch.pop(session_id, None)
+        done.set_result(None)
@@ -3,14 +3,25 @@ from .test_session import (
     SessionResponse,
     PhaseSelection,
     AnswersSubmit,
+    AnswersPatch,
     SessionStatusResponse,
+    SessionSummaryResponse,
+    AnalysisStatusResponse,
 )
+from .job import JobResponse
+from .usage import UsageTotals, SessionUsageResponse
 
 __all__ = [
     "SessionCreate",
     "SessionResponse",
     "PhaseSelection",
     "AnswersSubmit",
+    "AnswersPatch",
     "SessionStatusResponse",
+    "SessionSummaryResponse",
+    "AnalysisStatusResponse",
+    "JobResponse",
+    "UsageTotals",
+    "SessionUsageResponse",
 ]
 
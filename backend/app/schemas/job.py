@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+from app.models.job import JobKind, JobStatus
+
+
+class JobResponse(BaseModel):
+    id: int
+    session_id: int
+    kind: JobKind
+    status: JobStatus
+    attempts: int
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Literal
 from datetime import datetime
 from app.models.test_session import Level, Phase, SessionStatus
 
@@ -13,7 +13,15 @@ class PhaseSelection(BaseModel):
 
 
 class AnswersSubmit(BaseModel):
-    answers: Dict[str, Any]
+    # Answers not autosaved yet; merged into the stored answers before scoring
+    answers: Optional[Dict[str, Optional[str]]] = None
+
+
+class AnswersPatch(BaseModel):
+    phase: int  # 1 or 2
+    # Only the answers changed since the last save; null removes an answer.
+    # Text only: the scorers strip every answer
+    answers: Dict[str, Optional[str]]
 
 
 class SessionResponse(BaseModel):
@@ -33,6 +41,26 @@ class SessionResponse(BaseModel):
         from_attributes = True
 
 
+class SessionSummaryResponse(BaseModel):
+    """SessionResponse without the test content: fetch it from /content/{phase},
+    which the browser caches by its hash (ETag)"""
+
+    id: int
+    level: Level
+    selected_phase: Optional[Phase]
+    status: SessionStatus
+    phase1_content_hash: Optional[str]
+    phase2_content_hash: Optional[str]
+    phase1_scores: Optional[Dict[str, Any]]
+    phase2_scores: Optional[Dict[str, Any]]
+    final_results: Optional[Dict[str, Any]]
+    created_at: datetime
+    updated_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+
 class SessionStatusResponse(BaseModel):
     id: int
     status: SessionStatus
@@ -43,3 +71,11 @@ class SessionStatusResponse(BaseModel):
     phase1_completed: bool
     phase2_completed: bool
 
+
+class AnalysisStatusResponse(BaseModel):
+    """Whether the detailed analysis (generated in the background) is ready"""
+
+    session_id: int
+    status: Literal["pending", "ready", "failed"]
+    job_id: Optional[int]
+    detailed_analysis: Optional[Dict[str, Any]]
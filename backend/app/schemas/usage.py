@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+from typing import Dict
+
+
+class UsageTotals(BaseModel):
+    calls: int
+    prompt_tokens: int
+    output_tokens: int
+    total_tokens: int
+    latency_ms: int
+    estimated_cost_usd: float
+
+
+class SessionUsageResponse(UsageTotals):
+    session_id: int
+    by_purpose: Dict[str, UsageTotals]
@@ -0,0 +1,50 @@
+import json
+from typing import Any, Dict, Optional, Type
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the standard library encoder
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON (orjson when installed)"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    """Parse JSON text or bytes (orjson when installed)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def model_response(
+    model: Type[BaseModel],
+    obj: Any,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """Validate an ORM object into a response model and serialize it in one pass.
+
+    pydantic-core writes the JSON directly, skipping FastAPI's jsonable_encoder
+    walk over the (large) content dicts, which dominates the cost of returning a
+    session. Declare the same model as `response_model` on the route for the docs.
+    """
+    body = model.model_validate(obj).model_dump_json()
+    return Response(
+        body, status_code=status_code, headers=headers, media_type="application/json"
+    )
@@ -1,6 +1,16 @@
+from .llm_backend import LLMBackend, get_llm_backend
 from .gemini_service import GeminiService
+from .stub_llm import StubLLMBackend
 from .test_generator import TestGeneratorService
 from .scoring_service import ScoringService
+from .content_pool import ContentPoolService
 
-__all__ = ["GeminiService", "TestGeneratorService", "ScoringService"]
-
+__all__ = [
+    "LLMBackend",
+    "get_llm_backend",
+    "GeminiService",
+    "StubLLMBackend",
+    "TestGeneratorService",
+    "ScoringService",
+    "ContentPoolService",
+]
@@ -0,0 +1,253 @@
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Bump when normalization or variant rules change: keys stored with an older
+# version are recompiled from the content when scoring
+ANSWER_KEY_VERSION = 2
+
+# Fill-blank answers within this many edits of an accepted form count as correct (0 = exact only)
+MAX_EDIT_DISTANCE = int(os.getenv("ANSWER_MAX_EDIT_DISTANCE", "0"))
+# Shorter answers are only matched exactly ("cat" must not match "car")
+FUZZY_MIN_LENGTH = 5
+
+ARTICLES = {"a", "an", "the"}
+
+NUMBER_WORDS = {
+    word: value
+    for value, word in enumerate(
+        "zero one two three four five six seven eight nine ten eleven twelve thirteen "
+        "fourteen fifteen sixteen seventeen eighteen nineteen".split()
+    )
+}
+NUMBER_WORDS.update(
+    {
+        word: (i + 2) * 10
+        for i, word in enumerate(
+            "twenty thirty forty fifty sixty seventy eighty ninety".split()
+        )
+    }
+)
+SCALE_WORDS = {"hundred": 100, "thousand": 1000}
+
+# Short forms accepted for TRUE/FALSE/NOT GIVEN and YES/NO/NOT GIVEN answers
+ABBREVIATIONS = {"true": "t", "false": "f", "not given": "ng", "yes": "y", "no": "n"}
+
+# "A", "a)", "B. some option text" -> option letter
+_CHOICE = re.compile(r"^([a-z])(?:\s*[.):]\s*.*)?$", re.DOTALL)
+_OPTION_PREFIX = re.compile(r"^[a-z]\s*[.):]\s*")
+_THOUSANDS = re.compile(r"(?<=\d),(?=\d{3})")
+_PUNCTUATION = re.compile(r"[^\w\s.]|\.(?!\d)|(?<!\d)\.")
+_PARENTHESES = re.compile(r"\(([^()]*)\)")
+_ALTERNATIVES = re.compile(r"\s*[/;|]\s*")
+# "3pm" -> "3 pm", "a4" -> "a 4"; "p.m." -> "pm"
+_LETTER_DIGIT = re.compile(r"(?<=\d)(?=[^\W\d_])|(?<=[^\W\d_])(?=\d)")
+_DOTTED = re.compile(r"\b[^\W\d_](?:\.[^\W\d_])+\b\.?")
+
+
+def _numbers_to_digits(tokens: List[str]) -> List[str]:
+    """["twenty", "one", "and", "a", ...] -> ["21", ...]; other tokens are kept"""
+    out: List[str] = []
+    total = current = 0
+    in_number = False
+
+    def flush():
+        nonlocal total, current, in_number
+        if in_number:
+            out.append(str(total + current))
+        total = current = 0
+        in_number = False
+
+    for i, token in enumerate(tokens):
+        if token in NUMBER_WORDS:
+            current += NUMBER_WORDS[token]
+            in_number = True
+        elif token in SCALE_WORDS and in_number:
+            if SCALE_WORDS[token] == 100:
+                current = (current or 1) * 100
+            else:
+                total += (current or 1) * SCALE_WORDS[token]
+                current = 0
+        elif (
+            token == "and"
+            and in_number
+            and i + 1 < len(tokens)
+            and tokens[i + 1] in NUMBER_WORDS
+        ):
+            continue  # "one hundred and five"
+        else:
+            flush()
+            out.append(token)
+    flush()
+    return out
+
+
+def normalize_answer(answer: Any) -> str:
+    """Canonical form of a free-text answer.
+
+    Case, Unicode width variants, punctuation, extra whitespace and articles are
+    ignored (an answer that is only an article, e.g. "A", keeps it); number words
+    become digits ("twenty-one" -> "21") and digits are split from letters
+    ("3pm" = "3 pm" = "3 p.m.").
+    """
+    return _normalize_text(str(answer))
+
+
+@lru_cache(maxsize=65536)
+def _normalize_text(text: str) -> str:
+    # Answers repeat a lot across submissions (letters, TRUE/FALSE, short words)
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _DOTTED.sub(lambda m: m.group().replace(".", ""), text)
+    text = _THOUSANDS.sub("", text).replace("%", " percent ")
+    text = _PUNCTUATION.sub(" ", text)
+    tokens = text.split()
+    tokens = [t for t in tokens if t not in ARTICLES] or tokens
+    return _LETTER_DIGIT.sub(" ", " ".join(_numbers_to_digits(tokens)))
+
+
+def normalize_choice(answer: Any) -> str:
+    """Option letter of a multiple-choice answer, or its normalized text"""
+    text = str(answer).strip().lower()
+    match = _CHOICE.match(text)
+    if match:
+        return match.group(1)
+    return normalize_answer(text)
+
+
+def _text_variants(answer: str) -> Iterator[str]:
+    """Alternatives separated by "/", ";" or "|", with and without optional "(...)" words"""
+    for alternative in _ALTERNATIVES.split(answer):
+        yield _PARENTHESES.sub(r"\1", alternative)
+        yield _PARENTHESES.sub(" ", alternative)
+
+
+def compile_question(question: Dict[str, Any]) -> Dict[str, Any]:
+    """Answer key entry for one objective question: normalized accepted forms"""
+    correct = str(question.get("correct_answer", "")).strip()
+    question_type = question.get("type", "")
+    accepted = set()
+
+    if question_type == "multiple_choice":
+        mode = "choice"
+        letter = normalize_choice(correct)
+        for option in question.get("options", []):
+            option_letter = normalize_choice(option)
+            text = _OPTION_PREFIX.sub("", option.strip().lower())
+            # correct_answer may be the letter or the full option text
+            if option_letter == letter or normalize_answer(text) == letter:
+                letter = option_letter
+                accepted.add(normalize_answer(text))
+        accepted.add(letter)
+    else:
+        mode = "text"
+        candidates = [correct] + [str(a) for a in question.get("accepted_answers", [])]
+        for candidate in candidates:
+            for variant in _text_variants(candidate):
+                accepted.add(normalize_answer(variant))
+        for full, short in ABBREVIATIONS.items():
+            if full in accepted:
+                accepted.add(short)
+
+    accepted.discard("")
+    return {
+        "mode": mode,
+        "accepted": sorted(accepted),
+        "fuzzy": question_type == "fill_blank",
+    }
+
+
+def iter_objective_questions(
+    content: Dict[str, Any]
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """(answer id, question) for every Listening/Reading question, ids as used in the answers"""
+    for section in content.get("listening", {}).get("sections", []):
+        for question in section.get("questions", []):
+            yield f"listening_s{section.get('id')}_q{question.get('id')}", question
+    for passage in content.get("reading", {}).get("passages", []):
+        for question in passage.get("questions", []):
+            yield f"reading_p{passage.get('id')}_q{question.get('id')}", question
+
+
+def compile_answer_key(content: Dict[str, Any]) -> Dict[str, Any]:
+    """Answer key stored as content["answer_key"] when a test is generated"""
+    return {
+        "version": ANSWER_KEY_VERSION,
+        "questions": {
+            answer_id: compile_question(question)
+            for answer_id, question in iter_objective_questions(content)
+        },
+    }
+
+
+def within_distance(a: str, b: str, limit: int) -> bool:
+    """Levenshtein distance of a and b is at most `limit` (stops early once it is exceeded)"""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            )
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+class AnswerKey:
+    """Compiled answer key of one test: scoring a question is a set lookup"""
+
+    def __init__(self, questions: Dict[str, Dict[str, Any]]):
+        self.questions = questions
+        self._accepted: Dict[str, FrozenSet[str]] = {}
+
+    @classmethod
+    def for_content(cls, content: Dict[str, Any]) -> "AnswerKey":
+        """Key stored with the content, or compiled now for older/outdated content"""
+        stored = content.get("answer_key")
+        if not stored or stored.get("version") != ANSWER_KEY_VERSION:
+            stored = compile_answer_key(content)
+        return cls(stored.get("questions", {}))
+
+    def normalize(self, answer_id: str, answer: Any) -> str:
+        entry = self.questions.get(answer_id)
+        if entry and entry.get("mode") == "choice":
+            return normalize_choice(answer)
+        return normalize_answer(answer)
+
+    def accepted(self, answer_id: str) -> FrozenSet[str]:
+        accepted = self._accepted.get(answer_id)
+        if accepted is None:
+            entry = self.questions.get(answer_id) or {}
+            accepted = self._accepted[answer_id] = frozenset(entry.get("accepted", []))
+        return accepted
+
+    def fuzzy_match(self, answer_id: str, normalized: str) -> bool:
+        """Bounded edit-distance match for fill-blank answers (ANSWER_MAX_EDIT_DISTANCE)"""
+        entry = self.questions.get(answer_id) or {}
+        if MAX_EDIT_DISTANCE <= 0 or not entry.get("fuzzy"):
+            return False
+        if len(normalized) < FUZZY_MIN_LENGTH:
+            return False
+        return any(
+            len(accepted) >= FUZZY_MIN_LENGTH
+            and within_distance(normalized, accepted, MAX_EDIT_DISTANCE)
+            for accepted in self.accepted(answer_id)
+        )
+
+    def is_correct(self, answer_id: str, answer: Optional[Any]) -> bool:
+        if answer is None:
+            return False
+        normalized = self.normalize(answer_id, answer)
+        if not normalized:
+            return False
+        return normalized in self.accepted(answer_id) or self.fuzzy_match(
+            answer_id, normalized
+        )
@@ -0,0 +1,193 @@
+import os
+import re
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from app.deadline import current_deadline, detached_deadline, time_left
+from app.logging_config import log_context, session_id_var
+from app.metrics import LLM_BATCH_ITEMS_RETRIED, LLM_BATCH_SIZE
+from app.services.llm_backend import LLMBackend
+from app.services.usage import attribute_usage_to
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Marks the start of each item in a batched prompt ("=== ITEM i2 ===")
+ITEM_HEADER = "=== ITEM {id} ==="
+ITEM_HEADER_PATTERN = re.compile(r"^=== ITEM (\S+) ===$", re.MULTILINE)
+
+BATCH_INSTRUCTION = """Evaluate each of the {count} items below independently, exactly as if each one were its own request: an item must not influence the scores of another.
+Each item starts with a line "=== ITEM <id> ===" and ends where the next item starts.
+
+Return JSON only, one entry per item:
+{{"results":[{{"id":"<id>","result":<the JSON object that item asks for>}}]}}"""
+
+# Output budget per item (gemini-2.5-flash accepts up to 65536 output tokens)
+OUTPUT_TOKENS_PER_ITEM = 8192
+MAX_OUTPUT_TOKENS = 65536
+
+
+@dataclass
+class _Item:
+    prompt: str
+    validate: Callable[[Dict[str, Any]], bool]
+    future: asyncio.Future
+    session_id: Optional[int]
+
+
+def split_batch_prompt(prompt: str) -> List[Tuple[str, str]]:
+    """(id, item prompt) pairs of a batched prompt (used by the stub backend)"""
+    headers = list(ITEM_HEADER_PATTERN.finditer(prompt))
+    return [
+        (
+            header.group(1),
+            prompt[header.end() : headers[i + 1].start() if i + 1 < len(headers) else len(prompt)].strip(),
+        )
+        for i, header in enumerate(headers)
+    ]
+
+
+class ScoringBatcher:
+    """Packs concurrent scoring requests of the same kind into one LLM call.
+
+    The first request of a kind opens a window of SCORING_BATCH_WINDOW_MS;
+    everything submitted before it closes (or until SCORING_BATCH_MAX_SIZE
+    requests are waiting) goes out as a single request with per-item ids.
+    Results are matched back by id and validated; items the model dropped or
+    answered malformed are scored with their own request, as is a batch of one.
+    Items are looked up in, and their results stored to, the LLM cache under the
+    key of their own (unbatched) request, so batching does not lose cache hits.
+    The calls run under their purpose's timeout rather than the deadline of the
+    caller that dispatched them; each caller waits until its own deadline.
+    Holding requests adds up to one window of latency, so this is off by default
+    and meant for submission spikes, where it saves RPM and instruction overhead.
+    """
+
+    def __init__(self, llm: LLMBackend):
+        self.llm = llm
+        self.enabled = os.getenv("SCORING_BATCH_ENABLED", "false").lower() == "true"
+        self.window = float(os.getenv("SCORING_BATCH_WINDOW_MS", "250")) / 1000
+        self.max_size = max(1, int(os.getenv("SCORING_BATCH_MAX_SIZE", "4")))
+
+        # (event loop, purpose, system instruction) -> items waiting for the window to close
+        self._pending: Dict[Tuple[Any, str, str], List[_Item]] = {}
+        self._timers: Dict[Tuple[Any, str, str], asyncio.TimerHandle] = {}
+        self._tasks = set()
+
+    async def submit(
+        self,
+        prompt: str,
+        system_instruction: str,
+        purpose: str,
+        validate: Callable[[Dict[str, Any]], bool],
+    ) -> Dict[str, Any]:
+        """Result of one scoring prompt (same as agenerate_json would return for it)"""
+        cached = await self.llm.aget_cached_json(prompt, system_instruction)
+        if isinstance(cached, dict) and validate(cached):
+            return cached
+
+        loop = asyncio.get_running_loop()
+        key = (loop, purpose, system_instruction)
+        item = _Item(prompt, validate, loop.create_future(), session_id_var.get())
+        batch = self._pending.setdefault(key, [])
+        batch.append(item)
+        if len(batch) >= self.max_size:
+            self._dispatch(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.window, self._dispatch, key)
+        # A caller whose deadline passes gives up: its item is cancelled and skipped
+        at = current_deadline()
+        return await asyncio.wait_for(item.future, time_left(at) if at is not None else None)
+
+    def _dispatch(self, key: Tuple[Any, str, str]):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, [])
+        # Callers that gave up (cancelled) are not sent
+        batch = [item for item in batch if not item.future.done()]
+        if not batch:
+            return
+        _, purpose, system_instruction = key
+        task = asyncio.create_task(self._run(purpose, system_instruction, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, purpose: str, system_instruction: str, batch: List[_Item]):
+        # The task inherited the context (session, deadline) of whichever caller
+        # dispatched the batch; the calls are only bounded by their own timeout
+        with log_context(session_id=None), detached_deadline(None):
+            await self._run_items(purpose, system_instruction, batch)
+
+    async def _run_items(self, purpose: str, system_instruction: str, batch: List[_Item]):
+        LLM_BATCH_SIZE.observe(len(batch), purpose=purpose)
+        retry = batch
+        if len(batch) > 1:
+            results = await self._run_batch(purpose, system_instruction, batch)
+            retry = []
+            for i, item in enumerate(batch):
+                result = results.get(f"i{i + 1}")
+                if isinstance(result, dict) and item.validate(result):
+                    await self.llm.aset_cached_json(item.prompt, system_instruction, result)
+                    if not item.future.done():
+                        item.future.set_result(result)
+                else:
+                    retry.append(item)
+            if retry:
+                LLM_BATCH_ITEMS_RETRIED.inc(len(retry), purpose=purpose)
+                logger.warning(
+                    "Batched %s call: %d of %d item(s) missing or invalid, scoring them individually",
+                    purpose, len(retry), len(batch),
+                )
+        await asyncio.gather(
+            *(self._run_single(purpose, system_instruction, item) for item in retry)
+        )
+
+    async def _run_batch(
+        self, purpose: str, system_instruction: str, batch: List[_Item]
+    ) -> Dict[str, Any]:
+        """Results by item id; empty if the batched call failed"""
+        parts = [BATCH_INSTRUCTION.format(count=len(batch))]
+        for i, item in enumerate(batch):
+            parts.append(f"{ITEM_HEADER.format(id=f'i{i + 1}')}\n{item.prompt}")
+        prompt = "\n\n".join(parts)
+
+        # Tokens are split between the sessions in the batch
+        sessions = [item.session_id for item in batch]
+        try:
+            with attribute_usage_to(sessions):
+                response = await self.llm.agenerate_json(
+                    prompt,
+                    system_instruction,
+                    purpose=purpose,
+                    max_output_tokens=min(OUTPUT_TOKENS_PER_ITEM * len(batch), MAX_OUTPUT_TOKENS),
+                )
+        except Exception as e:
+            logger.warning("Batched %s call with %d items failed: %s", purpose, len(batch), e)
+            return {}
+        logger.info("Scored %d %s item(s) in one request", len(batch), purpose)
+        entries = response.get("results", []) if isinstance(response, dict) else []
+        return {
+            str(entry.get("id")): entry.get("result")
+            for entry in entries
+            if isinstance(entry, dict)
+        }
+
+    async def _run_single(self, purpose: str, system_instruction: str, item: _Item):
+        if item.future.done():
+            return
+        try:
+            with log_context(session_id=item.session_id):
+                result = await self.llm.agenerate_json(
+                    item.prompt, system_instruction, purpose=purpose, cache=True
+                )
+        except Exception as e:
+            if not item.future.done():
+                item.future.set_exception(e)
+            return
+        if not item.future.done():
+            item.future.set_result(result)
@@ -0,0 +1,168 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+from app.services import answer_key as answer_key_module
+from app.services.answer_key import AnswerKey
+from app.services.scoring_service import ScoringService
+
+# skill -> (container key in content, answer key prefix, id field in detailed results, band table)
+OBJECTIVE_SKILLS = {
+    "listening": ("sections", "s", "section_id", ScoringService.LISTENING_BANDS),
+    "reading": ("passages", "p", "passage_id", ScoringService.READING_BANDS),
+}
+
+
+def _band_lookup(bands: Dict[int, float]) -> np.ndarray:
+    """Band table as an array indexed by raw score; one extra slot (0.0) for raw scores off the table"""
+    table = np.zeros(max(bands) + 2)
+    for raw, band in bands.items():
+        table[raw] = band
+    return table
+
+
+class _Batch:
+    """Flattened questions of a batch (one entry per question) and the per-session scores"""
+
+    def __init__(self, skill: str, items: Sequence[Tuple[Dict[str, Any], Dict[str, Any]]]):
+        self.skill = skill
+        self.items = items
+        container, prefix, _, _ = OBJECTIVE_SKILLS[skill]
+        normalized: List[str] = []
+        answered: List[bool] = []
+        # One entry per accepted form: (question index, form)
+        variant_questions: List[int] = []
+        variants: List[str] = []
+        fuzzy: List[Tuple[int, AnswerKey, str]] = []
+        # Few distinct answers per batch (A-D, True/False, short words): normalize each once
+        seen: Dict[Tuple[Any, str], str] = {}
+        counts: List[int] = []
+        for content, answers in items:
+            answer_key = AnswerKey.for_content(content)
+            count = len(normalized)
+            for group in content.get(skill, {}).get(container, []):
+                key_prefix = f"{skill}_{prefix}{group.get('id')}_q"
+                for question in group.get("questions", []):
+                    answer_id = f"{key_prefix}{question.get('id')}"
+                    entry = answer_key.questions.get(answer_id) or {}
+                    answer = answers.get(answer_id)
+                    answer = "" if answer is None else str(answer).strip()
+                    memo = (entry.get("mode"), answer)
+                    if memo not in seen:
+                        seen[memo] = answer_key.normalize(answer_id, answer)
+                    index = len(normalized)
+                    normalized.append(seen[memo])
+                    answered.append(bool(answer))
+                    for form in answer_key.accepted(answer_id):
+                        variant_questions.append(index)
+                        variants.append(form)
+                    if entry.get("fuzzy") and seen[memo]:
+                        fuzzy.append((index, answer_key, answer_id))
+            counts.append(len(normalized) - count)
+
+        self.total = np.asarray(counts, dtype=np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(self.total)))
+        rows = np.repeat(np.arange(len(items)), self.total)
+
+        # A question is correct when any of its accepted forms equals the normalized answer
+        users = np.array(normalized, dtype=str)
+        variant_index = np.asarray(variant_questions, dtype=np.intp)
+        matches = users[variant_index] == np.array(variants, dtype=str)
+        self.is_correct = (
+            np.bincount(variant_index, weights=matches, minlength=len(normalized)) > 0
+        )
+        if answer_key_module.MAX_EDIT_DISTANCE > 0:
+            for index, answer_key, answer_id in fuzzy:
+                if not self.is_correct[index]:
+                    self.is_correct[index] = answer_key.fuzzy_match(answer_id, normalized[index])
+
+        self.raw = np.bincount(rows, weights=self.is_correct, minlength=len(items)).astype(np.int64)
+        self.answered = np.bincount(rows, weights=answered, minlength=len(items)) > 0
+
+
+class BulkObjectiveScorer:
+    """Listening/Reading scoring for many sessions at once.
+
+    Answers of a whole batch are flattened into arrays, so comparison, raw
+    score counting and band lookup run as array operations instead of a
+    Python loop per question. Results have the same shape and values as
+    ScoringService.score_listening / score_reading.
+    """
+
+    def __init__(self):
+        self._tables = {
+            skill: _band_lookup(bands)
+            for skill, (_, _, _, bands) in OBJECTIVE_SKILLS.items()
+        }
+
+    def _bands(self, skill: str, batch: _Batch) -> np.ndarray:
+        # No answers, or answered but all wrong -> 0.0; otherwise the band table
+        table = self._tables[skill]
+        return np.where(
+            batch.answered & (batch.raw > 0),
+            table[np.minimum(batch.raw, len(table) - 1)],
+            0.0,
+        ).round(1)
+
+    @staticmethod
+    def _result(batch: _Batch, row: int, band: float) -> Dict[str, Any]:
+        """Full result for one session; detailed results are rebuilt from its content"""
+        container, prefix, group_field, _ = OBJECTIVE_SKILLS[batch.skill]
+        content, answers = batch.items[row]
+        is_correct = iter(batch.is_correct[batch.offsets[row] : batch.offsets[row + 1]].tolist())
+        detailed_results = []
+        for group in content.get(batch.skill, {}).get(container, []):
+            group_id = group.get("id")
+            for question in group.get("questions", []):
+                qid = question.get("id")
+                answer = answers.get(f"{batch.skill}_{prefix}{group_id}_q{qid}")
+                detailed_results.append(
+                    {
+                        "question_id": qid,
+                        group_field: group_id,
+                        "user_answer": "" if answer is None else str(answer).strip(),
+                        "correct_answer": str(question.get("correct_answer", "")).strip(),
+                        "is_correct": next(is_correct),
+                    }
+                )
+        return {
+            "raw_score": int(batch.raw[row]),
+            "total_questions": int(batch.total[row]),
+            "band": band,
+            "detailed_results": detailed_results,
+        }
+
+    def score(
+        self, skill: str, items: Sequence[Tuple[Dict[str, Any], Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """Score (content, answers) pairs for one skill ("listening" or "reading")"""
+        batch = _Batch(skill, items)
+        bands = self._bands(skill, batch).tolist()
+        return [self._result(batch, row, band) for row, band in enumerate(bands)]
+
+    def rescore(
+        self,
+        skill: str,
+        items: Sequence[Tuple[Dict[str, Any], Dict[str, Any]]],
+        previous: Sequence[Optional[Dict[str, Any]]],
+    ) -> Dict[int, Dict[str, Any]]:
+        """Score like `score`, returning only rows whose result differs from `previous`.
+
+        Rows are compared on raw score, band and per-question correctness, so
+        detailed results are only built for sessions that actually changed.
+        """
+        batch = _Batch(skill, items)
+        bands = self._bands(skill, batch)
+        changed: Dict[int, Dict[str, Any]] = {}
+        for row, old in enumerate(previous):
+            old = old or {}
+            start, end = batch.offsets[row], batch.offsets[row + 1]
+            same = (
+                old.get("raw_score") == batch.raw[row]
+                and old.get("total_questions") == batch.total[row]
+                and old.get("band") == bands[row]
+                and [d.get("is_correct") for d in old.get("detailed_results", [])]
+                == batch.is_correct[start:end].tolist()
+            )
+            if not same:
+                changed[row] = self._result(batch, row, float(bands[row]))
+        return changed
@@ -0,0 +1,310 @@
+import os
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from app.database import SessionLocal
+from app.models.content_pool import ContentPoolItem
+from app.models.test_session import Level, Phase, TestSession
+from app.services.single_flight import acquire_lease, release_lease
+from app.services.test_generator import TestGeneratorService
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class ContentPoolService:
+    """Pool of pre-generated test content per Level x Phase, refilled in the background"""
+
+    def __init__(self, test_generator: TestGeneratorService):
+        self.test_generator = test_generator
+        self.enabled = os.getenv("CONTENT_POOL_ENABLED", "true").lower() == "true"
+        # Refill a Level x Phase bucket whenever it drops below this many items
+        self.low_water = int(os.getenv("CONTENT_POOL_LOW_WATER", "2"))
+        # Seconds between refill passes (the worker is also woken up on every claim)
+        self.refill_interval = float(os.getenv("CONTENT_POOL_REFILL_INTERVAL", "60"))
+        # A process that died while refilling blocks its bucket at most this long
+        self.lease_ttl = float(os.getenv("CONTENT_POOL_LEASE_TTL", "300"))
+        # Generate phase 2 content in the background as soon as phase 1 starts
+        self.prefetch_phase2 = os.getenv("PHASE2_PREFETCH_ENABLED", "true").lower() == "true"
+        # Speculative content of a session idle for this long goes back to the pool
+        self.reservation_ttl = float(os.getenv("PHASE2_PREFETCH_TTL", "7200"))
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def generate(self, level: Level, phase: Phase) -> Dict[str, Any]:
+        """Generate fresh content for a Level x Phase (calls Gemini)"""
+        if phase == Phase.LISTENING_SPEAKING:
+            return self.test_generator.generate_listening_speaking(level)
+        if phase == Phase.READING_WRITING:
+            return self.test_generator.generate_reading_writing(level)
+        raise ValueError(f"Invalid phase: {phase}")
+
+    async def agenerate(self, level: Level, phase: Phase) -> Dict[str, Any]:
+        """Async version of generate"""
+        if phase == Phase.LISTENING_SPEAKING:
+            return await self.test_generator.agenerate_listening_speaking(level)
+        if phase == Phase.READING_WRITING:
+            return await self.test_generator.agenerate_reading_writing(level)
+        raise ValueError(f"Invalid phase: {phase}")
+
+    def claim(self, db: Session, level: Level, phase: Phase) -> Optional[Dict[str, Any]]:
+        """Atomically take one pooled item out of the pool, or None if the pool is empty.
+
+        The DELETE ... WHERE id = ? acts as the claim: only the request whose delete
+        affects the row gets the content, so concurrent requests (and workers) never
+        receive the same test.
+        """
+        for _ in range(3):
+            item = (
+                db.query(ContentPoolItem.id, ContentPoolItem.content)
+                .filter(
+                    ContentPoolItem.level == level,
+                    ContentPoolItem.phase == phase,
+                    ContentPoolItem.session_id.is_(None),
+                )
+                .order_by(ContentPoolItem.id)
+                .first()
+            )
+            if item is None:
+                return None
+
+            claimed = (
+                db.query(ContentPoolItem)
+                .filter(ContentPoolItem.id == item.id)
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+            if claimed == 1:
+                self._wake.set()
+                return item.content
+        return None
+
+    def claim_reserved(self, db: Session, session_id: int) -> Optional[Dict[str, Any]]:
+        """Take the speculative content reserved for a session, or None if there is none"""
+        item = (
+            db.query(ContentPoolItem.id, ContentPoolItem.content)
+            .filter(ContentPoolItem.session_id == session_id)
+            .order_by(ContentPoolItem.id)
+            .first()
+        )
+        if item is None:
+            return None
+        claimed = (
+            db.query(ContentPoolItem)
+            .filter(ContentPoolItem.id == item.id)
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        return item.content if claimed == 1 else None
+
+    def add(
+        self,
+        level: Level,
+        phase: Phase,
+        content: Dict[str, Any],
+        session_id: Optional[int] = None,
+    ):
+        """Put content in the pool, reserved for session_id if given"""
+        db = SessionLocal()
+        try:
+            db.add(
+                ContentPoolItem(level=level, phase=phase, content=content, session_id=session_id)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def release_reservations(self) -> int:
+        """Hand speculative content back to the pool once its session no longer needs it.
+
+        That is when the session got its phase 2 content some other way, or has
+        not been updated for PHASE2_PREFETCH_TTL seconds (abandoned). With the
+        pool disabled the content is deleted instead. Returns items released.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.reservation_ttl)
+        unneeded = select(TestSession.id).where(
+            or_(
+                TestSession.phase2_content.isnot(None),
+                func.coalesce(TestSession.updated_at, TestSession.created_at) < cutoff,
+            )
+        )
+        db = SessionLocal()
+        try:
+            items = db.query(ContentPoolItem).filter(
+                ContentPoolItem.session_id.isnot(None),
+                or_(
+                    ContentPoolItem.session_id.in_(unneeded),
+                    # Session deleted
+                    ~ContentPoolItem.session_id.in_(select(TestSession.id)),
+                ),
+            )
+            if self.enabled:
+                released = items.update(
+                    {ContentPoolItem.session_id: None}, synchronize_session=False
+                )
+            else:
+                released = items.delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        if released:
+            logger.info("Released %d speculative phase 2 item(s)", released)
+            self._wake.set()
+        return released
+
+    def acquire(self, db: Session, level: Level, phase: Phase) -> Dict[str, Any]:
+        """Get content for a session: from the pool if possible, otherwise generate it now"""
+        if self.enabled:
+            content = self.claim(db, level, phase)
+            if content is not None:
+                logger.info("Content pool hit: %s/%s", level.value, phase.value)
+                return content
+            logger.info("Content pool empty: %s/%s, generating on demand", level.value, phase.value)
+            self._wake.set()
+        return self.generate(level, phase)
+
+    def claim_once(self, level: Level, phase: Phase) -> Optional[Dict[str, Any]]:
+        """claim() in a short session of its own (nothing stays checked out afterwards)"""
+        db = SessionLocal()
+        try:
+            return self.claim(db, level, phase)
+        finally:
+            db.close()
+
+    async def aacquire(self, level: Level, phase: Phase) -> Dict[str, Any]:
+        """Async version of acquire: on-demand generation awaits Gemini on the event loop.
+
+        The claim runs in a worker thread with its own short transaction, so no
+        database connection is held while the content is generated.
+        """
+        if self.enabled:
+            content = await asyncio.to_thread(self.claim_once, level, phase)
+            if content is not None:
+                logger.info("Content pool hit: %s/%s", level.value, phase.value)
+                return content
+            logger.info("Content pool empty: %s/%s, generating on demand", level.value, phase.value)
+            self._wake.set()
+        return await self.agenerate(level, phase)
+
+    async def atake_reserved(self, session_id: int) -> Optional[Dict[str, Any]]:
+        """claim_reserved in a worker thread with a short session of its own"""
+
+        def take():
+            db = SessionLocal()
+            try:
+                return self.claim_reserved(db, session_id)
+            finally:
+                db.close()
+
+        return await asyncio.to_thread(take)
+
+    def available_counts(self, db: Session) -> Dict[str, int]:
+        """Number of unclaimed items per Level x Phase (not counting reserved ones)"""
+        rows = (
+            db.query(ContentPoolItem.level, ContentPoolItem.phase, func.count(ContentPoolItem.id))
+            .filter(ContentPoolItem.session_id.is_(None))
+            .group_by(ContentPoolItem.level, ContentPoolItem.phase)
+            .all()
+        )
+        counts = {f"{level.value}/{phase.value}": 0 for level in Level for phase in Phase}
+        for level, phase, count in rows:
+            counts[f"{level.value}/{phase.value}"] = count
+        return counts
+
+    def refill_once(self) -> int:
+        """Top up every Level x Phase bucket to the low-water mark. Returns items added.
+
+        Each item is counted and generated under a lease per bucket, so API
+        processes sharing the pool do not all top up the same bucket at once;
+        a bucket whose lease is held by another process is skipped.
+        """
+        added = 0
+        for level in Level:
+            for phase in Phase:
+                lease = f"content-pool:{level.value}:{phase.value}"
+                while not self._stop.is_set():
+                    token = acquire_lease(lease, self.lease_ttl)
+                    if token is None:
+                        break
+                    try:
+                        if not self._refill_item(level, phase):
+                            break
+                    finally:
+                        release_lease(lease, token)
+                    added += 1
+        return added
+
+    def _refill_item(self, level: Level, phase: Phase) -> bool:
+        """Add one item to a bucket below the low-water mark; False if it is full"""
+        db = SessionLocal()
+        try:
+            count = (
+                db.query(func.count(ContentPoolItem.id))
+                .filter(
+                    ContentPoolItem.level == level,
+                    ContentPoolItem.phase == phase,
+                    ContentPoolItem.session_id.is_(None),
+                )
+                .scalar()
+            )
+        finally:
+            db.close()
+        if count >= self.low_water:
+            return False
+
+        # Generate outside of any DB session, then store the result
+        content = self.generate(level, phase)
+        db = SessionLocal()
+        try:
+            db.add(ContentPoolItem(level=level, phase=phase, content=content))
+            db.commit()
+        finally:
+            db.close()
+        logger.info(
+            "Content pool refilled: %s/%s (%d/%d)",
+            level.value, phase.value, count + 1, self.low_water,
+        )
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.prefetch_phase2:
+                    self.release_reservations()
+                if self.enabled and self.low_water > 0:
+                    self.refill_once()
+            except Exception as e:
+                logger.error("Content pool refill error: %s", e)
+            self._wake.wait(self.refill_interval)
+            self._wake.clear()
+
+    def start(self):
+        """Start the background worker: refills the pool and releases speculative
+        content of abandoned sessions (no-op if there is nothing to do or already running)"""
+        refill = self.enabled and self.low_water > 0
+        if not refill and not self.prefetch_phase2:
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="content-pool-refill", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background refill worker"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
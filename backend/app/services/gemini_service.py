@@ -1,156 +1,274 @@
 import os
+import json
 import time
+import asyncio
+import logging
+import threading
 import google.generativeai as genai
-from typing import Dict, Any, Optional
+import google.ai.generativelanguage as glm
+from google.api_core import exceptions as google_exceptions
+from typing import AsyncIterator, Dict, Any, List, Optional
 from dotenv import load_dotenv
 
+from app.deadline import time_left
+from app.metrics import GEMINI_INVALID_KEY, GEMINI_RATE_LIMITED, LLM_REQUESTS_IN_FLIGHT
+from app.services.key_pool import ApiKeyState, KeyPool
+from app.services.llm_backend import LLMBackend, LLMTimeoutError, parse_json
+from app.services.llm_cache import LLMCache
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
 
-class GeminiService:
-    """Service for interacting with Google Gemini API (free tier) with smart key rotation"""
 
-    # Class-level variables to track key usage
-    _key1_last_used = 0  # Timestamp when key1 was last used
-    _key2_last_used = 0  # Timestamp when key2 was last used
-    _current_key_index = 1  # 1 or 2
-    _key1 = None
-    _key2 = None
-    _key1_invalid = False  # Track if key1 is invalid/expired
-    _key2_invalid = False  # Track if key2 is invalid/expired
-    _cooldown_seconds = 300  # 5 minutes = 300 seconds
+class GeminiService(LLMBackend):
+    """Service for interacting with Google Gemini API (free tier) through a pool of API keys"""
 
-    def __init__(self):
-        # Load API keys from .env
-        self._key1 = os.getenv("GEMINI_API_KEY")
-        self._key2 = os.getenv("GEMINI_API_KEY_BACKUP")
+    name = "gemini"
+    MODEL_NAME = "gemini-2.5-flash"
+    JSON_TEMPERATURE = 0.3
+    JSON_MAX_OUTPUT_TOKENS = 8192
 
-        if not self._key1 and not self._key2:
-            raise ValueError(
-                "GEMINI_API_KEY or GEMINI_API_KEY_BACKUP must be set in .env file"
-            )
+    # Shared by all instances: key budgets and health are tracked per process
+    _pool: Optional[KeyPool] = None
+    _pool_lock = threading.Lock()
+    _cache: Optional[LLMCache] = None
+    # One long-lived model per key (by key index), each with its own clients
+    _models: Dict[int, genai.GenerativeModel] = {}
+    _async_clients_loop = None
 
-        if not self._key1:
-            print("Warning: GEMINI_API_KEY not found, using GEMINI_API_KEY_BACKUP only")
-            self._key1 = self._key2
-            self._key2 = None
-
-        if not self._key2:
-            print("Warning: GEMINI_API_KEY_BACKUP not found, using GEMINI_API_KEY only")
-
-        # Initialize with key1
-        self._switch_key(1)
-        # Use gemini-1.5-flash for free tier (optimized for speed and cost)
-        self.model = genai.GenerativeModel("gemini-2.5-flash")
-
-    def _switch_key(self, key_index: int):
-        """Switch to a specific API key"""
-        if key_index == 1:
-            if not self._key1:
-                raise ValueError("GEMINI_API_KEY not available")
-            genai.configure(api_key=self._key1)
-            self._current_key_index = 1
-            self._key1_last_used = time.time()
-            print(f"Switched to GEMINI_API_KEY (Key 1)")
-        elif key_index == 2:
-            if not self._key2:
-                raise ValueError("GEMINI_API_KEY_BACKUP not available")
-            genai.configure(api_key=self._key2)
-            self._current_key_index = 2
-            self._key2_last_used = time.time()
-            print(f"Switched to GEMINI_API_KEY_BACKUP (Key 2)")
-        else:
-            raise ValueError("key_index must be 1 or 2")
+    # Limit on concurrent in-flight Gemini calls (per process)
+    _max_concurrency = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+    _sync_semaphore = threading.BoundedSemaphore(_max_concurrency)
+    _async_semaphore: Optional[asyncio.Semaphore] = None
+    _async_semaphore_loop = None
 
-    def _get_available_key(self) -> int:
-        """
-        Smart key selection logic:
-        - Skip invalid keys
-        - If current key was used recently (< 5 minutes), switch to other key
-        - If current key was used > 5 minutes ago, use current key
-        - If only one key available, use that key
-        """
-        current_time = time.time()
+    # Longest a call waits for rate-limit budget on some key before failing
+    _max_queue_wait = float(os.getenv("GEMINI_MAX_QUEUE_WAIT", "60"))
+    _warm_up_enabled = os.getenv("GEMINI_WARMUP", "true").lower() == "true"
+    # Single attempt: a failing warm-up must not hold up startup
+    _WARM_UP_OPTIONS = {"timeout": 10, "retry": None}
 
-        # If only one key available, use it (if not invalid)
-        if not self._key2:
-            if self._key1_invalid:
-                raise ValueError(
-                    "GEMINI_API_KEY is invalid/expired. Please update it in .env file"
-                )
-            return 1
-        if not self._key1:
-            if self._key2_invalid:
-                raise ValueError(
-                    "GEMINI_API_KEY_BACKUP is invalid/expired. Please update it in .env file"
+    def __init__(self):
+        with GeminiService._pool_lock:
+            if GeminiService._pool is None:
+                pool = KeyPool.from_env()
+                GeminiService._models = {
+                    key.index: self._build_model(key) for key in pool.keys
+                }
+                GeminiService._pool = pool
+                pool.start_health_probe(self._probe_key)
+                logger.info("Gemini key pool: %d key(s)", len(pool.keys))
+                GeminiService._cache = LLMCache()
+        self.pool = GeminiService._pool
+        self.cache = GeminiService._cache
+
+    @classmethod
+    def _build_model(cls, key: ApiKeyState) -> genai.GenerativeModel:
+        """Model bound to one key through its own client, instead of the global genai.configure.
+
+        gRPC clients keep their channel open and are safe to share between threads.
+        """
+        # Use gemini-2.5-flash for free tier (optimized for speed and cost)
+        model = genai.GenerativeModel(cls.MODEL_NAME)
+        model._client = glm.GenerativeServiceClient(
+            client_options={"api_key": key.api_key}
+        )
+        return model
+
+    @classmethod
+    def _model_for(cls, key: ApiKeyState) -> genai.GenerativeModel:
+        return cls._models[key.index]
+
+    @classmethod
+    def _amodel_for(cls, key: ApiKeyState) -> genai.GenerativeModel:
+        """Model for async calls; async clients belong to the event loop that created them"""
+        loop = asyncio.get_running_loop()
+        if cls._async_clients_loop is not loop:
+            for pooled in cls._pool.keys:
+                cls._models[pooled.index]._async_client = glm.GenerativeServiceAsyncClient(
+                    client_options={"api_key": pooled.api_key}
                 )
-            return 2
+            cls._async_clients_loop = loop
+        return cls._models[key.index]
 
-        # If current key is invalid, switch to other key
-        if self._current_key_index == 1 and self._key1_invalid:
-            if self._key2_invalid:
-                raise ValueError(
-                    "Both API keys are invalid/expired. Please update them in .env file"
-                )
-            return 2
-        if self._current_key_index == 2 and self._key2_invalid:
-            if self._key1_invalid:
-                raise ValueError(
-                    "Both API keys are invalid/expired. Please update them in .env file"
+    async def awarm_up(self):
+        """Open the connections of every key's clients (called at application startup)"""
+        if not self._warm_up_enabled:
+            return
+
+        async def warm(key: ApiKeyState):
+            model = self._amodel_for(key)
+            try:
+                await asyncio.gather(
+                    model.count_tokens_async(
+                        "ping", request_options=self._WARM_UP_OPTIONS
+                    ),
+                    asyncio.to_thread(
+                        model.count_tokens, "ping", request_options=self._WARM_UP_OPTIONS
+                    ),
                 )
-            return 1
-
-        # Check time since last use
-        if self._current_key_index == 1:
-            time_since_key1 = current_time - self._key1_last_used
-            if time_since_key1 < self._cooldown_seconds:
-                # Key1 was used recently, switch to key2 (if not invalid)
-                if not self._key2_invalid:
-                    return 2
-                # If key2 is invalid, use key1 anyway
-                return 1
-            else:
-                # Key1 is available (5+ minutes ago), use key1
-                return 1
-        else:  # current_key_index == 2
-            time_since_key2 = current_time - self._key2_last_used
-            if time_since_key2 < self._cooldown_seconds:
-                # Key2 was used recently, switch to key1 (if not invalid)
-                if not self._key1_invalid:
-                    return 1
-                # If key1 is invalid, use key2 anyway
-                return 2
-            else:
-                # Key2 is available (5+ minutes ago), use key2
-                return 2
-
-    def _ensure_available_key(self, force_key: Optional[int] = None):
-        """Ensure we're using an available key (switch if needed)"""
-        if force_key is not None:
-            # Force use specific key
-            if force_key == 1 and not self._key1_invalid and self._key1:
-                if self._current_key_index != 1:
-                    self._switch_key(1)
-                return
-            elif force_key == 2 and not self._key2_invalid and self._key2:
-                if self._current_key_index != 2:
-                    self._switch_key(2)
-                return
-            else:
-                # Fallback to auto selection if forced key is invalid
-                print(
-                    f"Warning: Forced key {force_key} is invalid, using auto selection"
+            except Exception as e:
+                logger.warning(
+                    "Gemini Key %d warm-up failed: %s", key.index, e,
+                    extra={"key_index": key.index},
                 )
 
-        target_key = self._get_available_key()
-        if target_key != self._current_key_index:
-            self._switch_key(target_key)
+        await asyncio.gather(*(warm(key) for key in self.pool.keys if key.is_healthy()))
+
+    @classmethod
+    def _probe_key(cls, key: ApiKeyState):
+        """Minimal request on the key's own client; raises if the key still fails"""
+        cls._model_for(key).generate_content(
+            "ping",
+            generation_config=genai.types.GenerationConfig(max_output_tokens=1),
+            request_options={"timeout": 30, "retry": None},
+        )
+
+    @staticmethod
+    def _estimate_tokens(contents: str, max_output_tokens: int) -> int:
+        """Rough token count reserved before the call (~4 characters per token)"""
+        return len(contents) // 4 + min(max_output_tokens, 2048)
+
+    def _acquire_key(
+        self, tokens: int, preferred: Optional[int], exclude: List[int], purpose: str, at: float
+    ) -> ApiKeyState:
+        """Reserve budget on a key, sleeping while every key is rate limited (until `at` at most)"""
+        deadline = time.monotonic() + self._max_queue_wait
+        while True:
+            key, wait = self.pool.try_acquire(tokens, preferred, exclude)
+            if key is not None:
+                return key
+            self._check_queue_wait(wait, deadline, purpose, at)
+            time.sleep(max(wait, 0.05))
+
+    async def _aacquire_key(
+        self, tokens: int, preferred: Optional[int], exclude: List[int], purpose: str, at: float
+    ) -> ApiKeyState:
+        """Async version of _acquire_key: waits on the event loop instead of blocking"""
+        deadline = time.monotonic() + self._max_queue_wait
+        while True:
+            key, wait = self.pool.try_acquire(tokens, preferred, exclude)
+            if key is not None:
+                return key
+            self._check_queue_wait(wait, deadline, purpose, at)
+            await asyncio.sleep(max(wait, 0.05))
+
+    def _check_queue_wait(self, wait: float, deadline: float, purpose: str, at: float):
+        """Give up waiting for a key if the wait would run past the queue limit or the call deadline"""
+        if time.monotonic() + wait <= min(deadline, at):
+            return
+        if at < deadline:
+            raise self.timeout_error(purpose, "waiting for a Gemini key")
+        raise RuntimeError("All Gemini API keys are rate limited, please try again later")
+
+    def _record_usage(
+        self, key: ApiKeyState, estimated: int, response, purpose: str, started: float
+    ):
+        usage = getattr(response, "usage_metadata", None)
+        total = getattr(usage, "total_token_count", 0) if usage else 0
+        if total:
+            self.pool.record_tokens(key, estimated, total)
+            prompt = getattr(usage, "prompt_token_count", 0) or 0
+            # Output = candidates + thinking tokens, both billed as output
+            self.record_usage(
+                purpose, prompt, total - prompt, started, key_index=key.index, model=self.MODEL_NAME
+            )
+
+    @classmethod
+    def _get_async_semaphore(cls) -> asyncio.Semaphore:
+        """Semaphore limiting in-flight async Gemini calls (one per event loop)"""
+        loop = asyncio.get_running_loop()
+        if cls._async_semaphore is None or cls._async_semaphore_loop is not loop:
+            cls._async_semaphore = asyncio.Semaphore(cls._max_concurrency)
+            cls._async_semaphore_loop = loop
+        return cls._async_semaphore
+
+    def _build_request(
+        self,
+        prompt: str,
+        system_instruction: Optional[str],
+        temperature: float,
+        max_output_tokens: int,
+    ):
+        """Build the request contents and generation config for a Gemini call"""
+        generation_config = genai.types.GenerationConfig(
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+        )
+        if system_instruction:
+            contents = f"{system_instruction}\n\n{prompt}"
         else:
-            # Update last used time for current key
-            if self._current_key_index == 1:
-                self._key1_last_used = time.time()
-            else:
-                self._key2_last_used = time.time()
+            contents = prompt
+        return contents, generation_config
+
+    def _handle_key_error(
+        self, key: ApiKeyState, e: Exception, purpose: str, started: float, at: float
+    ):
+        """Handle a failed Gemini call: take a bad key out of rotation.
+
+        Errors are classified by type: quota errors (429) and API_KEY_INVALID
+        rejections bench the key and return normally, so the call is retried
+        with another key; anything else is raised without touching the pool.
+        The attempt is recorded in the metrics either way. A call that ran out
+        of time raises LLMTimeoutError: retrying on another key would only run
+        past the deadline.
+        """
+        label = str(key.index)
+        if self._is_timeout(e, at):
+            self.observe_call(label, purpose, "timeout", started)
+            raise self.timeout_error(purpose, f"on key {key.index}") from e
+
+        error_str = str(e)
+        if self._is_key_invalid(e):
+            self.observe_call(label, purpose, "invalid_key", started)
+            GEMINI_INVALID_KEY.inc(key=label)
+            self.pool.mark_invalid(key, error_str)
+            return
+
+        if isinstance(e, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+            self.observe_call(label, purpose, "rate_limited", started)
+            GEMINI_RATE_LIMITED.inc(key=label)
+            self.pool.mark_exhausted(key, error_str)
+            return
+
+        self.observe_call(label, purpose, "error", started)
+        logger.error(
+            "Gemini API error (%s): %s", type(e).__name__, e,
+            extra={"key_index": key.index},
+        )
+        raise e
+
+    @staticmethod
+    def _is_key_invalid(e: Exception) -> bool:
+        """Rejected because of the key itself (invalid or expired): reason API_KEY_INVALID"""
+        if not isinstance(
+            e, (google_exceptions.InvalidArgument, google_exceptions.PermissionDenied)
+        ):
+            return False
+        # The reason comes from the ErrorInfo detail; older clients only put it in the message
+        return e.reason == "API_KEY_INVALID" or "API_KEY_INVALID" in str(e)
+
+    @staticmethod
+    def _is_timeout(e: Exception, at: float) -> bool:
+        return (
+            isinstance(e, (TimeoutError, google_exceptions.DeadlineExceeded))
+            or time.monotonic() >= at
+        )
+
+    async def _await_slot(self, at: float, purpose: str):
+        """Take a slot of the async semaphore, waiting until `at` at most"""
+        try:
+            await asyncio.wait_for(self._get_async_semaphore().acquire(), time_left(at))
+        except asyncio.TimeoutError:
+            raise self.timeout_error(purpose, "waiting for a free Gemini slot") from None
+
+    def _attempt_timeout(self, at: float, purpose: str) -> float:
+        """Time left for the next attempt; raises LLMTimeoutError if there is none"""
+        timeout = time_left(at)
+        if timeout <= 0:
+            raise self.timeout_error(purpose, "before the call could be retried")
+        return timeout
 
     def generate_content(
         self,
@@ -159,183 +277,323 @@ class GeminiService:
         temperature: float = 0.7,
         max_output_tokens: int = 8192,
         force_key: Optional[int] = None,
+        purpose: str = "",
     ) -> str:
-        """Generate content using Gemini API with smart key rotation
+        """Generate content using Gemini API, routed to the key with the most headroom
 
         Args:
             prompt: The prompt to send to Gemini
             system_instruction: Optional system instruction
             temperature: Generation temperature
             max_output_tokens: Maximum output tokens
-            force_key: Force use specific key (1 or 2), None for auto selection
+            force_key: Prefer a specific key (1-based) while it has budget, None for auto selection
+            purpose: What the call is for (shown in logs and metrics)
         """
-        # Ensure we're using an available key (or force specific key)
-        self._ensure_available_key(force_key=force_key)
+        contents, generation_config = self._build_request(
+            prompt, system_instruction, temperature, max_output_tokens
+        )
+        estimated = self._estimate_tokens(contents, max_output_tokens)
+        label = purpose or "generic"
+        at = self.call_deadline(purpose)
 
+        if not self._sync_semaphore.acquire(timeout=time_left(at)):
+            raise self.timeout_error(purpose, "waiting for a free Gemini slot")
         try:
-            generation_config = genai.types.GenerationConfig(
-                temperature=temperature,
-                max_output_tokens=max_output_tokens,
-            )
-
             start_time = time.time()
-            if system_instruction:
-                response = self.model.generate_content(
-                    f"{system_instruction}\n\n{prompt}",
-                    generation_config=generation_config,
-                )
-            else:
-                response = self.model.generate_content(
-                    prompt, generation_config=generation_config
+            tried: List[int] = []
+            while True:
+                key = self._acquire_key(estimated, force_key, tried, purpose, at)
+                attempt_start = time.perf_counter()
+                try:
+                    with LLM_REQUESTS_IN_FLIGHT.track_inprogress(purpose=label):
+                        response = self._model_for(key).generate_content(
+                            contents,
+                            generation_config=generation_config,
+                            request_options={"timeout": self._attempt_timeout(at, purpose)},
+                        )
+                except LLMTimeoutError:
+                    raise
+                except Exception as e:
+                    self._handle_key_error(key, e, purpose, attempt_start, at)
+                    tried.append(key.index)
+                    continue
+                self.observe_call(str(key.index), purpose, "success", attempt_start)
+                self._record_usage(key, estimated, response, purpose, attempt_start)
+                elapsed = time.time() - start_time
+                logger.info(
+                    "Gemini API call (%s) took %.2f seconds (using Key %d)",
+                    label, elapsed, key.index,
+                    extra={"key_index": key.index},
                 )
+                return response.text
+        finally:
+            self._sync_semaphore.release()
 
-            elapsed = time.time() - start_time
-            print(
-                f"Gemini API call took {elapsed:.2f} seconds (using Key {self._current_key_index})"
-            )
-            return response.text
-        except Exception as e:
-            error_str = str(e)
-            error_lower = error_str.lower()
-
-            # Check if current key is invalid/expired
-            is_key_invalid = (
-                "api_key_invalid" in error_lower
-                or "api key expired" in error_lower
-                or "api key invalid" in error_lower
-                or "expired" in error_lower
-                or "invalid" in error_lower
-                and "key" in error_lower
-            )
+    async def agenerate_content(
+        self,
+        prompt: str,
+        system_instruction: Optional[str] = None,
+        temperature: float = 0.7,
+        max_output_tokens: int = 8192,
+        force_key: Optional[int] = None,
+        purpose: str = "",
+    ) -> str:
+        """Async version of generate_content.
 
-            # Mark current key as invalid if detected
-            if is_key_invalid:
-                if self._current_key_index == 1:
-                    self._key1_invalid = True
-                    print(
-                        f"ERROR: GEMINI_API_KEY (Key 1) is invalid/expired. Marking as invalid."
-                    )
-                else:
-                    self._key2_invalid = True
-                    print(
-                        f"ERROR: GEMINI_API_KEY_BACKUP (Key 2) is invalid/expired. Marking as invalid."
-                    )
-
-            # If key is invalid and we have backup key, try switching
-            if is_key_invalid and self._key1 and self._key2:
-                other_key = 2 if self._current_key_index == 1 else 1
-                # Check if other key is also invalid
-                if (other_key == 1 and self._key1_invalid) or (
-                    other_key == 2 and self._key2_invalid
-                ):
-                    raise ValueError(
-                        f"Both API keys are invalid/expired. Please update them in .env file. "
-                        f"Key 1 invalid: {self._key1_invalid}, Key 2 invalid: {self._key2_invalid}"
-                    )
-
-                print(
-                    f"Key {self._current_key_index} is invalid, switching to Key {other_key}..."
-                )
-                self._switch_key(other_key)
-                # Retry once with new key
+        Awaits the Gemini call on the event loop instead of blocking a worker
+        thread. At most GEMINI_MAX_CONCURRENCY calls are in flight at once;
+        further callers wait on the semaphore. The whole call (semaphore, key
+        and retries included) is cancelled at its deadline with LLMTimeoutError.
+        """
+        contents, generation_config = self._build_request(
+            prompt, system_instruction, temperature, max_output_tokens
+        )
+        estimated = self._estimate_tokens(contents, max_output_tokens)
+        label = purpose or "generic"
+        at = self.call_deadline(purpose)
+
+        await self._await_slot(at, purpose)
+        try:
+            start_time = time.time()
+            tried: List[int] = []
+            while True:
+                key = await self._aacquire_key(estimated, force_key, tried, purpose, at)
+                attempt_start = time.perf_counter()
                 try:
-                    if system_instruction:
-                        response = self.model.generate_content(
-                            f"{system_instruction}\n\n{prompt}",
-                            generation_config=generation_config,
+                    timeout = self._attempt_timeout(at, purpose)
+                    with LLM_REQUESTS_IN_FLIGHT.track_inprogress(purpose=label):
+                        response = await asyncio.wait_for(
+                            self._amodel_for(key).generate_content_async(
+                                contents,
+                                generation_config=generation_config,
+                                request_options={"timeout": timeout},
+                            ),
+                            timeout,
                         )
-                    else:
-                        response = self.model.generate_content(
-                            prompt, generation_config=generation_config
-                        )
-                    elapsed = time.time() - start_time
-                    print(
-                        f"Gemini API call succeeded after key switch, took {elapsed:.2f} seconds (using Key {self._current_key_index})"
-                    )
-                    return response.text
-                except Exception as retry_error:
-                    print(f"Gemini API Error after key switch: {retry_error}")
-                    raise retry_error
-
-            # If rate limit error and we have backup key, try switching
-            if (
-                ("429" in error_str or "quota" in error_lower or "rate" in error_lower)
-                and self._key1
-                and self._key2
-            ):
-                other_key = 2 if self._current_key_index == 1 else 1
-                # Skip if other key is invalid
-                if (other_key == 1 and self._key1_invalid) or (
-                    other_key == 2 and self._key2_invalid
-                ):
-                    print(
-                        f"Rate limit detected but backup key is also invalid. Cannot switch."
-                    )
-                    raise e
-
-                print(
-                    f"Rate limit detected with Key {self._current_key_index}, switching to Key {other_key}..."
+                except LLMTimeoutError:
+                    raise
+                except Exception as e:
+                    self._handle_key_error(key, e, purpose, attempt_start, at)
+                    tried.append(key.index)
+                    continue
+                self.observe_call(str(key.index), purpose, "success", attempt_start)
+                self._record_usage(key, estimated, response, purpose, attempt_start)
+                elapsed = time.time() - start_time
+                logger.info(
+                    "Gemini API async call (%s) took %.2f seconds (using Key %d)",
+                    label, elapsed, key.index,
+                    extra={"key_index": key.index},
                 )
-                self._switch_key(other_key)
-                # Retry once with new key
+                return response.text
+        finally:
+            self._get_async_semaphore().release()
+
+    async def agenerate_content_stream(
+        self,
+        prompt: str,
+        system_instruction: Optional[str] = None,
+        temperature: float = 0.7,
+        max_output_tokens: int = 8192,
+        force_key: Optional[int] = None,
+        purpose: str = "",
+    ) -> AsyncIterator[str]:
+        """Streaming version of agenerate_content: yields text chunks as Gemini produces them.
+
+        A failure before the first chunk is retried on another key; a failure
+        mid-stream is raised, since chunks already yielded cannot be taken back.
+        The stream is cancelled with LLMTimeoutError if it runs past its deadline.
+        """
+        contents, generation_config = self._build_request(
+            prompt, system_instruction, temperature, max_output_tokens
+        )
+        estimated = self._estimate_tokens(contents, max_output_tokens)
+        label = purpose or "generic"
+        at = self.call_deadline(purpose)
+
+        await self._await_slot(at, purpose)
+        try:
+            start_time = time.time()
+            tried: List[int] = []
+            while True:
+                key = await self._aacquire_key(estimated, force_key, tried, purpose, at)
+                yielded = False
+                attempt_start = time.perf_counter()
                 try:
-                    if system_instruction:
-                        response = self.model.generate_content(
-                            f"{system_instruction}\n\n{prompt}",
-                            generation_config=generation_config,
+                    timeout = self._attempt_timeout(at, purpose)
+                    with LLM_REQUESTS_IN_FLIGHT.track_inprogress(purpose=label):
+                        response = await asyncio.wait_for(
+                            self._amodel_for(key).generate_content_async(
+                                contents,
+                                generation_config=generation_config,
+                                stream=True,
+                                request_options={"timeout": timeout},
+                            ),
+                            timeout,
                         )
-                    else:
-                        response = self.model.generate_content(
-                            prompt, generation_config=generation_config
+                        chunks = response.__aiter__()
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), time_left(at))
+                            except StopAsyncIteration:
+                                break
+                            try:
+                                text = chunk.text
+                            except ValueError:
+                                # Chunks without text parts (e.g. the final finish_reason chunk)
+                                continue
+                            if text:
+                                yielded = True
+                                yield text
+                except LLMTimeoutError:
+                    raise
+                except Exception as e:
+                    if yielded:
+                        if self._is_timeout(e, at):
+                            self.observe_call(str(key.index), purpose, "timeout", attempt_start)
+                            raise self.timeout_error(purpose, "mid-stream") from e
+                        self.observe_call(str(key.index), purpose, "error", attempt_start)
+                        logger.error(
+                            "Gemini API stream error: %s", e,
+                            extra={"key_index": key.index},
                         )
-                    elapsed = time.time() - start_time
-                    print(
-                        f"Gemini API call succeeded after key switch, took {elapsed:.2f} seconds (using Key {self._current_key_index})"
-                    )
-                    return response.text
-                except Exception as retry_error:
-                    print(f"Gemini API Error after key switch: {retry_error}")
-                    raise retry_error
-
-            print(f"Gemini API Error: {e}")
-            print(f"Error type: {type(e).__name__}")
-            raise
+                        raise
+                    self._handle_key_error(key, e, purpose, attempt_start, at)
+                    tried.append(key.index)
+                    continue
+                self.observe_call(str(key.index), purpose, "success", attempt_start)
+                self._record_usage(key, estimated, response, purpose, attempt_start)
+                elapsed = time.time() - start_time
+                logger.info(
+                    "Gemini API stream (%s) took %.2f seconds (using Key %d)",
+                    label, elapsed, key.index,
+                    extra={"key_index": key.index},
+                )
+                return
+        finally:
+            self._get_async_semaphore().release()
+
+    @staticmethod
+    def _json_prompt(prompt: str, system_instruction: Optional[str]) -> str:
+        instruction = system_instruction or ""
+        return f"{instruction}\n\n{prompt}\n\nIMPORTANT: Return ONLY valid JSON, no markdown, no code blocks, no extra text."
+
+    def _json_cache_key(self, contents: str, max_output_tokens: int) -> str:
+        return self.cache.make_key(
+            self.MODEL_NAME,
+            contents,
+            {"temperature": self.JSON_TEMPERATURE, "max_output_tokens": max_output_tokens},
+        )
 
     def generate_json(
         self,
         prompt: str,
         system_instruction: Optional[str] = None,
+        purpose: str = "",
         force_key: Optional[int] = None,
+        cache: bool = False,
+        max_output_tokens: Optional[int] = None,
     ) -> Dict[str, Any]:
         """Generate JSON response from Gemini
 
         Args:
             prompt: The prompt to send to Gemini
             system_instruction: Optional system instruction
-            force_key: Force use specific key (1 or 2), None for auto selection
+            purpose: What the call is for (one of the PURPOSE_* constants in llm_backend)
+            force_key: Prefer a specific key (1-based) while it has budget, None for auto selection
+            cache: Serve/store the response in the LLM cache (for prompts that are pure functions of their input)
+            max_output_tokens: Output budget (default 8192)
         """
-        import json
-        import re
-
-        instruction = system_instruction or ""
-        full_prompt = f"{instruction}\n\n{prompt}\n\nIMPORTANT: Return ONLY valid JSON, no markdown, no code blocks, no extra text."
+        contents = self._json_prompt(prompt, system_instruction)
+        max_output_tokens = max_output_tokens or self.JSON_MAX_OUTPUT_TOKENS
+        cache_key = self._json_cache_key(contents, max_output_tokens) if cache else None
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return self.parse_response(cached, purpose)
 
         response_text = self.generate_content(
-            full_prompt, temperature=0.3, force_key=force_key
+            contents,
+            temperature=self.JSON_TEMPERATURE,
+            max_output_tokens=max_output_tokens,
+            force_key=force_key,
+            purpose=purpose,
         )
+        result = self.parse_response(response_text, purpose)
+        # Only responses that parsed are cached
+        if cache_key:
+            self.cache.set(cache_key, response_text)
+        return result
 
-        # Extract JSON from response
-        json_match = re.search(r"\{.*\}", response_text, re.DOTALL)
-        if json_match:
-            try:
-                return json.loads(json_match.group())
-            except json.JSONDecodeError:
-                pass
-
-        # Fallback: try parsing entire response
+    async def agenerate_json_stream(
+        self,
+        prompt: str,
+        system_instruction: Optional[str] = None,
+        purpose: str = "",
+        force_key: Optional[int] = None,
+    ) -> AsyncIterator[str]:
+        """Stream the raw text of a JSON response (same prompt and settings as generate_json)"""
+        async for chunk in self.agenerate_content_stream(
+            self._json_prompt(prompt, system_instruction),
+            temperature=self.JSON_TEMPERATURE,
+            force_key=force_key,
+            purpose=purpose,
+        ):
+            yield chunk
+
+    async def agenerate_json(
+        self,
+        prompt: str,
+        system_instruction: Optional[str] = None,
+        purpose: str = "",
+        force_key: Optional[int] = None,
+        cache: bool = False,
+        max_output_tokens: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Async version of generate_json"""
+        contents = self._json_prompt(prompt, system_instruction)
+        max_output_tokens = max_output_tokens or self.JSON_MAX_OUTPUT_TOKENS
+        cache_key = self._json_cache_key(contents, max_output_tokens) if cache else None
+        if cache_key:
+            cached = await self.cache.aget(cache_key)
+            if cached is not None:
+                return self.parse_response(cached, purpose)
+
+        response_text = await self.agenerate_content(
+            contents,
+            temperature=self.JSON_TEMPERATURE,
+            max_output_tokens=max_output_tokens,
+            force_key=force_key,
+            purpose=purpose,
+        )
+        result = self.parse_response(response_text, purpose)
+        if cache_key:
+            await self.cache.aset(cache_key, response_text)
+        return result
+
+    async def aget_cached_json(
+        self, prompt: str, system_instruction: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        cache_key = self._json_cache_key(
+            self._json_prompt(prompt, system_instruction), self.JSON_MAX_OUTPUT_TOKENS
+        )
+        cached = await self.cache.aget(cache_key)
+        if cached is None:
+            return None
         try:
-            return json.loads(response_text)
-        except json.JSONDecodeError:
-            raise ValueError(
-                f"Could not parse JSON from response: {response_text[:200]}"
-            )
+            return parse_json(cached)
+        except ValueError:
+            return None
+
+    async def aset_cached_json(
+        self, prompt: str, system_instruction: Optional[str], result: Dict[str, Any]
+    ):
+        cache_key = self._json_cache_key(
+            self._json_prompt(prompt, system_instruction), self.JSON_MAX_OUTPUT_TOKENS
+        )
+        await self.cache.aset(cache_key, json.dumps(result, ensure_ascii=False))
+
+    def status(self) -> Dict[str, Any]:
+        return {"backend": self.name, "keys": self.pool.status()}
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
@@ -0,0 +1,136 @@
+import os
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from dotenv import load_dotenv
+
+from app.database import SessionLocal
+from app.models.idempotency import IdempotencyRecord
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# (status code, headers as [name, value] pairs, body)
+StoredResponse = Tuple[int, List[List[str]], bytes]
+
+NEW = "new"
+RUNNING = "running"
+DONE = "done"
+MISMATCH = "mismatch"
+
+
+class IdempotencyStore:
+    """Responses of requests sent with an Idempotency-Key, in the idempotency_keys table.
+
+    A row is inserted (without a response) when the first request with a key
+    starts, so processes see each other's in-flight requests; the response is
+    added when it finishes. Rows expire after IDEMPOTENCY_KEY_TTL seconds.
+    """
+
+    def __init__(self):
+        self.ttl = float(os.getenv("IDEMPOTENCY_KEY_TTL", "86400"))
+        # A request still running after this long is assumed to belong to a dead process
+        self.lock_timeout = float(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", "300"))
+        # Larger responses are not stored (retries run the request again)
+        self.max_body_size = int(os.getenv("IDEMPOTENCY_MAX_BODY_SIZE", str(1024 * 1024)))
+        self.purge_every = 100
+
+        self._lock = threading.Lock()
+        self._begins = 0
+
+    def begin(self, record_id: str, request_hash: str) -> Tuple[str, Optional[StoredResponse]]:
+        """Register a request. Returns (NEW, None) if it should run, (DONE, response)
+        to replay, (RUNNING, None) if the first one is still in flight, or
+        (MISMATCH, None) if the key was used with a different request body."""
+        with self._lock:
+            self._begins += 1
+            purge = self._begins % self.purge_every == 0
+        if purge:
+            self._purge()
+
+        db = SessionLocal()
+        try:
+            for _ in range(3):
+                now = datetime.now()
+                # Expired keys, and requests left running by a dead process, start over
+                db.query(IdempotencyRecord).filter(
+                    IdempotencyRecord.id == record_id,
+                    or_(
+                        IdempotencyRecord.created_at < now - timedelta(seconds=self.ttl),
+                        and_(
+                            IdempotencyRecord.status_code.is_(None),
+                            IdempotencyRecord.created_at < now - timedelta(seconds=self.lock_timeout),
+                        ),
+                    ),
+                ).delete(synchronize_session=False)
+                db.commit()
+
+                record = db.query(IdempotencyRecord).filter(IdempotencyRecord.id == record_id).first()
+                if record is not None:
+                    if record.request_hash != request_hash:
+                        return MISMATCH, None
+                    if record.status_code is None:
+                        return RUNNING, None
+                    return DONE, (record.status_code, record.headers or [], record.body or b"")
+
+                db.add(IdempotencyRecord(id=record_id, request_hash=request_hash, created_at=now))
+                try:
+                    db.commit()
+                    return NEW, None
+                except IntegrityError:
+                    # Another process registered the key first: read its row
+                    db.rollback()
+            return RUNNING, None
+        finally:
+            db.close()
+
+    def complete(self, record_id: str, response: StoredResponse):
+        """Store the response of a finished request"""
+        status_code, headers, body = response
+        db = SessionLocal()
+        try:
+            db.query(IdempotencyRecord).filter(IdempotencyRecord.id == record_id).update(
+                {
+                    IdempotencyRecord.status_code: status_code,
+                    IdempotencyRecord.headers: headers,
+                    IdempotencyRecord.body: body,
+                },
+                synchronize_session=False,
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def abandon(self, record_id: str):
+        """Forget a request whose response is not stored, so a retry runs it again"""
+        db = SessionLocal()
+        try:
+            db.query(IdempotencyRecord).filter(IdempotencyRecord.id == record_id).delete(
+                synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _purge(self):
+        """Delete expired rows"""
+        db = SessionLocal()
+        try:
+            cutoff = datetime.now() - timedelta(seconds=self.ttl)
+            count = (
+                db.query(IdempotencyRecord)
+                .filter(IdempotencyRecord.created_at < cutoff)
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+            if count:
+                logger.info("Purged %d expired idempotency key(s)", count)
+        except Exception as e:
+            db.rollback()
+            logger.warning("Idempotency key purge failed: %s", e)
+        finally:
+            db.close()
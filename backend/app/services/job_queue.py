@@ -0,0 +1,282 @@
+import os
+import asyncio
+import logging
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from app.database import SessionLocal
+from app.deadline import deadline
+from app.logging_config import log_context
+from app.models.job import Job, JobKind, JobStatus
+from app.models.test_session import TestSession
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[int], Awaitable[None]]
+
+# Job being run by the current worker task
+_current_job: ContextVar[Optional[Job]] = ContextVar("current_job", default=None)
+
+
+class JobQueue:
+    """Durable job queue backed by the `jobs` table, executed by in-process async workers.
+
+    Jobs are claimed with a conditional UPDATE (status queued -> running), so
+    several API processes can share the same table without running a job twice.
+    """
+
+    def __init__(self):
+        self.concurrency = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+        self.poll_interval = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+        self.max_attempts = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+        # Running jobs older than this are assumed to belong to a dead worker
+        self.stale_after = float(os.getenv("JOB_STALE_AFTER", "600"))
+        # How often stale running jobs are looked for (besides at startup)
+        self.requeue_interval = float(os.getenv("JOB_REQUEUE_INTERVAL", "60"))
+        # Deadline of the LLM calls of one attempt (keep below JOB_STALE_AFTER)
+        self.timeout = float(os.getenv("JOB_TIMEOUT", "300"))
+
+        self._handlers: Dict[JobKind, JobHandler] = {}
+        self._workers: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = False
+
+    def handler(self, kind: JobKind):
+        """Decorator registering the coroutine that runs jobs of a kind.
+
+        The handler receives the session id and does its own DB reads/writes.
+        """
+
+        def register(fn: JobHandler) -> JobHandler:
+            self._handlers[kind] = fn
+            return fn
+
+        return register
+
+    def enqueue(self, db: Session, session_id: int, kind: JobKind) -> Job:
+        """Add a job for a session, or return the existing one.
+
+        A queued, running or succeeded job of the same kind is reused, so client
+        retries never trigger a second scoring run. The caller's pending changes
+        (e.g. submitted answers) are committed together with the job row.
+
+        Concurrent calls for a session are serialized by locking its row; the
+        unique index on live jobs per (session, kind) backs this up where row
+        locks are not available (SQLite).
+        """
+        db.query(TestSession.id).filter(TestSession.id == session_id).with_for_update().first()
+        existing = self._live_job(db, session_id, kind)
+        if existing:
+            db.commit()
+            return existing
+
+        job = Job(session_id=session_id, kind=kind, status=JobStatus.QUEUED)
+        try:
+            # Savepoint: losing the race must not roll back the caller's changes
+            with db.begin_nested():
+                db.add(job)
+        except IntegrityError:
+            existing = self._live_job(db, session_id, kind)
+            db.commit()
+            return existing
+        db.commit()
+        db.refresh(job)
+        self.notify()
+        return job
+
+    @staticmethod
+    def _live_job(db: Session, session_id: int, kind: JobKind) -> Optional[Job]:
+        return (
+            db.query(Job)
+            .filter(
+                Job.session_id == session_id,
+                Job.kind == kind,
+                Job.status != JobStatus.FAILED,
+            )
+            .order_by(Job.id.desc())
+            .first()
+        )
+
+    def is_last_attempt(self) -> bool:
+        """Whether the job run by the calling handler will not be retried if it fails
+        (False outside of a job). Handlers use it to fall back instead of failing."""
+        job = _current_job.get()
+        return job is not None and job.attempts >= self.max_attempts
+
+    def notify(self):
+        """Wake the workers (safe to call from any thread)"""
+        if self._loop and self._wake:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def _claim_next(self) -> Optional[Job]:
+        db = SessionLocal()
+        try:
+            for _ in range(3):
+                job = (
+                    db.query(Job)
+                    .filter(Job.status == JobStatus.QUEUED)
+                    .order_by(Job.id)
+                    .first()
+                )
+                if job is None:
+                    return None
+                claimed = (
+                    db.query(Job)
+                    .filter(Job.id == job.id, Job.status == JobStatus.QUEUED)
+                    .update(
+                        {
+                            Job.status: JobStatus.RUNNING,
+                            Job.started_at: datetime.now(),
+                            Job.attempts: Job.attempts + 1,
+                        },
+                        synchronize_session=False,
+                    )
+                )
+                db.commit()
+                if claimed == 1:
+                    db.refresh(job)
+                    db.expunge(job)
+                    return job
+            return None
+        finally:
+            db.close()
+
+    def _finish(self, job: Job, error: Optional[str]):
+        db = SessionLocal()
+        try:
+            values = {Job.error: error}
+            if error is None:
+                values[Job.status] = JobStatus.SUCCEEDED
+                values[Job.finished_at] = datetime.now()
+            elif job.attempts < self.max_attempts:
+                values[Job.status] = JobStatus.QUEUED
+            else:
+                values[Job.status] = JobStatus.FAILED
+                values[Job.finished_at] = datetime.now()
+            db.query(Job).filter(Job.id == job.id).update(
+                values, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _release(self, job: Job):
+        db = SessionLocal()
+        try:
+            db.query(Job).filter(Job.id == job.id).update(
+                {Job.status: JobStatus.QUEUED, Job.attempts: Job.attempts - 1},
+                synchronize_session=False,
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _requeue_stale(self):
+        """Put back jobs left running by a crashed/restarted worker, or whose result
+        could not be recorded"""
+        db = SessionLocal()
+        try:
+            cutoff = datetime.now() - timedelta(seconds=self.stale_after)
+            count = (
+                db.query(Job)
+                .filter(Job.status == JobStatus.RUNNING, Job.started_at < cutoff)
+                .update({Job.status: JobStatus.QUEUED}, synchronize_session=False)
+            )
+            db.commit()
+            if count:
+                logger.warning("Re-queued %d stale job(s)", count)
+        finally:
+            db.close()
+
+    async def _run(self, job: Job):
+        token = _current_job.set(job)
+        try:
+            # Lines logged by the handler carry the job and its session
+            with log_context(request_id=f"job-{job.id}", session_id=job.session_id), deadline(self.timeout):
+                await self._run_job(job)
+        finally:
+            _current_job.reset(token)
+
+    async def _run_job(self, job: Job):
+        handler = self._handlers.get(job.kind)
+        error = None
+        if handler is None:
+            error = f"No handler registered for job kind {job.kind}"
+        else:
+            try:
+                logger.info("Running job %d (%s) for session %d", job.id, job.kind.value, job.session_id)
+                await handler(job.session_id)
+            except asyncio.CancelledError:
+                # Shutting down: hand the job back so it runs again after restart
+                self._release(job)
+                raise
+            except Exception as e:
+                logger.exception("Job %d failed", job.id)
+                error = str(e) or type(e).__name__
+        await asyncio.to_thread(self._finish, job, error)
+        if error is not None:
+            # Failed attempts may have been re-queued
+            self._wake.set()
+
+    async def _worker(self):
+        # Not only cancellation: wait_for may swallow a cancel that coincides with
+        # its timeout (Python < 3.12), and the worker would poll on forever
+        while not self._stopping:
+            try:
+                job = await asyncio.to_thread(self._claim_next)
+            except Exception as e:
+                logger.error("Job queue poll error: %s", e)
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # E.g. the result could not be stored: the job stays running
+                # until _requeue_loop puts it back
+                logger.exception("Job %d: worker error", job.id)
+
+    async def _requeue_loop(self):
+        while not self._stopping:
+            await asyncio.sleep(self.requeue_interval)
+            try:
+                await asyncio.to_thread(self._requeue_stale)
+            except Exception as e:
+                logger.error("Job queue requeue error: %s", e)
+                continue
+            self._wake.set()
+
+    async def start(self):
+        """Start the worker tasks on the running event loop"""
+        if self._workers:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        await asyncio.to_thread(self._requeue_stale)
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.concurrency)
+        ]
+        self._workers.append(asyncio.create_task(self._requeue_loop()))
+
+    async def stop(self):
+        """Cancel the worker tasks; jobs they were running go back to the queue"""
+        self._stopping = True
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
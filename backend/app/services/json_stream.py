@@ -0,0 +1,126 @@
+import json
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# A section path pattern, e.g. ("listening", "sections", "*"); "*" matches any array index
+PathPattern = Sequence[str]
+Path = Tuple[Any, ...]
+
+
+def _matches(path: Path, patterns: Sequence[PathPattern]) -> bool:
+    for pattern in patterns:
+        if len(pattern) != len(path):
+            continue
+        if all(p == "*" or p == str(part) for p, part in zip(pattern, path)):
+            return True
+    return False
+
+
+def path_to_str(path: Path) -> str:
+    return ".".join(str(part) for part in path)
+
+
+class IncrementalJSONSections:
+    """Incremental scanner for a streamed JSON document.
+
+    Text is fed in chunks as it arrives from the model. Whenever an object or
+    array whose path matches one of the section patterns is closed, it is
+    parsed and returned, so callers can forward a listening section or reading
+    passage before the rest of the document has been generated. Anything
+    before the first "{" (e.g. a markdown code fence) is ignored.
+    """
+
+    def __init__(self, patterns: Sequence[PathPattern]):
+        self.patterns = patterns
+        self.document: Optional[Dict[str, Any]] = None
+
+        self._buf = ""
+        self._pos = 0
+        # Open containers: [kind ("{" or "["), path, start offset, key or index]
+        self._stack: List[list] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = False
+        self._done = False
+
+    @property
+    def text(self) -> str:
+        return self._buf
+
+    def feed(self, chunk: str) -> List[Tuple[Path, Any]]:
+        """Consume a chunk and return (path, value) for every section completed by it"""
+        self._buf += chunk
+        completed: List[Tuple[Path, Any]] = []
+        buf = self._buf
+        i = self._pos
+        n = len(buf)
+
+        while i < n and not self._done:
+            c = buf[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    top = self._stack[-1] if self._stack else None
+                    if top is not None and top[0] == "{" and self._expect_key:
+                        top[3] = json.loads(buf[self._string_start : i + 1])
+                        self._expect_key = False
+                i += 1
+                continue
+
+            if not self._stack:
+                # Skip leading text until the top-level object starts
+                if c == "{":
+                    self._stack.append(["{", (), i, None])
+                    self._expect_key = True
+                i += 1
+                continue
+
+            top = self._stack[-1]
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c in "{[":
+                path = top[1] + (top[3],)
+                self._stack.append([c, path, i, None if c == "{" else 0])
+                self._expect_key = c == "{"
+            elif c in "}]":
+                kind, path, start, _ = self._stack.pop()
+                if not self._stack:
+                    self.document = json.loads(buf[start : i + 1])
+                    self._done = True
+                elif _matches(path, self.patterns):
+                    completed.append((path, json.loads(buf[start : i + 1])))
+                self._expect_key = False
+            elif c == ",":
+                if top[0] == "[":
+                    top[3] += 1
+                else:
+                    self._expect_key = True
+            i += 1
+
+        self._pos = i
+        return completed
+
+
+def iter_sections(
+    document: Dict[str, Any], patterns: Sequence[PathPattern]
+) -> Iterator[Tuple[Path, Any]]:
+    """Yield (path, value) for each section of an already complete document"""
+
+    def walk(value: Any, path: Path) -> Iterator[Tuple[Path, Any]]:
+        if path and _matches(path, patterns):
+            yield path, value
+            return
+        if isinstance(value, dict):
+            for key, child in value.items():
+                yield from walk(child, path + (key,))
+        elif isinstance(value, list):
+            for index, child in enumerate(value):
+                yield from walk(child, path + (index,))
+
+    yield from walk(document, ())
@@ -0,0 +1,274 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket holding up to `capacity` tokens, refilled evenly over `period` seconds"""
+
+    def __init__(self, capacity: float, period: float):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def fraction(self, now: float, amount: float = 0.0) -> float:
+        """Share of the bucket left after taking `amount` (negative if it does not fit)"""
+        self._refill(now)
+        return (self.tokens - amount) / self.capacity
+
+    def wait_time(self, now: float, amount: float) -> float:
+        """Seconds until `amount` tokens are available"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, now: float, amount: float):
+        self._refill(now)
+        self.tokens -= amount
+
+
+class ApiKeyState:
+    """One Gemini API key with its own RPM/TPM/RPD budgets and health state"""
+
+    def __init__(self, index: int, api_key: str, rpm: int, tpm: int, rpd: int):
+        self.index = index  # 1-based, as used in logs ("Key 1", "Key 2", ...)
+        self.api_key = api_key
+        self.rpm = TokenBucket(rpm, 60)
+        self.tpm = TokenBucket(tpm, 60)
+        self.rpd = TokenBucket(rpd, 86400)
+
+        self.invalid = False  # Rejected as invalid/expired
+        self.exhausted = False  # Quota exhausted (429)
+        self.next_probe_at = 0.0
+        self.probe_backoff = 0.0
+        self.last_error: Optional[str] = None
+
+    def is_healthy(self) -> bool:
+        return not self.invalid and not self.exhausted
+
+    def headroom(self, now: float, tokens: float) -> float:
+        """Smallest remaining share across the three budgets after this request"""
+        return min(
+            self.rpm.fraction(now, 1),
+            self.tpm.fraction(now, tokens),
+            self.rpd.fraction(now, 1),
+        )
+
+    def wait_time(self, now: float, tokens: float) -> float:
+        return max(
+            self.rpm.wait_time(now, 1),
+            self.tpm.wait_time(now, tokens),
+            self.rpd.wait_time(now, 1),
+        )
+
+
+class KeyPool:
+    """Pool of Gemini API keys routed by remaining rate-limit headroom.
+
+    Each request is sent to the healthy key with the most headroom across its
+    RPM, TPM and RPD buckets, so throughput grows with the number of keys.
+    Keys rejected as invalid or out of quota are taken out of rotation and
+    probed in the background until they work again.
+    """
+
+    def __init__(
+        self,
+        api_keys: List[str],
+        rpm: int,
+        tpm: int,
+        rpd: int,
+        quota_cooldown: float = 60.0,
+        probe_interval: float = 300.0,
+    ):
+        if not api_keys:
+            raise ValueError(
+                "GEMINI_API_KEYS or GEMINI_API_KEY must be set in .env file"
+            )
+        self.keys = [
+            ApiKeyState(i + 1, key, rpm, tpm, rpd) for i, key in enumerate(api_keys)
+        ]
+        self.quota_cooldown = quota_cooldown
+        self.probe_interval = probe_interval
+
+        self._lock = threading.Lock()
+        self._probe: Optional[Callable[[ApiKeyState], None]] = None
+        self._probe_thread: Optional[threading.Thread] = None
+        self._probe_wake = threading.Event()
+
+    @staticmethod
+    def keys_from_env() -> List[str]:
+        """GEMINI_API_KEYS (comma separated) plus the legacy GEMINI_API_KEY/_BACKUP, deduplicated"""
+        candidates = [os.getenv("GEMINI_API_KEY"), os.getenv("GEMINI_API_KEY_BACKUP")]
+        candidates += (os.getenv("GEMINI_API_KEYS") or "").split(",")
+        keys = []
+        for key in candidates:
+            key = (key or "").strip()
+            if key and key not in keys:
+                keys.append(key)
+        return keys
+
+    @classmethod
+    def from_env(cls) -> "KeyPool":
+        # Defaults match the Gemini free tier for gemini-2.5-flash
+        return cls(
+            cls.keys_from_env(),
+            rpm=int(os.getenv("GEMINI_RPM_LIMIT", "10")),
+            tpm=int(os.getenv("GEMINI_TPM_LIMIT", "250000")),
+            rpd=int(os.getenv("GEMINI_RPD_LIMIT", "250")),
+            quota_cooldown=float(os.getenv("GEMINI_QUOTA_COOLDOWN", "60")),
+            probe_interval=float(os.getenv("GEMINI_KEY_PROBE_INTERVAL", "300")),
+        )
+
+    def try_acquire(
+        self,
+        tokens: float,
+        preferred: Optional[int] = None,
+        exclude: Iterable[int] = (),
+    ) -> Tuple[Optional[ApiKeyState], float]:
+        """Reserve budget for one request.
+
+        Returns (key, 0) on success, or (None, seconds to wait) when every healthy
+        key is out of budget. Raises ValueError if no healthy key is left.
+        `preferred` (1-based index) is used when it has budget; otherwise the key
+        with the most headroom wins.
+        """
+        exclude = set(exclude)
+        now = time.monotonic()
+        with self._lock:
+            healthy = [
+                k for k in self.keys if k.is_healthy() and k.index not in exclude
+            ]
+            if not healthy:
+                raise ValueError(self._unavailable_message())
+
+            ranked = sorted(healthy, key=lambda k: k.headroom(now, tokens), reverse=True)
+            chosen = ranked[0]
+            if preferred is not None:
+                for key in healthy:
+                    if key.index == preferred and key.headroom(now, tokens) >= 0:
+                        chosen = key
+                        break
+
+            if chosen.headroom(now, tokens) < 0:
+                return None, min(k.wait_time(now, tokens) for k in healthy)
+
+            chosen.rpm.consume(now, 1)
+            chosen.rpd.consume(now, 1)
+            chosen.tpm.consume(now, tokens)
+            return chosen, 0.0
+
+    def record_tokens(self, key: ApiKeyState, estimated: float, actual: float):
+        """Correct the TPM bucket once the real token count of a request is known"""
+        with self._lock:
+            key.tpm.consume(time.monotonic(), actual - estimated)
+
+    def mark_invalid(self, key: ApiKeyState, error: str):
+        with self._lock:
+            key.invalid = True
+            key.last_error = error
+            key.probe_backoff = self.probe_interval
+            key.next_probe_at = time.monotonic() + key.probe_backoff
+        logger.error(
+            "Gemini Key %d is invalid/expired. Taken out of rotation.", key.index,
+            extra={"key_index": key.index},
+        )
+        self._probe_wake.set()
+
+    def mark_exhausted(self, key: ApiKeyState, error: str):
+        with self._lock:
+            key.exhausted = True
+            key.last_error = error
+            key.probe_backoff = self.quota_cooldown
+            key.next_probe_at = time.monotonic() + key.probe_backoff
+        logger.warning(
+            "Gemini Key %d hit its quota, out of rotation until a probe succeeds", key.index,
+            extra={"key_index": key.index},
+        )
+        self._probe_wake.set()
+
+    def _unavailable_message(self) -> str:
+        states = ", ".join(
+            f"Key {k.index}: {'invalid' if k.invalid else 'quota exhausted'}"
+            for k in self.keys
+            if not k.is_healthy()
+        )
+        return f"No Gemini API key available ({states}). Please check the keys in .env file"
+
+    def status(self) -> List[dict]:
+        """Budget and health of every key (for diagnostics)"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "key": k.index,
+                    "healthy": k.is_healthy(),
+                    "invalid": k.invalid,
+                    "rpm_left": int(k.rpm.fraction(now) * k.rpm.capacity),
+                    "tpm_left": int(k.tpm.fraction(now) * k.tpm.capacity),
+                    "rpd_left": int(k.rpd.fraction(now) * k.rpd.capacity),
+                    "last_error": k.last_error,
+                }
+                for k in self.keys
+            ]
+
+    # Health probing
+
+    def start_health_probe(self, probe: Callable[[ApiKeyState], None]):
+        """Probe unhealthy keys in a background thread; `probe` raises if the key still fails"""
+        self._probe = probe
+        if self._probe_thread and self._probe_thread.is_alive():
+            return
+        self._probe_thread = threading.Thread(
+            target=self._probe_loop, name="gemini-key-probe", daemon=True
+        )
+        self._probe_thread.start()
+
+    def _probe_loop(self):
+        while True:
+            self._probe_wake.wait(10)
+            self._probe_wake.clear()
+            now = time.monotonic()
+            with self._lock:
+                due = [
+                    k for k in self.keys if not k.is_healthy() and now >= k.next_probe_at
+                ]
+            for key in due:
+                self._probe_key(key)
+
+    def _probe_key(self, key: ApiKeyState):
+        try:
+            self._probe(key)
+        except Exception as e:
+            with self._lock:
+                key.last_error = str(e)
+                key.probe_backoff = min(key.probe_backoff * 2 or self.probe_interval, 3600)
+                key.next_probe_at = time.monotonic() + key.probe_backoff
+            logger.warning(
+                "Gemini Key %d still unavailable: %s", key.index, e,
+                extra={"key_index": key.index},
+            )
+            return
+
+        with self._lock:
+            key.invalid = False
+            key.exhausted = False
+            key.last_error = None
+            key.probe_backoff = 0.0
+        logger.info(
+            "Gemini Key %d recovered, back in rotation", key.index,
+            extra={"key_index": key.index},
+        )
@@ -0,0 +1,212 @@
+import os
+import re
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, Optional
+from dotenv import load_dotenv
+from app.deadline import current_deadline
+from app.metrics import LLM_JSON_PARSE_FAILURES, LLM_REQUEST_DURATION, LLM_TIMEOUTS
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# What a call is for: lets backends label, route or (for the stub) shape responses
+PURPOSE_GENERATE_LISTENING_SPEAKING = "generate_listening_speaking"
+PURPOSE_GENERATE_READING_WRITING = "generate_reading_writing"
+PURPOSE_SCORE_SPEAKING = "score_speaking"
+PURPOSE_SCORE_WRITING = "score_writing"
+PURPOSE_ANALYSIS_IELTS = "analysis_ielts"
+PURPOSE_ANALYSIS_BEYOND = "analysis_beyond"
+
+# Longest one LLM call may take, by purpose prefix (key waits and retries included)
+PURPOSE_TIMEOUTS = {
+    "generate": float(os.getenv("LLM_TIMEOUT_GENERATE", "120")),
+    "score": float(os.getenv("LLM_TIMEOUT_SCORING", "60")),
+    "analysis": float(os.getenv("LLM_TIMEOUT_ANALYSIS", "90")),
+}
+LLM_TIMEOUT_DEFAULT = float(os.getenv("LLM_TIMEOUT_DEFAULT", "120"))
+
+
+class LLMTimeoutError(TimeoutError):
+    """An LLM call did not finish before its deadline (the call was cancelled)"""
+
+
+def parse_json(response_text: str) -> Dict[str, Any]:
+    """Extract a JSON object from a model response"""
+    # Extract JSON from response
+    json_match = re.search(r"\{.*\}", response_text, re.DOTALL)
+    if json_match:
+        try:
+            return json.loads(json_match.group())
+        except json.JSONDecodeError:
+            pass
+
+    # Fallback: try parsing entire response
+    try:
+        return json.loads(response_text)
+    except json.JSONDecodeError:
+        raise ValueError(
+            f"Could not parse JSON from response: {response_text[:200]}"
+        )
+
+
+class LLMBackend(ABC):
+    """Model behind test generation and scoring.
+
+    TestGeneratorService and ScoringService only use this interface; the
+    implementation is picked with LLM_BACKEND (see get_llm_backend).
+    """
+
+    name = "base"
+
+    parse_json = staticmethod(parse_json)
+
+    @abstractmethod
+    def generate_json(
+        self,
+        prompt: str,
+        system_instruction: Optional[str] = None,
+        purpose: str = "",
+        force_key: Optional[int] = None,
+        cache: bool = False,
+        max_output_tokens: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Generate a JSON object.
+
+        Args:
+            prompt: The prompt to send
+            system_instruction: Optional system instruction
+            purpose: What the call is for (one of the PURPOSE_* constants)
+            force_key: Routing hint: prefer this API key (1-based) if the backend has several
+            cache: Serve/store the response in the LLM cache (for prompts that are pure functions of their input)
+            max_output_tokens: Output budget, None for the backend default
+        """
+
+    @abstractmethod
+    async def agenerate_json(
+        self,
+        prompt: str,
+        system_instruction: Optional[str] = None,
+        purpose: str = "",
+        force_key: Optional[int] = None,
+        cache: bool = False,
+        max_output_tokens: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Async version of generate_json"""
+
+    @abstractmethod
+    def agenerate_json_stream(
+        self,
+        prompt: str,
+        system_instruction: Optional[str] = None,
+        purpose: str = "",
+        force_key: Optional[int] = None,
+    ) -> AsyncIterator[str]:
+        """Stream the raw text of a JSON response (same prompt and settings as generate_json)"""
+
+    async def aget_cached_json(
+        self, prompt: str, system_instruction: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Result stored in the LLM cache for agenerate_json(prompt, system_instruction,
+        cache=True), or None (always None for backends without a cache)"""
+        return None
+
+    async def aset_cached_json(
+        self, prompt: str, system_instruction: Optional[str], result: Dict[str, Any]
+    ):
+        """Store a result obtained some other way (e.g. from a batched call) under the
+        cache key agenerate_json(prompt, system_instruction, cache=True) would use"""
+
+    def parse_response(self, response_text: str, purpose: str = "") -> Dict[str, Any]:
+        """parse_json, counting failures in llm_json_parse_failures_total"""
+        try:
+            return parse_json(response_text)
+        except ValueError:
+            LLM_JSON_PARSE_FAILURES.inc(purpose=purpose or "generic")
+            raise
+
+    def observe_call(self, key: str, purpose: str, outcome: str, started: float):
+        """Record one call attempt (started: time.perf_counter() before the call)"""
+        LLM_REQUEST_DURATION.observe(
+            time.perf_counter() - started,
+            backend=self.name,
+            key=key,
+            purpose=purpose or "generic",
+            outcome=outcome,
+        )
+
+    def call_deadline(self, purpose: str) -> float:
+        """Absolute deadline (time.monotonic()) of a call started now: its purpose's
+        timeout, or the deadline of the request/job it runs for if that is earlier"""
+        timeout = PURPOSE_TIMEOUTS.get(purpose.split("_", 1)[0], LLM_TIMEOUT_DEFAULT)
+        at = time.monotonic() + timeout
+        outer = current_deadline()
+        return at if outer is None else min(at, outer)
+
+    def timeout_error(self, purpose: str, reason: str) -> LLMTimeoutError:
+        """Count a call that ran out of time in llm_timeouts_total; returns the error to raise"""
+        label = purpose or "generic"
+        LLM_TIMEOUTS.inc(backend=self.name, purpose=label)
+        logger.warning("LLM call (%s) timed out %s", label, reason)
+        return LLMTimeoutError(f"LLM call ({label}) timed out {reason}")
+
+    def record_usage(
+        self,
+        purpose: str,
+        prompt_tokens: int,
+        output_tokens: int,
+        started: float,
+        key_index: Optional[int] = None,
+        model: Optional[str] = None,
+    ):
+        """Token usage of a successful call, for metrics and the per-session cost summary"""
+        # Imported here: the recorder needs the database, the interface does not
+        from app.services.usage import usage_recorder
+
+        usage_recorder.record(
+            self.name,
+            purpose,
+            prompt_tokens,
+            output_tokens,
+            model=model,
+            key_index=key_index,
+            latency_ms=int((time.perf_counter() - started) * 1000),
+        )
+
+    async def awarm_up(self):
+        """Open connections ahead of the first request (called at application startup)"""
+
+    def status(self) -> Dict[str, Any]:
+        """Backend state for diagnostics"""
+        return {"backend": self.name}
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {"enabled": False}
+
+
+_backend: Optional[LLMBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_llm_backend() -> LLMBackend:
+    """Process-wide backend chosen by LLM_BACKEND: "gemini" (default) or "stub" (offline, no quota)"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = os.getenv("LLM_BACKEND", "gemini").lower()
+            if name == "stub":
+                from app.services.stub_llm import StubLLMBackend
+
+                _backend = StubLLMBackend()
+            elif name == "gemini":
+                from app.services.gemini_service import GeminiService
+
+                _backend = GeminiService()
+            else:
+                raise ValueError(f"Unknown LLM_BACKEND '{name}' (expected gemini or stub)")
+            logger.info("LLM backend: %s", _backend.name)
+        return _backend
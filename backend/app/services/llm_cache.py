@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+
+from app.database import SessionLocal
+from app.models.llm_cache import LLMCacheEntry
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class LLMCache:
+    """Content-addressed cache of Gemini responses.
+
+    Two tiers: an in-process LRU in front of the `llm_cache_entries` table, so
+    cached responses survive restarts and are shared between API processes.
+    Entries expire after LLM_CACHE_TTL seconds; the table is trimmed to
+    LLM_CACHE_MAX_ENTRIES rows, dropping the least recently used first.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+        self.memory_size = int(os.getenv("LLM_CACHE_MEMORY_SIZE", "256"))
+        self.ttl = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+        self.max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+        # Run DB eviction once every this many writes
+        self.evict_every = 50
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "writes": 0}
+
+    @staticmethod
+    def make_key(model: str, contents: str, generation_config: Dict[str, Any]) -> str:
+        """sha256 over everything that determines the response"""
+        payload = json.dumps(
+            {"model": model, "contents": contents, "config": generation_config},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    # Memory tier
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._memory.get(key)
+            if item is None:
+                return None
+            value, stored_at = item
+            if time.time() - stored_at > self.ttl:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            self._stats["memory_hits"] += 1
+            return value
+
+    def _set_memory(self, key: str, value: str, stored_at: Optional[float] = None):
+        with self._lock:
+            self._memory[key] = (value, stored_at or time.time())
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    # DB tier
+
+    def _get_db(self, key: str) -> Optional[str]:
+        db = SessionLocal()
+        try:
+            entry = db.query(LLMCacheEntry).filter(LLMCacheEntry.key == key).first()
+            if entry is None:
+                return None
+            now = datetime.now(timezone.utc)
+            created_at = _as_utc(entry.created_at)
+            if created_at < now - timedelta(seconds=self.ttl):
+                db.delete(entry)
+                db.commit()
+                return None
+            entry.last_used_at = now
+            db.commit()
+            stored_at = created_at.timestamp()
+            response = entry.response
+        finally:
+            db.close()
+        self._set_memory(key, response, stored_at)
+        return response
+
+    def _set_db(self, key: str, value: str):
+        db = SessionLocal()
+        try:
+            now = datetime.now(timezone.utc)
+            db.merge(
+                LLMCacheEntry(key=key, response=value, created_at=now, last_used_at=now)
+            )
+            db.commit()
+            with self._lock:
+                self._writes += 1
+                evict = self._writes % self.evict_every == 0
+            if evict:
+                self._evict(db)
+        finally:
+            db.close()
+
+    def _evict(self, db):
+        """Delete expired rows, then the least recently used rows above max_entries"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.ttl)
+        db.query(LLMCacheEntry).filter(LLMCacheEntry.created_at < cutoff).delete(
+            synchronize_session=False
+        )
+        overflow = db.query(LLMCacheEntry).count() - self.max_entries
+        if overflow > 0:
+            oldest = (
+                db.query(LLMCacheEntry.key)
+                .order_by(LLMCacheEntry.last_used_at)
+                .limit(overflow)
+                .subquery()
+            )
+            db.query(LLMCacheEntry).filter(LLMCacheEntry.key.in_(oldest)).delete(
+                synchronize_session=False
+            )
+        db.commit()
+
+    # Public API
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached response or None (memory first, then the database)"""
+        if not self.enabled:
+            return None
+        value = self._get_memory(key)
+        if value is not None:
+            return value
+        try:
+            value = self._get_db(key)
+        except Exception as e:
+            logger.warning("LLM cache read error: %s", e)
+            value = None
+        self._count("misses" if value is None else "db_hits")
+        return value
+
+    def set(self, key: str, value: str):
+        if not self.enabled:
+            return
+        self._set_memory(key, value)
+        self._count("writes")
+        try:
+            self._set_db(key, value)
+        except Exception as e:
+            logger.warning("LLM cache write error: %s", e)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Async version of get: memory hits return inline, DB lookups run in a thread"""
+        if not self.enabled:
+            return None
+        value = self._get_memory(key)
+        if value is not None:
+            return value
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str):
+        await asyncio.to_thread(self.set, key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+        stats["hit_rate"] = (
+            round((stats["memory_hits"] + stats["db_hits"]) / lookups, 3)
+            if lookups
+            else 0.0
+        )
+        stats["enabled"] = self.enabled
+        return stats
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Timestamps are written in UTC; databases without time zone support (SQLite)
+    return them naive"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
@@ -1,11 +1,22 @@
-from typing import Dict, Any
-from app.services.gemini_service import GeminiService
+from typing import Dict, Any, Optional, Tuple
+from app.services.llm_backend import (
+    PURPOSE_ANALYSIS_BEYOND,
+    PURPOSE_ANALYSIS_IELTS,
+    PURPOSE_SCORE_SPEAKING,
+    PURPOSE_SCORE_WRITING,
+    get_llm_backend,
+)
+from app.services.answer_key import AnswerKey
+from app.services.batch_scoring import ScoringBatcher
 from app.models.test_session import Phase
-import json
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class ScoringService:
-    """Service for scoring test phases using Gemini"""
+    """Service for scoring test phases (Speaking/Writing with the configured LLM backend)"""
 
     # IELTS Band conversion tables (standard IELTS conversion)
     LISTENING_BANDS = {
@@ -96,8 +107,32 @@ class ScoringService:
         40: 9.0,
     }
 
+    SPEAKING_SYSTEM_INSTRUCTION = """You are an IELTS examiner. Evaluate speaking using 4 criteria: Fluency and Coherence, Lexical Resource, Grammatical Range and Accuracy, Pronunciation. Return JSON only."""
+
+    WRITING_SYSTEM_INSTRUCTION = """You are an IELTS examiner. Evaluate writing using 4 criteria: Task Achievement/Response, Coherence and Cohesion, Lexical Resource, Grammatical Range and Accuracy. Return JSON only."""
+
+    ANALYSIS_SYSTEM_INSTRUCTION = (
+        """Giám khảo IELTS. Phân tích tiếng Anh. Trả về TIẾNG VIỆT. Chỉ JSON."""
+    )
+
     def __init__(self):
-        self.gemini = GeminiService()
+        self.llm = get_llm_backend()
+        # Optional (SCORING_BATCH_ENABLED): packs concurrent async Speaking/Writing scoring calls
+        self.batcher = ScoringBatcher(self.llm)
+
+    async def _ascore_with_llm(
+        self, prompt: str, system_instruction: str, purpose: str, validate
+    ) -> Dict[str, Any]:
+        """Speaking/Writing evaluation, through the micro-batcher when it is enabled"""
+        if self.batcher.enabled:
+            return await self.batcher.submit(prompt, system_instruction, purpose, validate)
+        return await self.llm.agenerate_json(
+            prompt, system_instruction, purpose=purpose, cache=True
+        )
+
+    @staticmethod
+    def _is_band(value: Any) -> bool:
+        return isinstance(value, (int, float)) and 0 <= value <= 9
 
     def score_listening(
         self, content: Dict[str, Any], answers: Dict[str, Any]
@@ -107,6 +142,7 @@ class ScoringService:
         total_questions = 0
         detailed_results = []
 
+        answer_key = AnswerKey.for_content(content)
         sections = content.get("listening", {}).get("sections", [])
         for section in sections:
             section_id = section.get("id")
@@ -115,10 +151,11 @@ class ScoringService:
             for question in questions:
                 qid = question.get("id")
                 total_questions += 1
-                user_answer = answers.get(f"listening_s{section_id}_q{qid}", "").strip()
+                answer_id = f"listening_s{section_id}_q{qid}"
+                user_answer = answers.get(answer_id, "").strip()
                 correct_answer = str(question.get("correct_answer", "")).strip()
 
-                is_correct = user_answer.lower() == correct_answer.lower()
+                is_correct = answer_key.is_correct(answer_id, user_answer)
                 if is_correct:
                     correct_count += 1
 
@@ -167,6 +204,7 @@ class ScoringService:
         total_questions = 0
         detailed_results = []
 
+        answer_key = AnswerKey.for_content(content)
         passages = content.get("reading", {}).get("passages", [])
         for passage in passages:
             passage_id = passage.get("id")
@@ -175,10 +213,11 @@ class ScoringService:
             for question in questions:
                 qid = question.get("id")
                 total_questions += 1
-                user_answer = answers.get(f"reading_p{passage_id}_q{qid}", "").strip()
+                answer_id = f"reading_p{passage_id}_q{qid}"
+                user_answer = answers.get(answer_id, "").strip()
                 correct_answer = str(question.get("correct_answer", "")).strip()
 
-                is_correct = user_answer.lower() == correct_answer.lower()
+                is_correct = answer_key.is_correct(answer_id, user_answer)
                 if is_correct:
                     correct_count += 1
 
@@ -219,10 +258,10 @@ class ScoringService:
             "detailed_results": detailed_results,
         }
 
-    def score_speaking(
+    def _speaking_prompt(
         self, content: Dict[str, Any], answers: Dict[str, Any]
-    ) -> Dict[str, Any]:
-        """Score Speaking section using Gemini (4 IELTS criteria) - Optimized for token limits"""
+    ) -> Optional[str]:
+        """Build the Speaking scoring prompt, or None if no answers were provided"""
         # Check if user provided any answers
         part1_questions = content.get("speaking", {}).get("part1", [])
         part2 = content.get("speaking", {}).get("part2", {})
@@ -239,19 +278,8 @@ class ScoringService:
 
         # Check if any answer exists and is not empty
         has_any_answer = any(answers.get(key, "").strip() for key in all_answer_keys)
-
-        # If no answers provided, return 0.0 scores
         if not has_any_answer:
-            return {
-                "fluency_coherence": 0.0,
-                "lexical_resource": 0.0,
-                "grammatical_range": 0.0,
-                "pronunciation": 0.0,
-                "overall_band": 0.0,
-                "feedback": "No answers provided",
-            }
-
-        system_instruction = """You are an IELTS examiner. Evaluate speaking using 4 criteria: Fluency and Coherence, Lexical Resource, Grammatical Range and Accuracy, Pronunciation. Return JSON only."""
+            return None
 
         def truncate_text(text: str, max_words: int = 100) -> str:
             """Truncate text to max words to reduce token usage"""
@@ -319,65 +347,76 @@ P3: {part3_text}
 Return JSON only:
 {{"fluency_coherence":7.0,"lexical_resource":7.0,"grammatical_range":7.0,"pronunciation":7.0,"overall_band":7.0,"feedback":"Brief feedback"}}"""
 
+        return prompt
+
+    @staticmethod
+    def _speaking_scores(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Map a Gemini Speaking evaluation to the stored score format"""
+        return {
+            "fluency_coherence": result.get("fluency_coherence", 5.0),
+            "lexical_resource": result.get("lexical_resource", 5.0),
+            "grammatical_range": result.get("grammatical_range", 5.0),
+            "pronunciation": result.get("pronunciation", 5.0),
+            "overall_band": result.get("overall_band", 5.0),
+            "feedback": result.get("feedback", ""),
+        }
+
+    @classmethod
+    def _valid_speaking(cls, result: Dict[str, Any]) -> bool:
+        """A Speaking evaluation has at least a usable overall band"""
+        return cls._is_band(result.get("overall_band"))
+
+    @staticmethod
+    def _speaking_default(band: float, feedback: str) -> Dict[str, Any]:
+        """Speaking scores with every criterion set to the same band"""
+        return {
+            "fluency_coherence": band,
+            "lexical_resource": band,
+            "grammatical_range": band,
+            "pronunciation": band,
+            "overall_band": band,
+            "feedback": feedback,
+        }
+
+    async def ascore_speaking(
+        self, content: Dict[str, Any], answers: Dict[str, Any], fallback: bool = True
+    ) -> Dict[str, Any]:
+        """Score Speaking section using Gemini (4 IELTS criteria) - Optimized for token limits
+
+        If the LLM call fails, fallback scores (5.0) are returned, or with
+        fallback=False the error is raised (so a job can retry it).
+        """
+        prompt = self._speaking_prompt(content, answers)
+        if prompt is None:
+            return self._speaking_default(0.0, "No answers provided")
+
         try:
-            print("Calling Gemini API for Speaking scoring...")
-            result = self.gemini.generate_json(prompt, system_instruction)
-            print("Gemini API response received for Speaking")
-            return {
-                "fluency_coherence": result.get("fluency_coherence", 5.0),
-                "lexical_resource": result.get("lexical_resource", 5.0),
-                "grammatical_range": result.get("grammatical_range", 5.0),
-                "pronunciation": result.get("pronunciation", 5.0),
-                "overall_band": result.get("overall_band", 5.0),
-                "feedback": result.get("feedback", ""),
-            }
-        except Exception as e:
-            print(f"Speaking scoring error: {e}")
-            import traceback
-
-            print(traceback.format_exc())
-            # Fallback scores
-            return {
-                "fluency_coherence": 5.0,
-                "lexical_resource": 5.0,
-                "grammatical_range": 5.0,
-                "pronunciation": 5.0,
-                "overall_band": 5.0,
-                "feedback": "Không thể đánh giá tự động",
-            }
-
-    def score_writing(
+            logger.debug("Calling LLM for Speaking scoring (async)")
+            result = await self._ascore_with_llm(
+                prompt,
+                self.SPEAKING_SYSTEM_INSTRUCTION,
+                PURPOSE_SCORE_SPEAKING,
+                self._valid_speaking,
+            )
+            logger.debug("LLM response received for Speaking")
+            return self._speaking_scores(result)
+        except Exception:
+            if not fallback:
+                raise
+            logger.exception("Speaking scoring failed, using fallback scores")
+            return self._speaking_default(5.0, "Không thể đánh giá tự động")
+
+    def _writing_prompt(
         self, content: Dict[str, Any], answers: Dict[str, Any]
-    ) -> Dict[str, Any]:
-        """Score Writing section using Gemini (4 IELTS criteria) - Optimized for token limits"""
+    ) -> Optional[str]:
+        """Build the Writing scoring prompt, or None if no answers were provided"""
         task1_answer = answers.get("writing_task1", "").strip()
         task2_answer = answers.get("writing_task2", "").strip()
 
         # Check if user provided any answers
         has_any_answer = bool(task1_answer or task2_answer)
-
-        # If no answers provided, return 0.0 scores
         if not has_any_answer:
-            return {
-                "task1": {
-                    "task_achievement": 0.0,
-                    "coherence_cohesion": 0.0,
-                    "lexical_resource": 0.0,
-                    "grammatical_range": 0.0,
-                    "overall_band": 0.0,
-                },
-                "task2": {
-                    "task_response": 0.0,
-                    "coherence_cohesion": 0.0,
-                    "lexical_resource": 0.0,
-                    "grammatical_range": 0.0,
-                    "overall_band": 0.0,
-                },
-                "overall_band": 0.0,
-                "feedback": "No answers provided",
-            }
-
-        system_instruction = """You are an IELTS examiner. Evaluate writing using 4 criteria: Task Achievement/Response, Coherence and Cohesion, Lexical Resource, Grammatical Range and Accuracy. Return JSON only."""
+            return None
 
         def truncate_text(text: str, max_words: int = 150) -> str:
             """Truncate text to max words to reduce token usage"""
@@ -410,55 +449,117 @@ A2: {task2_answer}
 Return JSON only:
 {{"task1":{{"task_achievement":7.0,"coherence_cohesion":7.0,"lexical_resource":7.0,"grammatical_range":7.0,"overall_band":7.0}},"task2":{{"task_response":7.0,"coherence_cohesion":7.0,"lexical_resource":7.0,"grammatical_range":7.0,"overall_band":7.0}},"overall_band":7.0,"feedback":"Brief feedback"}}"""
 
+        return prompt
+
+    @staticmethod
+    def _writing_scores(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Map a Gemini Writing evaluation to the stored score format"""
+        task1_scores = result.get("task1", {})
+        task2_scores = result.get("task2", {})
+
+        return {
+            "task1": {
+                "task_achievement": task1_scores.get("task_achievement", 5.0),
+                "coherence_cohesion": task1_scores.get("coherence_cohesion", 5.0),
+                "lexical_resource": task1_scores.get("lexical_resource", 5.0),
+                "grammatical_range": task1_scores.get("grammatical_range", 5.0),
+                "overall_band": task1_scores.get("overall_band", 5.0),
+            },
+            "task2": {
+                "task_response": task2_scores.get("task_response", 5.0),
+                "coherence_cohesion": task2_scores.get("coherence_cohesion", 5.0),
+                "lexical_resource": task2_scores.get("lexical_resource", 5.0),
+                "grammatical_range": task2_scores.get("grammatical_range", 5.0),
+                "overall_band": task2_scores.get("overall_band", 5.0),
+            },
+            "overall_band": result.get("overall_band", 5.0),
+            "feedback": result.get("feedback", ""),
+        }
+
+    @classmethod
+    def _valid_writing(cls, result: Dict[str, Any]) -> bool:
+        """A Writing evaluation has an overall band and a band for each task"""
+        return cls._is_band(result.get("overall_band")) and all(
+            isinstance(result.get(task), dict) and cls._is_band(result[task].get("overall_band"))
+            for task in ("task1", "task2")
+        )
+
+    @staticmethod
+    def _writing_default(band: float, feedback: str) -> Dict[str, Any]:
+        """Writing scores with every criterion set to the same band"""
+        return {
+            "task1": {
+                "task_achievement": band,
+                "coherence_cohesion": band,
+                "lexical_resource": band,
+                "grammatical_range": band,
+                "overall_band": band,
+            },
+            "task2": {
+                "task_response": band,
+                "coherence_cohesion": band,
+                "lexical_resource": band,
+                "grammatical_range": band,
+                "overall_band": band,
+            },
+            "overall_band": band,
+            "feedback": feedback,
+        }
+
+    async def ascore_writing(
+        self, content: Dict[str, Any], answers: Dict[str, Any], fallback: bool = True
+    ) -> Dict[str, Any]:
+        """Score Writing section using Gemini (4 IELTS criteria) - Optimized for token limits
+
+        LLM failures are handled as in ascore_speaking.
+        """
+        prompt = self._writing_prompt(content, answers)
+        if prompt is None:
+            return self._writing_default(0.0, "No answers provided")
+
         try:
-            print("Calling Gemini API for Writing scoring...")
-            result = self.gemini.generate_json(prompt, system_instruction)
-            print("Gemini API response received for Writing")
-            task1_scores = result.get("task1", {})
-            task2_scores = result.get("task2", {})
-
-            return {
-                "task1": {
-                    "task_achievement": task1_scores.get("task_achievement", 5.0),
-                    "coherence_cohesion": task1_scores.get("coherence_cohesion", 5.0),
-                    "lexical_resource": task1_scores.get("lexical_resource", 5.0),
-                    "grammatical_range": task1_scores.get("grammatical_range", 5.0),
-                    "overall_band": task1_scores.get("overall_band", 5.0),
-                },
-                "task2": {
-                    "task_response": task2_scores.get("task_response", 5.0),
-                    "coherence_cohesion": task2_scores.get("coherence_cohesion", 5.0),
-                    "lexical_resource": task2_scores.get("lexical_resource", 5.0),
-                    "grammatical_range": task2_scores.get("grammatical_range", 5.0),
-                    "overall_band": task2_scores.get("overall_band", 5.0),
-                },
-                "overall_band": result.get("overall_band", 5.0),
-                "feedback": result.get("feedback", ""),
-            }
-        except Exception as e:
-            print(f"Writing scoring error: {e}")
-            import traceback
-
-            print(traceback.format_exc())
-            # Fallback scores
-            return {
-                "task1": {
-                    "task_achievement": 5.0,
-                    "coherence_cohesion": 5.0,
-                    "lexical_resource": 5.0,
-                    "grammatical_range": 5.0,
-                    "overall_band": 5.0,
-                },
-                "task2": {
-                    "task_response": 5.0,
-                    "coherence_cohesion": 5.0,
-                    "lexical_resource": 5.0,
-                    "grammatical_range": 5.0,
-                    "overall_band": 5.0,
-                },
-                "overall_band": 5.0,
-                "feedback": "Không thể đánh giá tự động",
-            }
+            logger.debug("Calling LLM for Writing scoring (async)")
+            result = await self._ascore_with_llm(
+                prompt,
+                self.WRITING_SYSTEM_INSTRUCTION,
+                PURPOSE_SCORE_WRITING,
+                self._valid_writing,
+            )
+            logger.debug("LLM response received for Writing")
+            return self._writing_scores(result)
+        except Exception:
+            if not fallback:
+                raise
+            logger.exception("Writing scoring failed, using fallback scores")
+            return self._writing_default(5.0, "Không thể đánh giá tự động")
+
+    async def ascore_phase(
+        self,
+        phase_type: Phase,
+        content: Dict[str, Any],
+        answers: Dict[str, Any],
+        fallback: bool = True,
+    ) -> Dict[str, Any]:
+        """Score a whole phase: the objective scorer and the Gemini scorer run concurrently.
+
+        Latency is that of the Gemini call alone instead of the sum of both scorers.
+        fallback: as in ascore_speaking / ascore_writing.
+        """
+        if phase_type == Phase.LISTENING_SPEAKING:
+            logger.info("Scoring Listening & Speaking concurrently")
+            listening, speaking = await asyncio.gather(
+                asyncio.to_thread(self.score_listening, content, answers),
+                self.ascore_speaking(content, answers, fallback),
+            )
+            return {"listening": listening, "speaking": speaking}
+        if phase_type == Phase.READING_WRITING:
+            logger.info("Scoring Reading & Writing concurrently")
+            reading, writing = await asyncio.gather(
+                asyncio.to_thread(self.score_reading, content, answers),
+                self.ascore_writing(content, answers, fallback),
+            )
+            return {"reading": reading, "writing": writing}
+        return {}
 
     def aggregate_results(
         self,
@@ -515,7 +616,7 @@ Return JSON only:
 
         return results
 
-    def generate_detailed_analysis(
+    def _analysis_prompts(
         self,
         phase1_scores: Dict[str, Any],
         phase2_scores: Dict[str, Any],
@@ -526,12 +627,8 @@ Return JSON only:
         phase1_answers: Dict[str, Any],
         phase2_answers: Dict[str, Any],
         final_results: Dict[str, Any],
-    ) -> Dict[str, Any]:
-        """Generate detailed analysis including IELTS framework and beyond-IELTS insights - Optimized for token limits"""
-        system_instruction = (
-            """Giám khảo IELTS. Phân tích tiếng Anh. Trả về TIẾNG VIỆT. Chỉ JSON."""
-        )
-
+    ) -> Tuple[str, str]:
+        """Build the IELTS and Beyond-IELTS analysis prompts"""
         # Prepare data for analysis
         listening_score = final_results.get("listening", 0)
         reading_score = final_results.get("reading", 0)
@@ -606,10 +703,6 @@ Return JSON only:
                     speaking_samples += f"S2:{sample_answer(phase2_answers[key], 15)}"
                     break
 
-        # Split into 2 separate API calls: Key 1 for IELTS, Key 2 for Beyond IELTS
-        ielts_analysis = {}
-        beyond_ielts = {}
-
         # Part 1: IELTS Analysis using Key 1 (ultra-compact Vietnamese)
         ielts_prompt = f"""IELTS (TIẾNG VIỆT):
 
@@ -642,26 +735,67 @@ Phân tích (TIẾNG VIỆT):
 
 JSON (TIẾNG VIỆT): {{"beyond_ielts":{{"reflex_level":"","reception_ability":"","mother_tongue_influence":{{"translation":"","vocabulary_usage":"","listening":"","reading":"","speaking":"","writing":""}}, "grammar":{{"meaning_errors":"","grammar_errors":"","structure_errors":"","unnatural":""}}, "pronunciation":{{"hard_to_understand":"","lack_coherence":"","native_comprehension":"","rhythm_stress":"","word_pronunciation":"","diphthongs_endings":""}}, "vocabulary":{{"level":"","natural_vs_translated":"","assessment":""}}}}}}"""
 
-        try:
-            print("Generating IELTS analysis (using Key 1)...")
-            ielts_result = self.gemini.generate_json(
-                ielts_prompt, system_instruction, force_key=1
-            )
-            ielts_analysis = ielts_result.get("ielts_analysis", {})
-            print("IELTS analysis generated successfully")
-        except Exception as e:
-            print(f"Error generating IELTS analysis: {e}")
-            ielts_analysis = {}
+        return ielts_prompt, beyond_prompt
+
+    async def agenerate_detailed_analysis(
+        self,
+        phase1_scores: Dict[str, Any],
+        phase2_scores: Dict[str, Any],
+        phase1_type: Phase,
+        phase2_type: Phase,
+        phase1_content: Dict[str, Any],
+        phase2_content: Dict[str, Any],
+        phase1_answers: Dict[str, Any],
+        phase2_answers: Dict[str, Any],
+        final_results: Dict[str, Any],
+        fallback: bool = True,
+    ) -> Dict[str, Any]:
+        """Generate detailed analysis including IELTS framework and beyond-IELTS insights - Optimized for token limits
+
+        A part whose LLM call fails is left empty, or with fallback=False the
+        error is raised (so a job can retry it).
+        """
+        ielts_prompt, beyond_prompt = self._analysis_prompts(
+            phase1_scores,
+            phase2_scores,
+            phase1_type,
+            phase2_type,
+            phase1_content,
+            phase2_content,
+            phase1_answers,
+            phase2_answers,
+            final_results,
+        )
 
+        # Both analyses are independent: run them concurrently (Key 1 and Key 2)
+        logger.info("Generating IELTS (Key 1) and Beyond IELTS (Key 2) analysis concurrently")
+        ielts_analysis, beyond_ielts = await asyncio.gather(
+            self._agenerate_analysis_part(
+                ielts_prompt, "ielts_analysis", PURPOSE_ANALYSIS_IELTS, 1, fallback
+            ),
+            self._agenerate_analysis_part(
+                beyond_prompt, "beyond_ielts", PURPOSE_ANALYSIS_BEYOND, 2, fallback
+            ),
+        )
+
+        return {"ielts_analysis": ielts_analysis, "beyond_ielts": beyond_ielts}
+
+    async def _agenerate_analysis_part(
+        self, prompt: str, result_key: str, purpose: str, force_key: int, fallback: bool
+    ) -> Dict[str, Any]:
+        """Run one analysis prompt; failures yield an empty section with fallback, else are raised"""
         try:
-            print("Generating Beyond IELTS analysis (using Key 2)...")
-            beyond_result = self.gemini.generate_json(
-                beyond_prompt, system_instruction, force_key=2
+            result = await self.llm.agenerate_json(
+                prompt,
+                self.ANALYSIS_SYSTEM_INSTRUCTION,
+                purpose=purpose,
+                force_key=force_key,
+                cache=True,
             )
-            beyond_ielts = beyond_result.get("beyond_ielts", {})
-            print("Beyond IELTS analysis generated successfully")
+            logger.info("%s generated", result_key)
+            return result.get(result_key, {})
         except Exception as e:
-            print(f"Error generating Beyond IELTS analysis: {e}")
-            beyond_ielts = {}
-
-        return {"ielts_analysis": ielts_analysis, "beyond_ielts": beyond_ielts}
+            if not fallback:
+                raise
+            logger.warning("Error generating %s: %s", result_key, e)
+            return {}
@@ -0,0 +1,144 @@
+import os
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+from sqlalchemy.exc import IntegrityError
+from dotenv import load_dotenv
+
+from app.database import SessionLocal
+from app.deadline import current_deadline, detached_deadline, time_left
+from app.models.lease import Lease
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Runs LLM work for a key once, however many requests ask for it concurrently.
+
+    Within a process, callers of the same key share one task (awaited through
+    asyncio.shield, so a disconnecting client does not cancel it for the others).
+    The task runs under a deadline of its own; each caller only waits for it
+    until the caller's deadline (TimeoutError), the task carries on for the others.
+    Across processes, the task first takes a lease row named after the key and
+    checks `done` (is a result stored already?) before running the work. A task
+    that finds the lease held polls `done` until the result appears, or until
+    the lease is released or expires and it can take it over.
+    """
+
+    def __init__(self):
+        # A holder that died keeps others waiting at most this long
+        self.lease_ttl = float(os.getenv("SINGLE_FLIGHT_LEASE_TTL", "300"))
+        self.poll_interval = float(os.getenv("SINGLE_FLIGHT_POLL_INTERVAL", "0.25"))
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def do(
+        self,
+        key: str,
+        work: Callable[[], Awaitable[Any]],
+        done: Callable[[], Awaitable[Optional[Any]]],
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """Result of work() for the key, run at most once at a time across processes.
+
+        Args:
+            key: What is being produced, e.g. "generate:12:1"
+            work: Produces and stores the result, returns it
+            done: The stored result, or None if there is none yet
+            timeout: Deadline of the shared task (seconds, None for none), instead
+                of the deadline of the caller that starts it
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._lead(key, work, done, timeout))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        at = current_deadline()
+        return await asyncio.wait_for(
+            asyncio.shield(task), time_left(at) if at is not None else None
+        )
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Retrieved here so an error nobody waited for is not reported as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    async def _lead(
+        self,
+        key: str,
+        work: Callable[[], Awaitable[Any]],
+        done: Callable[[], Awaitable[Optional[Any]]],
+        timeout: Optional[float],
+    ) -> Any:
+        with detached_deadline(timeout):
+            return await self._lead_until_done(key, work, done)
+
+    async def _lead_until_done(
+        self,
+        key: str,
+        work: Callable[[], Awaitable[Any]],
+        done: Callable[[], Awaitable[Optional[Any]]],
+    ) -> Any:
+        waited = False
+        while True:
+            token = await asyncio.to_thread(acquire_lease, key, self.lease_ttl)
+            if token is not None:
+                try:
+                    # Another process may have stored the result since the caller checked
+                    result = await done()
+                    return result if result is not None else await work()
+                finally:
+                    await asyncio.to_thread(release_lease, key, token)
+
+            if not waited:
+                logger.info("Waiting for %s running in another process", key)
+                waited = True
+            result = await done()
+            if result is not None:
+                return result
+            await asyncio.sleep(self.poll_interval)
+
+
+def acquire_lease(name: str, ttl: float) -> Optional[str]:
+    """Take the named lease for ttl seconds; returns its token, or None if another
+    holder has it"""
+    token = uuid.uuid4().hex
+    now = datetime.now()
+    expires_at = now + timedelta(seconds=ttl)
+    db = SessionLocal()
+    try:
+        # An expired lease is taken over in place
+        taken = (
+            db.query(Lease)
+            .filter(Lease.name == name, Lease.expires_at < now)
+            .update(
+                {Lease.token: token, Lease.expires_at: expires_at},
+                synchronize_session=False,
+            )
+        )
+        if taken == 0:
+            db.add(Lease(name=name, token=token, expires_at=expires_at))
+        db.commit()
+        return token
+    except IntegrityError:
+        db.rollback()
+        return None
+    finally:
+        db.close()
+
+
+def release_lease(name: str, token: str):
+    """Release the lease if the token still holds it"""
+    db = SessionLocal()
+    try:
+        db.query(Lease).filter(Lease.name == name, Lease.token == token).delete(
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
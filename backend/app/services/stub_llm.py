@@ -0,0 +1,421 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from dotenv import load_dotenv
+
+from app.deadline import time_left
+from app.metrics import LLM_REQUESTS_IN_FLIGHT
+from app.services.batch_scoring import split_batch_prompt
+from app.services.llm_backend import (
+    LLMBackend,
+    PURPOSE_ANALYSIS_BEYOND,
+    PURPOSE_ANALYSIS_IELTS,
+    PURPOSE_GENERATE_LISTENING_SPEAKING,
+    PURPOSE_GENERATE_READING_WRITING,
+    PURPOSE_SCORE_SPEAKING,
+    PURPOSE_SCORE_WRITING,
+)
+
+load_dotenv()
+
+# Default latency per purpose ("distribution:median_ms:spread"), roughly what gemini-2.5-flash takes
+DEFAULT_LATENCY = {
+    PURPOSE_GENERATE_LISTENING_SPEAKING: "lognormal:25000:0.3",
+    PURPOSE_GENERATE_READING_WRITING: "lognormal:20000:0.3",
+    PURPOSE_SCORE_SPEAKING: "lognormal:4000:0.4",
+    PURPOSE_SCORE_WRITING: "lognormal:5000:0.4",
+    PURPOSE_ANALYSIS_IELTS: "lognormal:8000:0.4",
+    PURPOSE_ANALYSIS_BEYOND: "lognormal:8000:0.4",
+}
+
+WORDS = (
+    "the student library museum river weather holiday university research city "
+    "village travel people water time number day house market train ticket "
+    "morning evening family friend course lecture project report garden park"
+).split()
+
+BANDS = [4.0, 4.5, 5.0, 5.5, 6.0, 6.5, 7.0, 7.5, 8.0]
+
+
+class LatencyModel:
+    """Latency distribution parsed from "fixed:800", "uniform:800:0.5" or "lognormal:800:0.5".
+
+    The number is the median in milliseconds; spread is the +/- fraction for
+    uniform and sigma for lognormal.
+    """
+
+    def __init__(self, spec: str):
+        parts = spec.split(":")
+        self.kind = parts[0]
+        self.median = float(parts[1]) / 1000 if len(parts) > 1 else 0.0
+        self.spread = float(parts[2]) if len(parts) > 2 else 0.0
+        if self.kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution '{spec}'")
+
+    def sample(self, rnd: random.Random) -> float:
+        if self.kind == "uniform":
+            return max(0.0, self.median * (1 + rnd.uniform(-self.spread, self.spread)))
+        if self.kind == "lognormal" and self.median > 0:
+            return rnd.lognormvariate(0, self.spread) * self.median
+        return self.median
+
+
+class StubRateLimitError(Exception):
+    """Injected quota error; the message matches what Gemini returns for a 429"""
+
+
+class StubLLMBackend(LLMBackend):
+    """Offline backend returning schema-valid IELTS content, scores and analyses.
+
+    Responses are derived from a hash of the prompt, so the same prompt always
+    gets the same answer. Latency per purpose, error and 429 injection rates are
+    configurable through STUB_LLM_* env vars; token usage is counted as if the
+    calls were real (~4 characters per token). Calls are cut off at their
+    deadline like Gemini calls.
+    """
+
+    name = "stub"
+
+    def __init__(self):
+        default = os.getenv("STUB_LLM_LATENCY")
+        self.latency = {
+            purpose: LatencyModel(
+                os.getenv(f"STUB_LLM_LATENCY_{purpose.upper()}", default or spec)
+            )
+            for purpose, spec in DEFAULT_LATENCY.items()
+        }
+        self.default_latency = LatencyModel(default or "lognormal:3000:0.4")
+        self.error_rate = float(os.getenv("STUB_LLM_ERROR_RATE", "0"))
+        self.rate_limit_rate = float(os.getenv("STUB_LLM_429_RATE", "0"))
+        self.chunk_size = int(os.getenv("STUB_LLM_STREAM_CHUNK", "400"))
+
+        self._rnd = random.Random(int(os.getenv("STUB_LLM_SEED", "0")))
+        self._lock = threading.Lock()
+        self._usage: Dict[str, Dict[str, int]] = {}
+
+    # Call simulation
+
+    def _count(self, purpose: str, **amounts: int):
+        with self._lock:
+            usage = self._usage.setdefault(
+                purpose or "generic",
+                {
+                    "calls": 0,
+                    "errors": 0,
+                    "rate_limited": 0,
+                    "timeouts": 0,
+                    "prompt_tokens": 0,
+                    "output_tokens": 0,
+                },
+            )
+            for name, amount in amounts.items():
+                usage[name] += amount
+
+    def _plan(self, purpose: str) -> Tuple[float, Optional[Exception]]:
+        """Latency of the next call and the error it should fail with, if any"""
+        with self._lock:
+            latency = self.latency.get(purpose, self.default_latency).sample(self._rnd)
+            roll = self._rnd.random()
+        if roll < self.rate_limit_rate:
+            # Quota errors come back fast
+            return min(latency, 0.2), StubRateLimitError(
+                "429 Resource has been exhausted (e.g. check quota). [stub]"
+            )
+        if roll < self.rate_limit_rate + self.error_rate:
+            return latency, RuntimeError("500 Internal error encountered. [stub]")
+        return latency, None
+
+    def _render(self, prompt: str, purpose: str) -> str:
+        return json.dumps(self._response(prompt, purpose), ensure_ascii=False)
+
+    def _succeed(self, prompt: str, purpose: str, text: str, started: float) -> str:
+        # Same ~4 characters per token estimate as GeminiService
+        prompt_tokens, output_tokens = len(prompt) // 4, len(text) // 4
+        self._count(purpose, calls=1, prompt_tokens=prompt_tokens, output_tokens=output_tokens)
+        self.observe_call("stub", purpose, "success", started)
+        self.record_usage(purpose, prompt_tokens, output_tokens, started, model="stub")
+        return text
+
+    def _respond(self, prompt: str, purpose: str, started: float) -> str:
+        return self._succeed(prompt, purpose, self._render(prompt, purpose), started)
+
+    def _fail(self, purpose: str, error: Exception, started: float):
+        if isinstance(error, StubRateLimitError):
+            self._count(purpose, calls=1, rate_limited=1)
+            self.observe_call("stub", purpose, "rate_limited", started)
+        else:
+            self._count(purpose, calls=1, errors=1)
+            self.observe_call("stub", purpose, "error", started)
+        raise error
+
+    def _timeout(self, purpose: str, started: float):
+        self._count(purpose, calls=1, timeouts=1)
+        self.observe_call("stub", purpose, "timeout", started)
+        raise self.timeout_error(purpose, "[stub]")
+
+    def generate_json(
+        self,
+        prompt: str,
+        system_instruction: Optional[str] = None,
+        purpose: str = "",
+        force_key: Optional[int] = None,
+        cache: bool = False,
+        max_output_tokens: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        latency, error = self._plan(purpose)
+        started = time.perf_counter()
+        budget = time_left(self.call_deadline(purpose))
+        with LLM_REQUESTS_IN_FLIGHT.track_inprogress(purpose=purpose or "generic"):
+            time.sleep(min(latency, budget))
+        if latency > budget:
+            self._timeout(purpose, started)
+        if error:
+            self._fail(purpose, error, started)
+        return self.parse_response(self._respond(prompt, purpose, started), purpose)
+
+    async def agenerate_json(
+        self,
+        prompt: str,
+        system_instruction: Optional[str] = None,
+        purpose: str = "",
+        force_key: Optional[int] = None,
+        cache: bool = False,
+        max_output_tokens: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        latency, error = self._plan(purpose)
+        started = time.perf_counter()
+        budget = time_left(self.call_deadline(purpose))
+        with LLM_REQUESTS_IN_FLIGHT.track_inprogress(purpose=purpose or "generic"):
+            await asyncio.sleep(min(latency, budget))
+        if latency > budget:
+            self._timeout(purpose, started)
+        if error:
+            self._fail(purpose, error, started)
+        return self.parse_response(self._respond(prompt, purpose, started), purpose)
+
+    async def agenerate_json_stream(
+        self,
+        prompt: str,
+        system_instruction: Optional[str] = None,
+        purpose: str = "",
+        force_key: Optional[int] = None,
+    ) -> AsyncIterator[str]:
+        latency, error = self._plan(purpose)
+        started = time.perf_counter()
+        at = self.call_deadline(purpose)
+        if error:
+            budget = time_left(at)
+            await asyncio.sleep(min(latency, budget))
+            if latency > budget:
+                self._timeout(purpose, started)
+            self._fail(purpose, error, started)
+        text = self._render(prompt, purpose)
+        chunks = [text[i : i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        with LLM_REQUESTS_IN_FLIGHT.track_inprogress(purpose=purpose or "generic"):
+            for chunk in chunks:
+                step = latency / len(chunks)
+                if step > time_left(at):
+                    await asyncio.sleep(time_left(at))
+                    self._timeout(purpose, started)
+                await asyncio.sleep(step)
+                yield chunk
+        self._succeed(prompt, purpose, text, started)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            usage = {purpose: dict(counts) for purpose, counts in self._usage.items()}
+        return {
+            "backend": self.name,
+            "keys": [],
+            "error_rate": self.error_rate,
+            "rate_limit_rate": self.rate_limit_rate,
+            "usage": usage,
+        }
+
+    # Responses
+
+    def _response(self, prompt: str, purpose: str) -> Dict[str, Any]:
+        # Batched scoring prompt: answer every item under its id
+        items = split_batch_prompt(prompt)
+        if items:
+            return {
+                "results": [
+                    {"id": item_id, "result": self._response(item_prompt, purpose)}
+                    for item_id, item_prompt in items
+                ]
+            }
+        seed = int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "big")
+        rnd = random.Random(seed)
+        builders = {
+            PURPOSE_GENERATE_LISTENING_SPEAKING: self._listening_speaking,
+            PURPOSE_GENERATE_READING_WRITING: self._reading_writing,
+            PURPOSE_SCORE_SPEAKING: self._speaking_scores,
+            PURPOSE_SCORE_WRITING: self._writing_scores,
+            PURPOSE_ANALYSIS_IELTS: self._ielts_analysis,
+            PURPOSE_ANALYSIS_BEYOND: self._beyond_analysis,
+        }
+        builder = builders.get(purpose)
+        if builder is None:
+            return {"text": self._words(rnd, 20)}
+        return builder(rnd)
+
+    @staticmethod
+    def _words(rnd: random.Random, count: int) -> str:
+        return " ".join(rnd.choice(WORDS) for _ in range(count)).capitalize() + "."
+
+    def _questions(self, rnd: random.Random, count: int, fill_blank_every: int):
+        questions = []
+        for qid in range(1, count + 1):
+            if qid % fill_blank_every == 0:
+                questions.append(
+                    {
+                        "id": qid,
+                        "type": "fill_blank",
+                        "question": self._words(rnd, 10),
+                        "correct_answer": rnd.choice(WORDS),
+                    }
+                )
+            else:
+                questions.append(
+                    {
+                        "id": qid,
+                        "type": "multiple_choice",
+                        "question": self._words(rnd, 12),
+                        "options": [f"{letter}. {self._words(rnd, 4)}" for letter in "ABC"],
+                        "correct_answer": rnd.choice("ABC"),
+                    }
+                )
+        return questions
+
+    def _listening_speaking(self, rnd: random.Random) -> Dict[str, Any]:
+        return {
+            "listening": {
+                "sections": [
+                    {
+                        "id": sid,
+                        "title": f"Section {sid}",
+                        "instructions": self._words(rnd, 10),
+                        "audio_transcript": self._words(rnd, 250),
+                        "questions": self._questions(rnd, 10, 3),
+                    }
+                    for sid in range(1, 5)
+                ]
+            },
+            "speaking": {
+                "part1": [{"id": i, "question": self._words(rnd, 10)} for i in range(1, 5)],
+                "part2": {"topic": self._words(rnd, 5), "task_card": self._words(rnd, 40)},
+                "part3": [{"id": i, "question": self._words(rnd, 14)} for i in range(1, 5)],
+            },
+        }
+
+    def _reading_writing(self, rnd: random.Random) -> Dict[str, Any]:
+        return {
+            "reading": {
+                "passages": [
+                    {
+                        "id": pid,
+                        "title": self._words(rnd, 5),
+                        "content": self._words(rnd, 400),
+                        "questions": self._questions(rnd, 13 if pid < 3 else 14, 4),
+                    }
+                    for pid in range(1, 4)
+                ]
+            },
+            "writing": {
+                "task1": {
+                    "type": "chart_description",
+                    "instructions": self._words(rnd, 30),
+                    "chart_description": self._words(rnd, 60),
+                    "word_count": 50,
+                },
+                "task2": {"type": "essay", "question": self._words(rnd, 25), "word_count": 100},
+            },
+        }
+
+    @staticmethod
+    def _band(rnd: random.Random) -> float:
+        return rnd.choice(BANDS)
+
+    def _speaking_scores(self, rnd: random.Random) -> Dict[str, Any]:
+        criteria = ["fluency_coherence", "lexical_resource", "grammatical_range", "pronunciation"]
+        scores = {name: self._band(rnd) for name in criteria}
+        scores["overall_band"] = round(sum(scores.values()) / len(criteria) * 2) / 2
+        scores["feedback"] = self._words(rnd, 20)
+        return scores
+
+    def _writing_scores(self, rnd: random.Random) -> Dict[str, Any]:
+        def task(first: str) -> Dict[str, Any]:
+            criteria = [first, "coherence_cohesion", "lexical_resource", "grammatical_range"]
+            scores = {name: self._band(rnd) for name in criteria}
+            scores["overall_band"] = round(sum(scores.values()) / len(criteria) * 2) / 2
+            return scores
+
+        task1, task2 = task("task_achievement"), task("task_response")
+        return {
+            "task1": task1,
+            "task2": task2,
+            # Task 2 counts twice as much as Task 1
+            "overall_band": round((task1["overall_band"] + 2 * task2["overall_band"]) / 3 * 2) / 2,
+            "feedback": self._words(rnd, 20),
+        }
+
+    def _assessment(self, rnd: random.Random) -> Dict[str, Any]:
+        return {
+            "strengths": [self._words(rnd, 8)],
+            "weaknesses": [self._words(rnd, 8)],
+        }
+
+    def _ielts_analysis(self, rnd: random.Random) -> Dict[str, Any]:
+        def criteria(names):
+            return {name: {"score": self._band(rnd), **self._assessment(rnd)} for name in names}
+
+        return {
+            "ielts_analysis": {
+                "reading": {**self._assessment(rnd), "question_type_analysis": {}},
+                "listening": {**self._assessment(rnd), "question_type_analysis": {}},
+                "writing": {
+                    **criteria(
+                        ["task_achievement", "coherence_cohesion", "lexical_resource", "grammatical_range"]
+                    ),
+                    "overall_assessment": self._words(rnd, 20),
+                },
+                "speaking": {
+                    **criteria(
+                        ["fluency_coherence", "lexical_resource", "grammatical_range", "pronunciation"]
+                    ),
+                    "overall_assessment": self._words(rnd, 20),
+                },
+            }
+        }
+
+    def _beyond_analysis(self, rnd: random.Random) -> Dict[str, Any]:
+        def fields(names):
+            return {name: self._words(rnd, 10) for name in names}
+
+        return {
+            "beyond_ielts": {
+                **fields(["reflex_level", "reception_ability"]),
+                "mother_tongue_influence": fields(
+                    ["translation", "vocabulary_usage", "listening", "reading", "speaking", "writing"]
+                ),
+                "grammar": fields(
+                    ["meaning_errors", "grammar_errors", "structure_errors", "unnatural"]
+                ),
+                "pronunciation": fields(
+                    [
+                        "hard_to_understand",
+                        "lack_coherence",
+                        "native_comprehension",
+                        "rhythm_stress",
+                        "word_pronunciation",
+                        "diphthongs_endings",
+                    ]
+                ),
+                "vocabulary": fields(["level", "natural_vs_translated", "assessment"]),
+            }
+        }
@@ -1,13 +1,36 @@
-from typing import Dict, Any
-from app.services.gemini_service import GeminiService
+from typing import AsyncIterator, Dict, Any, Tuple
+from app.services.llm_backend import (
+    PURPOSE_GENERATE_LISTENING_SPEAKING,
+    PURPOSE_GENERATE_READING_WRITING,
+    get_llm_backend,
+)
+from app.services.answer_key import compile_answer_key
+from app.services.json_stream import IncrementalJSONSections, path_to_str
 from app.models.test_session import Level, Phase
 
 
 class TestGeneratorService:
-    """Service for generating IELTS test content using Gemini"""
+    """Service for generating IELTS test content with the configured LLM backend (Gemini by default)"""
+
+    SYSTEM_INSTRUCTION = """You are an expert IELTS examiner. Generate test content in JSON format only."""
+
+    # Parts of the generated document that are delivered one by one when streaming
+    SECTION_PATHS = {
+        Phase.LISTENING_SPEAKING: [
+            ("listening", "sections", "*"),
+            ("speaking", "part1"),
+            ("speaking", "part2"),
+            ("speaking", "part3"),
+        ],
+        Phase.READING_WRITING: [
+            ("reading", "passages", "*"),
+            ("writing", "task1"),
+            ("writing", "task2"),
+        ],
+    }
 
     def __init__(self):
-        self.gemini = GeminiService()
+        self.llm = get_llm_backend()
 
         self.level_to_band = {
             Level.BEGINNER: "3.0-4.0",
@@ -17,12 +40,10 @@ class TestGeneratorService:
             Level.ADVANCED: "7.0-8.0",
         }
 
-    def generate_listening_speaking(self, level: Level) -> Dict[str, Any]:
-        """Generate Listening & Speaking test content (30 minutes)"""
+    def _listening_speaking_prompt(self, level: Level) -> str:
+        """Build the Listening & Speaking generation prompt"""
         band = self.level_to_band.get(level, "5.0-5.5")
 
-        system_instruction = """You are an expert IELTS examiner. Generate test content in JSON format only."""
-
         prompt = f"""Generate a 30-minute IELTS Listening & Speaking test for {level.value} level (estimated band {band}).
 
 LISTENING SECTION (20 minutes):
@@ -80,14 +101,12 @@ Return JSON format:
     }}
 }}"""
 
-        return self.gemini.generate_json(prompt, system_instruction)
+        return prompt
 
-    def generate_reading_writing(self, level: Level) -> Dict[str, Any]:
-        """Generate Reading & Writing test content (30 minutes)"""
+    def _reading_writing_prompt(self, level: Level) -> str:
+        """Build the Reading & Writing generation prompt"""
         band = self.level_to_band.get(level, "5.0-5.5")
 
-        system_instruction = """You are an expert IELTS examiner. Generate test content in JSON format only."""
-
         prompt = f"""Generate a 30-minute IELTS Reading & Writing test for {level.value} level (estimated band {band}).
 
 READING SECTION (15 minutes):
@@ -141,4 +160,79 @@ Return JSON format:
     }}
 }}"""
 
-        return self.gemini.generate_json(prompt, system_instruction)
+        return prompt
+
+    @staticmethod
+    def with_answer_key(content: Dict[str, Any]) -> Dict[str, Any]:
+        """Attach the compiled answer key, so scoring does not re-derive it per submission"""
+        if isinstance(content, dict):
+            content["answer_key"] = compile_answer_key(content)
+        return content
+
+    def generate_listening_speaking(self, level: Level) -> Dict[str, Any]:
+        """Generate Listening & Speaking test content (30 minutes)"""
+        return self.with_answer_key(
+            self.llm.generate_json(
+                self._listening_speaking_prompt(level),
+                self.SYSTEM_INSTRUCTION,
+                purpose=PURPOSE_GENERATE_LISTENING_SPEAKING,
+            )
+        )
+
+    def generate_reading_writing(self, level: Level) -> Dict[str, Any]:
+        """Generate Reading & Writing test content (30 minutes)"""
+        return self.with_answer_key(
+            self.llm.generate_json(
+                self._reading_writing_prompt(level),
+                self.SYSTEM_INSTRUCTION,
+                purpose=PURPOSE_GENERATE_READING_WRITING,
+            )
+        )
+
+    async def agenerate_listening_speaking(self, level: Level) -> Dict[str, Any]:
+        """Async version of generate_listening_speaking"""
+        return self.with_answer_key(
+            await self.llm.agenerate_json(
+                self._listening_speaking_prompt(level),
+                self.SYSTEM_INSTRUCTION,
+                purpose=PURPOSE_GENERATE_LISTENING_SPEAKING,
+            )
+        )
+
+    async def agenerate_reading_writing(self, level: Level) -> Dict[str, Any]:
+        """Async version of generate_reading_writing"""
+        return self.with_answer_key(
+            await self.llm.agenerate_json(
+                self._reading_writing_prompt(level),
+                self.SYSTEM_INSTRUCTION,
+                purpose=PURPOSE_GENERATE_READING_WRITING,
+            )
+        )
+
+    async def astream_content(
+        self, level: Level, phase: Phase
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Generate a phase with a streamed response, delivering each section as soon as it is complete.
+
+        Yields ("section", {"path": ..., "data": ...}) for every listening section,
+        reading passage, speaking part or writing task, then ("complete", content)
+        with the full document.
+        """
+        if phase == Phase.LISTENING_SPEAKING:
+            prompt = self._listening_speaking_prompt(level)
+            purpose = PURPOSE_GENERATE_LISTENING_SPEAKING
+        else:
+            prompt = self._reading_writing_prompt(level)
+            purpose = PURPOSE_GENERATE_READING_WRITING
+
+        parser = IncrementalJSONSections(self.SECTION_PATHS[phase])
+        async for chunk in self.llm.agenerate_json_stream(
+            prompt, self.SYSTEM_INSTRUCTION, purpose=purpose
+        ):
+            for path, value in parser.feed(chunk):
+                yield "section", {"path": path_to_str(path), "data": value}
+
+        content = parser.document
+        if content is None:
+            content = self.llm.parse_response(parser.text, purpose)
+        yield "complete", self.with_answer_key(content)
@@ -0,0 +1,202 @@
+import os
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from app.database import SessionLocal
+from app.logging_config import session_id_var
+from app.metrics import LLM_TOKENS
+from app.models.llm_usage import LLMUsage
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# USD per million tokens, for the cost estimate (defaults: gemini-2.5-flash paid tier)
+PRICE_INPUT_PER_MILLION = float(os.getenv("LLM_PRICE_INPUT_PER_MILLION", "0.30"))
+PRICE_OUTPUT_PER_MILLION = float(os.getenv("LLM_PRICE_OUTPUT_PER_MILLION", "2.50"))
+
+
+# Sessions sharing the current call (batched scoring): its tokens are split between them
+_shared_sessions_var: ContextVar[Optional[Sequence[Optional[int]]]] = ContextVar(
+    "usage_shared_sessions", default=None
+)
+
+
+@contextmanager
+def attribute_usage_to(session_ids: Sequence[Optional[int]]):
+    """Split the usage of calls made inside the block evenly between these sessions"""
+    token = _shared_sessions_var.set(list(session_ids))
+    try:
+        yield
+    finally:
+        _shared_sessions_var.reset(token)
+
+
+def _split(amount: int, parts: int) -> List[int]:
+    """amount split into `parts` integers that add up to it"""
+    share, remainder = divmod(amount, parts)
+    return [share + (1 if i < remainder else 0) for i in range(parts)]
+
+
+def estimate_cost(prompt_tokens: int, output_tokens: int) -> float:
+    """Estimated cost in USD at the configured prices"""
+    return round(
+        (prompt_tokens * PRICE_INPUT_PER_MILLION + output_tokens * PRICE_OUTPUT_PER_MILLION)
+        / 1_000_000,
+        6,
+    )
+
+
+class UsageRecorder:
+    """Buffers per-call token usage and writes it to llm_usage in batches.
+
+    Recording only appends to a list, so it adds no database round trip to the
+    LLM call; a background thread flushes every USAGE_FLUSH_INTERVAL seconds
+    (or sooner once USAGE_FLUSH_SIZE rows are waiting).
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("USAGE_TRACKING_ENABLED", "true").lower() == "true"
+        self.flush_interval = float(os.getenv("USAGE_FLUSH_INTERVAL", "5"))
+        self.flush_size = int(os.getenv("USAGE_FLUSH_SIZE", "200"))
+
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        # Serializes flushes so rows are written once and in order
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(
+        self,
+        backend: str,
+        purpose: str,
+        prompt_tokens: int,
+        output_tokens: int,
+        model: Optional[str] = None,
+        key_index: Optional[int] = None,
+        latency_ms: Optional[int] = None,
+        session_id: Optional[int] = None,
+    ):
+        """Record one call; the session defaults to the one of the current request/job.
+
+        Inside attribute_usage_to, one row per sharing session is written instead.
+        """
+        purpose = purpose or "generic"
+        LLM_TOKENS.inc(prompt_tokens, backend=backend, purpose=purpose, type="prompt")
+        LLM_TOKENS.inc(output_tokens, backend=backend, purpose=purpose, type="output")
+        if not self.enabled:
+            return
+        sessions = _shared_sessions_var.get()
+        if session_id is not None or not sessions:
+            sessions = [session_id if session_id is not None else session_id_var.get()]
+        rows = [
+            {
+                "session_id": session,
+                "purpose": purpose,
+                "backend": backend,
+                "model": model,
+                "key_index": key_index,
+                "prompt_tokens": prompt_share,
+                "output_tokens": output_share,
+                "total_tokens": prompt_share + output_share,
+                "latency_ms": latency_ms,
+            }
+            for session, prompt_share, output_share in zip(
+                sessions,
+                _split(prompt_tokens, len(sessions)),
+                _split(output_tokens, len(sessions)),
+            )
+        ]
+        with self._lock:
+            self._buffer.extend(rows)
+            full = len(self._buffer) >= self.flush_size
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Write buffered rows now. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            db = SessionLocal()
+            try:
+                db.execute(insert(LLMUsage), rows)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error("LLM usage flush failed, %d row(s) dropped: %s", len(rows), e)
+                return 0
+            finally:
+                db.close()
+            return len(rows)
+
+    def session_summary(self, db: Session, session_id: int) -> Dict[str, Any]:
+        """Calls, tokens and estimated cost of a session, in total and per purpose"""
+        self.flush()
+        rows = (
+            db.query(
+                LLMUsage.purpose,
+                LLMUsage.prompt_tokens,
+                LLMUsage.output_tokens,
+                LLMUsage.latency_ms,
+            )
+            .filter(LLMUsage.session_id == session_id)
+            .all()
+        )
+
+        def totals():
+            return {"calls": 0, "prompt_tokens": 0, "output_tokens": 0, "total_tokens": 0, "latency_ms": 0}
+
+        overall = totals()
+        by_purpose: Dict[str, Dict[str, Any]] = {}
+        for purpose, prompt_tokens, output_tokens, latency_ms in rows:
+            for entry in (overall, by_purpose.setdefault(purpose, totals())):
+                entry["calls"] += 1
+                entry["prompt_tokens"] += prompt_tokens
+                entry["output_tokens"] += output_tokens
+                entry["total_tokens"] += prompt_tokens + output_tokens
+                entry["latency_ms"] += latency_ms or 0
+        for entry in [overall, *by_purpose.values()]:
+            entry["estimated_cost_usd"] = estimate_cost(entry["prompt_tokens"], entry["output_tokens"])
+        return {"session_id": session_id, **overall, "by_purpose": by_purpose}
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("LLM usage flush error: %s", e)
+
+    def start(self):
+        """Start the background flush worker (no-op if disabled or already running)"""
+        if not self.enabled:
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="llm-usage-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the worker and write what is still buffered"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+
+usage_recorder = UsageRecorder()
@@ -0,0 +1,369 @@
+"""Load test of the full session lifecycle against the API.
+
+Each virtual user runs complete sessions: create -> select-phase -> generate ->
+start-phase1 -> autosave -> submit-phase1 (wait for the job) -> generate-phase2
+-> start-phase2 -> submit-phase2 (wait) -> aggregate -> generate-analysis
+(poll until ready) -> get session.
+Reports p50/p95/p99 latency per endpoint, job completion times, requests per
+second, DB queries per endpoint and peak RSS, and writes them as JSON so runs
+can be compared between releases (--compare).
+
+By default the app runs in-process with the stub LLM backend and a throwaway
+SQLite database. With --url the load goes to a running server instead; start
+it with the stub backend, e.g.:
+    LLM_BACKEND=stub STUB_LLM_LATENCY=lognormal:200:0.3 uvicorn app.main:app
+(DB query counts and server RSS are only measured in-process.)
+
+Run from backend/:
+    python -m benchmarks.bench_lifecycle [--users 10] [--sessions 3] [--output run.json]
+    python -m benchmarks.bench_lifecycle --compare baseline.json
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+# Label of the request being served, for attributing DB queries (set from X-Bench-Label)
+current_label: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "bench_label", default="background"
+)
+LABEL_HEADER = "x-bench-label"
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 1),
+        "p95_ms": round(percentile(values, 95) * 1000, 1),
+        "p99_ms": round(percentile(values, 99) * 1000, 1),
+        "mean_ms": round(sum(values) / len(values) * 1000, 1) if values else 0.0,
+        "max_ms": round(max(values) * 1000, 1) if values else 0.0,
+    }
+
+
+class LabelMiddleware:
+    """Sets current_label from the benchmark header so DB queries can be attributed to endpoints"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            for name, value in scope["headers"]:
+                if name == LABEL_HEADER.encode():
+                    current_label.set(value.decode())
+                    break
+        await self.app(scope, receive, send)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.jobs: Dict[str, List[float]] = defaultdict(list)
+        self.queries: Dict[str, int] = defaultdict(int)
+        self.failed_sessions = 0
+
+    def count_query(self, *args):
+        self.queries[current_label.get()] += 1
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, poll_interval: float):
+        self.client = client
+        self.recorder = recorder
+        self.poll_interval = poll_interval
+
+    async def request(self, method: str, label: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        response = await self.client.request(
+            method, url, headers={LABEL_HEADER: label}, **kwargs
+        )
+        self.recorder.latencies[label].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.recorder.errors[label] += 1
+            response.raise_for_status()
+        return response
+
+    async def wait_for_job(self, name: str, job: Dict[str, Any]):
+        start = time.perf_counter()
+        while job["status"] not in ("succeeded", "failed"):
+            await asyncio.sleep(self.poll_interval)
+            response = await self.request("GET", "GET /jobs/{id}", f"/api/jobs/{job['id']}")
+            job = response.json()
+        self.recorder.jobs[name].append(time.perf_counter() - start)
+        if job["status"] == "failed":
+            raise RuntimeError(f"job {name} failed: {job.get('error')}")
+
+    async def wait_for_analysis(self, sid: int):
+        """Poll the readiness check; the time is reported as the "analysis" job"""
+        start = time.perf_counter()
+        while True:
+            response = await self.request(
+                "GET", "GET /generate-analysis", f"/api/sessions/{sid}/generate-analysis"
+            )
+            status = response.json()["status"]
+            if status != "pending":
+                break
+            await asyncio.sleep(self.poll_interval)
+        self.recorder.jobs["analysis"].append(time.perf_counter() - start)
+        if status == "failed":
+            raise RuntimeError("analysis job failed")
+
+    @staticmethod
+    def answers_for(content: Dict[str, Any]) -> Dict[str, str]:
+        answers = {}
+        for section in content.get("listening", {}).get("sections", []):
+            for q in section.get("questions", []):
+                answers[f"listening_s{section['id']}_q{q['id']}"] = q.get("correct_answer", "")
+        for passage in content.get("reading", {}).get("passages", []):
+            for q in passage.get("questions", []):
+                answers[f"reading_p{passage['id']}_q{q['id']}"] = q.get("correct_answer", "")
+        if "speaking" in content:
+            answers["speaking_part1_1"] = "I live in a small city near the river."
+            answers["speaking_part2"] = "I would like to describe a museum I visited last year."
+        if "writing" in content:
+            answers["writing_task1"] = "The chart shows how the figures changed over time."
+            answers["writing_task2"] = "Some people believe that cities should invest in parks."
+        return answers
+
+    async def run_phase(self, sid: int, phase: int, content: Dict[str, Any]):
+        await self.request("POST", f"POST /start-phase{phase}", f"/api/sessions/{sid}/start-phase{phase}")
+        answers = self.answers_for(content)
+        # Autosave in two deltas, then submit the rest
+        keys = list(answers)
+        for chunk in (keys[: len(keys) // 3], keys[len(keys) // 3 : 2 * len(keys) // 3]):
+            await self.request(
+                "PATCH",
+                "PATCH /answers",
+                f"/api/sessions/{sid}/answers",
+                json={"phase": phase, "answers": {k: answers[k] for k in chunk}},
+            )
+        rest = {k: answers[k] for k in keys[2 * len(keys) // 3 :]}
+        job = await self.request(
+            "POST", f"POST /submit-phase{phase}", f"/api/sessions/{sid}/submit-phase{phase}",
+            json={"answers": rest},
+        )
+        await self.wait_for_job(f"score_phase{phase}", job.json())
+
+    async def run_session(self, phase: str):
+        session = await self.request("POST", "POST /sessions", "/api/sessions", json={"level": "intermediate"})
+        sid = session.json()["id"]
+        await self.request("POST", "POST /select-phase", f"/api/sessions/{sid}/select-phase", json={"phase": phase})
+
+        content = (await self.request("POST", "POST /generate", f"/api/sessions/{sid}/generate")).json()["phase1_content"]
+        await self.run_phase(sid, 1, content)
+
+        content = (await self.request("POST", "POST /generate-phase2", f"/api/sessions/{sid}/generate-phase2")).json()["phase2_content"]
+        await self.run_phase(sid, 2, content)
+
+        await self.request("POST", "POST /aggregate", f"/api/sessions/{sid}/aggregate")
+        await self.wait_for_analysis(sid)
+        await self.request("GET", "GET /sessions/{id}", f"/api/sessions/{sid}")
+
+    async def run(self, sessions: int, user_index: int):
+        for i in range(sessions):
+            phase = "listening_speaking" if (user_index + i) % 2 == 0 else "reading_writing"
+            try:
+                await self.run_session(phase)
+            except Exception as e:
+                self.recorder.failed_sessions += 1
+                print(f"session failed: {e}", file=sys.stderr)
+
+
+async def run_load(client: httpx.AsyncClient, recorder: Recorder, args) -> float:
+    users = [VirtualUser(client, recorder, args.poll_interval) for _ in range(args.users)]
+    start = time.perf_counter()
+    await asyncio.gather(*(user.run(args.sessions, i) for i, user in enumerate(users)))
+    return time.perf_counter() - start
+
+
+def configure_in_process_env(database_url: Optional[str]):
+    """Stub LLM and a throwaway database unless the caller set them; must run before importing app"""
+    if database_url is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+        database_url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("LLM_BACKEND", "stub")
+    os.environ.setdefault("STUB_LLM_LATENCY", "lognormal:200:0.3")
+    os.environ.setdefault("CONTENT_POOL_ENABLED", "false")
+    os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+    # Per-request log lines would drown the report (and cost what is measured)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+async def run_in_process(recorder: Recorder, args) -> float:
+    configure_in_process_env(args.database_url)
+    from sqlalchemy import event
+    from app.database import engine
+    from app.main import app
+
+    event.listen(engine, "before_cursor_execute", recorder.count_query)
+    transport = httpx.ASGITransport(app=LabelMiddleware(app))
+    await app.router.startup()
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=args.timeout
+        ) as client:
+            return await run_load(client, recorder, args)
+    finally:
+        await app.router.shutdown()
+
+
+async def run_remote(recorder: Recorder, args) -> float:
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        return await run_load(client, recorder, args)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def build_report(recorder: Recorder, elapsed: float, args) -> Dict[str, Any]:
+    requests = sum(len(v) for v in recorder.latencies.values())
+    sessions = args.users * args.sessions - recorder.failed_sessions
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "mode": "remote" if args.url else "in-process",
+            "llm_backend": os.getenv("LLM_BACKEND"),
+            "stub_latency": os.getenv("STUB_LLM_LATENCY"),
+            "users": args.users,
+            "sessions_per_user": args.sessions,
+        },
+        "throughput": {
+            "seconds": round(elapsed, 2),
+            "requests": requests,
+            "requests_per_second": round(requests / elapsed, 2) if elapsed else 0.0,
+            "sessions_completed": sessions,
+            "sessions_failed": recorder.failed_sessions,
+            "sessions_per_minute": round(sessions / elapsed * 60, 2) if elapsed else 0.0,
+        },
+        "endpoints": {
+            label: {**summarize(values), "errors": recorder.errors.get(label, 0)}
+            for label, values in sorted(recorder.latencies.items())
+        },
+        "jobs": {name: summarize(values) for name, values in sorted(recorder.jobs.items())},
+    }
+    if not args.url:
+        report["db_queries"] = {
+            "total": sum(recorder.queries.values()),
+            "per_session": round(sum(recorder.queries.values()) / sessions, 1) if sessions else 0.0,
+            "per_request": {
+                label: round(count / len(recorder.latencies[label]), 2)
+                for label, count in sorted(recorder.queries.items())
+                if recorder.latencies.get(label)
+            },
+            "background": recorder.queries.get("background", 0),
+        }
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        report["peak_rss_mb"] = round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1
+        )
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    throughput = report["throughput"]
+    print(
+        f"\n{throughput['sessions_completed']} sessions ({throughput['sessions_failed']} failed) "
+        f"in {throughput['seconds']}s: {throughput['requests_per_second']} req/s, "
+        f"{throughput['sessions_per_minute']} sessions/min"
+    )
+    queries = report.get("db_queries", {}).get("per_request", {})
+    print(f"\n{'endpoint':<24}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}{'queries':>9}")
+    for label, row in report["endpoints"].items():
+        print(
+            f"{label:<24}{row['count']:>7}{row['p50_ms']:>9}{row['p95_ms']:>9}"
+            f"{row['p99_ms']:>9}{row['errors']:>8}{queries.get(label, ''):>9}"
+        )
+    print(f"\n{'job':<24}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, row in report["jobs"].items():
+        print(f"{name:<24}{row['count']:>7}{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}")
+    if "db_queries" in report:
+        db = report["db_queries"]
+        print(f"\nDB queries: {db['total']} total, {db['per_session']} per session, {db['background']} in jobs")
+        print(f"Peak RSS: {report['peak_rss_mb']} MB")
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> bool:
+    """Print p95 changes against a baseline; True if any endpoint regressed by more than threshold"""
+    regressed = False
+    print(f"\n{'endpoint':<24}{'base p95':>10}{'p95':>10}{'change':>9}")
+    for label, row in report["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(label)
+        if not base or not base["p95_ms"]:
+            continue
+        change = (row["p95_ms"] - base["p95_ms"]) / base["p95_ms"]
+        flag = "  REGRESSION" if change > threshold else ""
+        regressed |= bool(flag)
+        print(f"{label:<24}{base['p95_ms']:>10}{row['p95_ms']:>10}{change:>+9.0%}{flag}")
+    base_rps = baseline.get("throughput", {}).get("requests_per_second")
+    if base_rps:
+        print(f"\nreq/s: {base_rps} -> {report['throughput']['requests_per_second']}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+    parser.add_argument("--sessions", type=int, default=3, help="sessions per user")
+    parser.add_argument("--url", help="load a running server instead of the in-process app")
+    parser.add_argument("--database-url", help="in-process only (default: throwaway SQLite)")
+    parser.add_argument("--poll-interval", type=float, default=0.2, help="job polling (seconds)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per request (seconds)")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", help="baseline JSON report to compare p95 latencies with")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="p95 increase counted as a regression"
+    )
+    args = parser.parse_args()
+
+    recorder = Recorder()
+    runner = run_remote if args.url else run_in_process
+    elapsed = asyncio.run(runner(recorder, args))
+    report = build_report(recorder, elapsed, args)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(report, json.load(f), args.threshold):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
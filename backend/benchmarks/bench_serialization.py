@@ -0,0 +1,173 @@
+"""Bytes-on-wire and CPU per response for session payloads.
+
+Compares FastAPI's default rendering (jsonable_encoder + json.dumps) with the
+fast path in app.serialization, and the size/cost of gzip and brotli on the
+result. Uses a synthetic session shaped like a generated Listening & Speaking
+test (four transcripts) plus a Reading & Writing test and scores.
+
+Run from backend/:
+    python -m benchmarks.bench_serialization [--iterations 300] [--json]
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+
+from app.models.test_session import TestSession, Level, Phase, SessionStatus
+from app.schemas.test_session import SessionResponse
+from app.serialization import dumps, model_response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Common English words, so compression ratios resemble real transcripts
+VOCABULARY = (
+    "the of and to in is that it was for on are as with his they at be this have "
+    "from or one had by word but not what all were we when your can said there use "
+    "an each which she do how their if will up other about out many then them these "
+    "so some her would make like him into time has look two more write go see number "
+    "no way could people my than first water been call who oil its now find long down "
+    "day did get come made may part student library museum river weather holiday "
+    "university research environment government transport city village travel"
+).split()
+
+
+def _words(rnd: random.Random, count: int) -> str:
+    return " ".join(rnd.choice(VOCABULARY) for _ in range(count))
+
+
+def build_session() -> TestSession:
+    rnd = random.Random(42)
+    questions = lambda n: [
+        {
+            "id": i + 1,
+            "type": "multiple_choice",
+            "question": _words(rnd, 15),
+            "options": [f"{c}. {_words(rnd, 4)}" for c in "ABCD"],
+            "correct_answer": "A",
+        }
+        for i in range(n)
+    ]
+    listening_speaking = {
+        "listening": {
+            "sections": [
+                {"id": i + 1, "transcript": _words(rnd, 600), "questions": questions(10)}
+                for i in range(4)
+            ]
+        },
+        "speaking": {
+            "part1": [{"id": i + 1, "question": _words(rnd, 12)} for i in range(4)],
+            "part2": {"task_card": _words(rnd, 60)},
+            "part3": [{"id": i + 1, "question": _words(rnd, 15)} for i in range(4)],
+        },
+    }
+    reading_writing = {
+        "reading": {
+            "passages": [
+                {"id": i + 1, "text": _words(rnd, 700), "questions": questions(13)}
+                for i in range(3)
+            ]
+        },
+        "writing": {
+            "task1": {"instructions": _words(rnd, 40)},
+            "task2": {"question": _words(rnd, 30)},
+        },
+    }
+    scores = {"overall_band": 6.5, "feedback": _words(rnd, 80)}
+    return TestSession(
+        id=1,
+        level=Level.INTERMEDIATE,
+        selected_phase=Phase.LISTENING_SPEAKING,
+        status=SessionStatus.COMPLETED,
+        phase1_content=listening_speaking,
+        phase2_content=reading_writing,
+        phase1_scores={"listening": scores, "speaking": scores},
+        phase2_scores={"reading": scores, "writing": scores},
+        final_results={"overall": {"band": 6.5}, "detailed_analysis": {"notes": _words(rnd, 300)}},
+        created_at=datetime.now(),
+        updated_at=datetime.now(),
+    )
+
+
+def default_render(session: TestSession) -> bytes:
+    """What FastAPI does for `response_model=SessionResponse` with JSONResponse"""
+    model = SessionResponse.model_validate(session)
+    return json.dumps(
+        jsonable_encoder(model),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def fast_render(session: TestSession) -> bytes:
+    return model_response(SessionResponse, session).body
+
+
+def timed(fn, iterations: int):
+    """Mean microseconds per call and the last result"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        result = fn()
+    return (time.perf_counter() - start) / iterations * 1e6, result
+
+
+def run(iterations: int) -> dict:
+    session = build_session()
+    content = session.phase1_content
+    report = {"iterations": iterations, "serialization": {}, "compression": {}}
+
+    for name, fn in (
+        ("session_default", lambda: default_render(session)),
+        ("session_fast", lambda: fast_render(session)),
+        ("content_default", lambda: json.dumps(jsonable_encoder(content)).encode()),
+        ("content_fast", lambda: dumps(content)),
+    ):
+        micros, body = timed(fn, iterations)
+        report["serialization"][name] = {"us_per_response": round(micros, 1), "bytes": len(body)}
+
+    body = fast_render(session)
+    codecs = [("identity", lambda: body), ("gzip-6", lambda: gzip.compress(body, 6))]
+    if brotli is not None:
+        codecs.append(("br-5", lambda: brotli.compress(body, quality=5)))
+    for name, fn in codecs:
+        micros, encoded = timed(fn, iterations)
+        report["compression"][name] = {
+            "us_per_response": round(micros, 1),
+            "bytes": len(encoded),
+            "ratio": round(len(encoded) / len(body), 3),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = run(args.iterations)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'serialization':<20}{'us/response':>14}{'bytes':>10}")
+    for name, row in report["serialization"].items():
+        print(f"{name:<20}{row['us_per_response']:>14}{row['bytes']:>10}")
+    print(f"\n{'compression':<20}{'us/response':>14}{'bytes':>10}{'ratio':>8}")
+    for name, row in report["compression"].items():
+        print(f"{name:<20}{row['us_per_response']:>14}{row['bytes']:>10}{row['ratio']:>8}")
+    if brotli is None:
+        print("\n(brotli not installed: br row skipped)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Tests run against a throwaway SQLite database and the offline stub LLM backend"""
+import os
+import tempfile
+
+# Before any app module is imported: they read their settings at import time
+_db_dir = tempfile.mkdtemp(prefix="ielts-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ["LLM_BACKEND"] = "stub"
+os.environ["STUB_LLM_LATENCY"] = "fixed:0"
+os.environ["CONTENT_POOL_ENABLED"] = "false"
+os.environ["LOG_LEVEL"] = "WARNING"
+
+import pytest
+
+from app.database import Base, SessionLocal, engine
+from app.models.test_session import Level, TestSession
+
+Base.metadata.create_all(bind=engine)
+
+
+@pytest.fixture(autouse=True)
+def clean_tables():
+    """Every test starts with empty tables"""
+    yield
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_session(db):
+    """Create test sessions (rows other tables point to)"""
+
+    def make() -> int:
+        session = TestSession(level=Level.INTERMEDIATE)
+        db.add(session)
+        db.commit()
+        return session.id
+
+    return make
@@ -0,0 +1,96 @@
+import pytest
+
+from app.services.answer_key import (
+    ANSWER_KEY_VERSION,
+    AnswerKey,
+    compile_answer_key,
+    compile_question,
+    normalize_answer,
+    normalize_choice,
+)
+
+
+@pytest.mark.parametrize(
+    "answer, expected",
+    [
+        ("  Hello,   World! ", "hello world"),
+        ("ＡＢＣ", "abc"),
+        ("The Library", "library"),
+        # An answer that is only an article keeps it
+        ("A", "a"),
+        ("the", "the"),
+        ("Twenty-one", "21"),
+        ("one hundred and five", "105"),
+        ("1,000", "1000"),
+        ("50%", "50 percent"),
+        ("U.S.A.", "usa"),
+        ("3pm", "3 pm"),
+        ("3 pm", "3 pm"),
+        ("3 p.m.", "3 pm"),
+        ("3 P.M", "3 pm"),
+        ("a4", "a 4"),
+        (12, "12"),
+    ],
+)
+def test_normalize_answer(answer, expected):
+    assert normalize_answer(answer) == expected
+
+
+@pytest.mark.parametrize("answer", ["B", "b", "b)", "B. the dog", " b: dog "])
+def test_normalize_choice_letter(answer):
+    assert normalize_choice(answer) == "b"
+
+
+def test_multiple_choice_accepts_letter_and_option_text():
+    options = ["A. cat", "B. the dog", "C) fish"]
+    by_letter = compile_question(
+        {"type": "multiple_choice", "correct_answer": "B", "options": options}
+    )
+    by_text = compile_question(
+        {"type": "multiple_choice", "correct_answer": "the dog", "options": options}
+    )
+    assert by_letter == by_text == {"mode": "choice", "accepted": ["b", "dog"], "fuzzy": False}
+
+
+def test_text_alternatives_and_optional_words():
+    entry = compile_question({"type": "fill_blank", "correct_answer": "colour/color (paint)"})
+    assert entry == {
+        "mode": "text",
+        "accepted": ["color", "color paint", "colour"],
+        "fuzzy": True,
+    }
+
+
+def test_true_false_short_forms():
+    entry = compile_question({"type": "true_false_not_given", "correct_answer": "NOT GIVEN"})
+    assert entry["accepted"] == ["ng", "not given"]
+
+
+def _content(question):
+    return {"reading": {"passages": [{"id": 1, "questions": [{"id": 1, **question}]}]}}
+
+
+def test_answer_key_scoring():
+    key = AnswerKey.for_content(
+        _content({"type": "fill_blank", "correct_answer": "3 p.m.", "accepted_answers": ["15:00"]})
+    )
+    assert key.is_correct("reading_p1_q1", "3pm")
+    assert key.is_correct("reading_p1_q1", "15:00")
+    assert not key.is_correct("reading_p1_q1", "4pm")
+    assert not key.is_correct("reading_p1_q1", "")
+    assert not key.is_correct("reading_p1_q1", None)
+    assert not key.is_correct("reading_p1_q2", "3pm")
+
+
+def test_outdated_stored_key_is_recompiled():
+    content = _content({"type": "fill_blank", "correct_answer": "library"})
+    content["answer_key"] = {
+        "version": ANSWER_KEY_VERSION - 1,
+        "questions": {"reading_p1_q1": {"mode": "text", "accepted": ["stale"], "fuzzy": False}},
+    }
+    key = AnswerKey.for_content(content)
+    assert key.is_correct("reading_p1_q1", "The library")
+    assert not key.is_correct("reading_p1_q1", "stale")
+
+    content["answer_key"] = compile_answer_key(content)
+    assert AnswerKey.for_content(content).questions == content["answer_key"]["questions"]
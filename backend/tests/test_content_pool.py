@@ -0,0 +1,53 @@
+import threading
+
+from app.models.content_pool import ContentPoolItem
+from app.models.test_session import Level, Phase
+from app.services.content_pool import ContentPoolService
+from app.services.single_flight import acquire_lease
+from app.services.test_generator import TestGeneratorService
+
+
+def _pool(generator):
+    pool = ContentPoolService(generator)
+    pool.enabled = True
+    pool.low_water = 1
+    return pool
+
+
+def test_processes_refill_each_bucket_once(db):
+    """Pools of several processes sharing the table top it up to the mark, not beyond"""
+    generator = TestGeneratorService()
+    pools = [_pool(generator) for _ in range(3)]
+    added = [0] * len(pools)
+
+    def refill(i):
+        added[i] = pools[i].refill_once()
+
+    threads = [threading.Thread(target=refill, args=(i,)) for i in range(len(pools))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    buckets = len(Level) * len(Phase)
+    assert sum(added) == buckets
+    assert set(pools[0].available_counts(db).values()) == {1}
+
+
+def test_bucket_leased_by_another_process_is_skipped(db):
+    acquire_lease("content-pool:beginner:listening_speaking", 60)
+    pool = _pool(TestGeneratorService())
+
+    assert pool.refill_once() == len(Level) * len(Phase) - 1
+    counts = pool.available_counts(db)
+    assert counts["beginner/listening_speaking"] == 0
+    assert counts["beginner/reading_writing"] == 1
+
+
+def test_claim_takes_pooled_item_once(db):
+    pool = _pool(TestGeneratorService())
+    pool.add(Level.BEGINNER, Phase.READING_WRITING, {"reading": {}})
+
+    assert pool.claim(db, Level.BEGINNER, Phase.READING_WRITING) == {"reading": {}}
+    assert pool.claim(db, Level.BEGINNER, Phase.READING_WRITING) is None
+    assert db.query(ContentPoolItem).count() == 0
@@ -0,0 +1,86 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app.middleware.idempotency import IdempotencyMiddleware
+
+
+@pytest.fixture
+def app_calls():
+    """App counting how often its endpoints really run"""
+    app = FastAPI()
+    app.add_middleware(IdempotencyMiddleware)
+    calls = []
+
+    @app.post("/items")
+    async def create_item(request: Request):
+        body = await request.json()
+        calls.append(body)
+        return {"id": len(calls), **body}
+
+    @app.post("/broken")
+    async def broken():
+        calls.append(None)
+        return JSONResponse({"detail": "boom"}, status_code=500)
+
+    return app, calls
+
+
+def test_retry_replays_stored_response(app_calls):
+    app, calls = app_calls
+    client = TestClient(app)
+    headers = {"Idempotency-Key": "k1"}
+
+    first = client.post("/items", json={"name": "a"}, headers=headers)
+    second = client.post("/items", json={"name": "a"}, headers=headers)
+
+    assert len(calls) == 1
+    assert second.status_code == first.status_code == 200
+    assert second.json() == first.json() == {"id": 1, "name": "a"}
+    assert "idempotent-replayed" not in first.headers
+    assert second.headers["idempotent-replayed"] == "true"
+
+
+def test_same_key_with_other_body_is_rejected(app_calls):
+    app, calls = app_calls
+    client = TestClient(app)
+    headers = {"Idempotency-Key": "k1"}
+
+    client.post("/items", json={"name": "a"}, headers=headers)
+    response = client.post("/items", json={"name": "b"}, headers=headers)
+
+    assert response.status_code == 422
+    assert len(calls) == 1
+
+
+def test_keys_are_scoped_and_optional(app_calls):
+    app, calls = app_calls
+    client = TestClient(app)
+
+    client.post("/items", json={"name": "a"}, headers={"Idempotency-Key": "k1"})
+    client.post("/items", json={"name": "a"}, headers={"Idempotency-Key": "k2"})
+    client.post("/items", json={"name": "a"})
+    client.post("/items", json={"name": "a"})
+
+    assert len(calls) == 4
+
+
+def test_server_errors_are_not_stored(app_calls):
+    app, calls = app_calls
+    client = TestClient(app)
+    headers = {"Idempotency-Key": "k1"}
+
+    assert client.post("/broken", headers=headers).status_code == 500
+    response = client.post("/broken", headers=headers)
+
+    assert response.status_code == 500
+    assert "idempotent-replayed" not in response.headers
+    assert len(calls) == 2
+
+
+def test_overlong_key_is_rejected(app_calls):
+    app, calls = app_calls
+    response = TestClient(app).post("/items", json={}, headers={"Idempotency-Key": "k" * 256})
+    assert response.status_code == 400
+    assert calls == []
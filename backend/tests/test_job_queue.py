@@ -0,0 +1,145 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.models.job import Job, JobKind, JobStatus
+from app.services.job_queue import JobQueue
+
+
+def _queue(max_attempts=3):
+    queue = JobQueue()
+    queue.concurrency = 1
+    queue.poll_interval = 0.01
+    queue.requeue_interval = 0.05
+    queue.max_attempts = max_attempts
+    return queue
+
+
+def _job(db, job_id):
+    db.expire_all()
+    return db.get(Job, job_id)
+
+
+async def _run_until(queue, db, job_id, statuses=(JobStatus.SUCCEEDED, JobStatus.FAILED)):
+    await queue.start()
+    try:
+        for _ in range(200):
+            job = _job(db, job_id)
+            if job.status in statuses:
+                return job
+            await asyncio.sleep(0.01)
+        raise AssertionError(f"job {job_id} still {job.status}")
+    finally:
+        await queue.stop()
+
+
+def test_enqueue_reuses_live_job(db, make_session):
+    queue = _queue()
+    session_id = make_session()
+    first = queue.enqueue(db, session_id, JobKind.ANALYSIS)
+    assert first.status == JobStatus.QUEUED
+    assert queue.enqueue(db, session_id, JobKind.ANALYSIS).id == first.id
+    assert queue.enqueue(db, session_id, JobKind.SCORE_PHASE1).id != first.id
+
+    # A failed job is replaced by a new one
+    db.query(Job).filter(Job.id == first.id).update({Job.status: JobStatus.FAILED})
+    db.commit()
+    assert queue.enqueue(db, session_id, JobKind.ANALYSIS).id != first.id
+
+
+def test_claim_marks_job_running(db, make_session):
+    queue = _queue()
+    job = queue.enqueue(db, make_session(), JobKind.ANALYSIS)
+    claimed = queue._claim_next()
+    assert claimed.id == job.id
+    assert claimed.status == JobStatus.RUNNING
+    assert claimed.attempts == 1
+    assert queue._claim_next() is None
+
+
+def test_job_runs_handler(db, make_session):
+    queue = _queue()
+    seen = []
+
+    @queue.handler(JobKind.ANALYSIS)
+    async def run(session_id):
+        seen.append((session_id, queue.is_last_attempt()))
+
+    session_id = make_session()
+    job = queue.enqueue(db, session_id, JobKind.ANALYSIS)
+    job = asyncio.run(_run_until(queue, db, job.id))
+    assert job.status == JobStatus.SUCCEEDED
+    assert job.finished_at is not None
+    assert seen == [(session_id, False)]
+    assert not queue.is_last_attempt()
+
+
+def test_failed_job_is_retried_then_fails(db, make_session):
+    queue = _queue(max_attempts=3)
+    last_attempt = []
+
+    @queue.handler(JobKind.ANALYSIS)
+    async def run(session_id):
+        last_attempt.append(queue.is_last_attempt())
+        raise RuntimeError("LLM unavailable")
+
+    job = queue.enqueue(db, make_session(), JobKind.ANALYSIS)
+    job = asyncio.run(_run_until(queue, db, job.id))
+    assert job.status == JobStatus.FAILED
+    assert job.attempts == 3
+    assert job.error == "LLM unavailable"
+    assert last_attempt == [False, False, True]
+
+
+def test_retry_succeeds(db, make_session):
+    queue = _queue()
+    calls = []
+
+    @queue.handler(JobKind.ANALYSIS)
+    async def run(session_id):
+        calls.append(session_id)
+        if len(calls) == 1:
+            raise RuntimeError("temporary")
+
+    job = queue.enqueue(db, make_session(), JobKind.ANALYSIS)
+    job = asyncio.run(_run_until(queue, db, job.id))
+    assert job.status == JobStatus.SUCCEEDED
+    assert job.attempts == 2
+    assert job.error is None
+
+
+def test_worker_survives_finish_error(db, make_session):
+    queue = _queue()
+    queue.stale_after = 0.05
+    calls = []
+
+    @queue.handler(JobKind.ANALYSIS)
+    async def run(session_id):
+        calls.append(session_id)
+
+    finish = queue._finish
+
+    def finish_once_failing(job, error):
+        if len(calls) == 1:
+            raise RuntimeError("database unavailable")
+        finish(job, error)
+
+    queue._finish = finish_once_failing
+    job = queue.enqueue(db, make_session(), JobKind.ANALYSIS)
+    job = asyncio.run(_run_until(queue, db, job.id))
+    # Left running, then requeued as stale and run again by the same worker
+    assert job.status == JobStatus.SUCCEEDED
+    assert len(calls) == 2
+
+
+def test_stale_running_job_is_requeued(db, make_session):
+    queue = _queue()
+    job = queue.enqueue(db, make_session(), JobKind.ANALYSIS)
+    db.query(Job).filter(Job.id == job.id).update(
+        {
+            Job.status: JobStatus.RUNNING,
+            Job.started_at: datetime.now() - timedelta(seconds=queue.stale_after + 1),
+        }
+    )
+    db.commit()
+    queue._requeue_stale()
+    assert _job(db, job.id).status == JobStatus.QUEUED
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from app.services.json_stream import IncrementalJSONSections, iter_sections, path_to_str
+
+PATTERNS = [("reading", "passages", "*"), ("writing", "task1"), ("writing", "task2")]
+
+DOCUMENT = {
+    "reading": {
+        "title": "Reading",
+        "passages": [
+            {"id": 1, "text": 'He said "stop" {not a brace} [nor a bracket]', "questions": []},
+            {"id": 2, "text": "back\\slash, comma, and \\\" escaped quote", "questions": [{"id": 1}]},
+        ],
+    },
+    "writing": {
+        "task1": {"instructions": "Describe the chart }]"},
+        "task2": {"question": "Discuss été – both views"},
+    },
+}
+
+
+def _feed(text, size):
+    parser = IncrementalJSONSections(PATTERNS)
+    sections = []
+    for start in range(0, len(text), size):
+        sections.extend(parser.feed(text[start : start + size]))
+    return parser, sections
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, 100000])
+def test_sections_in_chunks(size):
+    text = json.dumps(DOCUMENT, ensure_ascii=False, indent=2)
+    parser, sections = _feed(text, size)
+
+    assert [(path_to_str(p), v) for p, v in sections] == [
+        (path_to_str(p), v) for p, v in iter_sections(DOCUMENT, PATTERNS)
+    ]
+    assert [path_to_str(p) for p, _ in sections] == [
+        "reading.passages.0",
+        "reading.passages.1",
+        "writing.task1",
+        "writing.task2",
+    ]
+    assert parser.document == DOCUMENT
+
+
+def test_section_is_returned_when_it_closes():
+    parser = IncrementalJSONSections(PATTERNS)
+    assert parser.feed('{"reading": {"passages": [{"id": 1, "text": "a}') == []
+    assert parser.feed('"}') == [(("reading", "passages", 0), {"id": 1, "text": "a}"})]
+    assert parser.document is None
+
+
+def test_leading_text_is_ignored():
+    text = "```json\n" + json.dumps(DOCUMENT) + "\n```"
+    parser, sections = _feed(text, 5)
+    assert len(sections) == 4
+    assert parser.document == DOCUMENT
+    assert parser.text == text
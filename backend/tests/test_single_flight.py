@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+import pytest
+
+from app.deadline import current_deadline, deadline, time_left
+from app.services.single_flight import SingleFlight, acquire_lease, release_lease
+
+
+def test_lease_is_exclusive_until_released():
+    token = acquire_lease("lease", 60)
+    assert token is not None
+    assert acquire_lease("lease", 60) is None
+
+    release_lease("lease", token)
+    assert acquire_lease("lease", 60) is not None
+
+
+def test_expired_lease_is_taken_over():
+    stale = acquire_lease("lease", 0.05)
+    time.sleep(0.1)
+    token = acquire_lease("lease", 60)
+    assert token is not None and token != stale
+
+    # The previous holder can no longer release it
+    release_lease("lease", stale)
+    assert acquire_lease("lease", 60) is None
+
+
+def _flight():
+    flight = SingleFlight()
+    flight.poll_interval = 0.01
+    return flight
+
+
+def test_concurrent_callers_share_one_run():
+    flight = _flight()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return "content"
+
+    async def done():
+        return None
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", work, done) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["content"] * 5
+    assert runs == [1]
+
+
+def test_waits_for_result_of_other_holder():
+    """A lease held by another process: its stored result is returned, work never runs"""
+    flight = _flight()
+    acquire_lease("key", 60)
+    stored = []
+
+    async def work():
+        raise AssertionError("must not run while the lease is held")
+
+    async def done():
+        return stored[0] if stored else None
+
+    async def main():
+        task = asyncio.create_task(flight.do("key", work, done))
+        await asyncio.sleep(0.05)
+        stored.append("content")
+        return await task
+
+    assert asyncio.run(main()) == "content"
+
+
+def test_runs_work_once_other_holder_lease_expires():
+    flight = _flight()
+    acquire_lease("key", 0.1)
+
+    async def work():
+        return "content"
+
+    async def done():
+        return None
+
+    assert asyncio.run(flight.do("key", work, done)) == "content"
+    # Released after the run
+    assert acquire_lease("key", 60) is not None
+
+
+def test_caller_deadline_does_not_cancel_shared_run():
+    flight = _flight()
+
+    async def work():
+        await asyncio.sleep(0.1)
+        return "content"
+
+    async def done():
+        return None
+
+    async def impatient():
+        with deadline(0.02):
+            return await flight.do("key", work, done, timeout=5)
+
+    async def main():
+        return await asyncio.gather(
+            impatient(), flight.do("key", work, done), return_exceptions=True
+        )
+
+    short, patient = asyncio.run(main())
+    assert isinstance(short, TimeoutError)
+    assert patient == "content"
+
+
+def test_run_has_its_own_deadline():
+    flight = _flight()
+
+    async def work():
+        await asyncio.sleep(1)
+
+    async def done():
+        return None
+
+    async def main():
+        async def slow():
+            # Bounded like an LLM call: by the deadline of the shared run
+            await asyncio.wait_for(work(), time_left(current_deadline()))
+
+        return await flight.do("key", slow, done, timeout=0.05)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(main())
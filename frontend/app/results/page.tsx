@@ -11,6 +11,7 @@ export default function ResultsPage() {
 
   const [session, setSession] = useState<any>(null)
   const [loading, setLoading] = useState(true)
+  const [analysisFailed, setAnalysisFailed] = useState(false)
 
   useEffect(() => {
     if (!sessionId) {
@@ -23,7 +24,7 @@ export default function ResultsPage() {
   const loadSession = async () => {
     if (!sessionId) return
     try {
-      const sessionData = await apiClient.getSession(parseInt(sessionId))
+      const sessionData = await apiClient.getSessionSummary(parseInt(sessionId))
       setSession(sessionData)
       setLoading(false)
     } catch (error) {
@@ -32,6 +33,43 @@ export default function ResultsPage() {
     }
   }
 
+  // The detailed analysis is generated in the background: check until it is ready
+  const analysisPending = !!session?.final_results && !session.final_results.detailed_analysis
+  useEffect(() => {
+    if (!sessionId || !analysisPending) return
+    let cancelled = false
+    let timer: ReturnType<typeof setTimeout>
+    const check = async () => {
+      try {
+        let analysis = await apiClient.getAnalysisStatus(parseInt(sessionId))
+        // Sessions aggregated before analysis jobs existed have none queued
+        if (analysis.status === 'pending' && analysis.job_id === null) {
+          analysis = await apiClient.requestAnalysis(parseInt(sessionId))
+        }
+        if (cancelled) return
+        if (analysis.status === 'ready') {
+          setSession((current: any) => ({
+            ...current,
+            final_results: { ...current.final_results, detailed_analysis: analysis.detailed_analysis },
+          }))
+          return
+        }
+        if (analysis.status === 'failed') {
+          setAnalysisFailed(true)
+          return
+        }
+      } catch (error) {
+        console.error('Error checking analysis:', error)
+      }
+      if (!cancelled) timer = setTimeout(check, 2000)
+    }
+    check()
+    return () => {
+      cancelled = true
+      clearTimeout(timer)
+    }
+  }, [sessionId, analysisPending])
+
   if (loading) {
     return (
       <div className="text-center py-12">
@@ -100,6 +138,12 @@ export default function ResultsPage() {
         <BandCard title="Speaking" band={results.speaking || 0} />
       </div>
 
+      {analysisPending && (
+        <div className="bg-white rounded-lg shadow-md p-6 mb-8 text-center text-gray-600">
+          {analysisFailed ? 'Không tạo được phân tích chi tiết.' : 'Đang tạo phân tích chi tiết...'}
+        </div>
+      )}
+
       {/* Detailed Analysis Section */}
       {session.final_results?.detailed_analysis && (
         <div className="mt-8 space-y-6">
@@ -1,6 +1,6 @@
 'use client'
 
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { useRouter, useSearchParams } from 'next/navigation'
 import { apiClient } from '@/lib/api'
 import SpeechRecorder from '@/components/SpeechRecorder'
@@ -20,7 +20,7 @@ function getAudioRate(level: string): number {
 }
 
 // Component for Listening Section with audio playback
-function ListeningSection({ section, handleAnswerChange, level }: { section: any, handleAnswerChange: (key: string, value: string) => void, level: string }) {
+function ListeningSection({ section, answers, handleAnswerChange, level }: { section: any, answers: Record<string, string>, handleAnswerChange: (key: string, value: string) => void, level: string }) {
   const [isPlaying, setIsPlaying] = useState(false)
   const [hasPlayed, setHasPlayed] = useState(false)
   const [currentUtterance, setCurrentUtterance] = useState<SpeechSynthesisUtterance | null>(null)
@@ -133,6 +133,7 @@ function ListeningSection({ section, handleAnswerChange, level }: { section: any
                       type="radio"
                       name={`listening_s${section.id}_q${q.id}`}
                       value={opt.split('.')[0].trim()}
+                      checked={answers[`listening_s${section.id}_q${q.id}`] === opt.split('.')[0].trim()}
                       onChange={(e) => handleAnswerChange(`listening_s${section.id}_q${q.id}`, e.target.value)}
                       className="mr-2"
                     />
@@ -145,6 +146,7 @@ function ListeningSection({ section, handleAnswerChange, level }: { section: any
                 type="text"
                 className="w-full border rounded px-3 py-2 mt-2"
                 placeholder="Nhập câu trả lời..."
+                value={answers[`listening_s${section.id}_q${q.id}`] ?? ''}
                 onChange={(e) => handleAnswerChange(`listening_s${section.id}_q${q.id}`, e.target.value)}
               />
             )}
@@ -167,6 +169,11 @@ export default function TestPage() {
   const [answers, setAnswers] = useState<any>({})
   const [loading, setLoading] = useState(true)
   const [submitting, setSubmitting] = useState(false)
+  // Content is still being generated section by section
+  const [streaming, setStreaming] = useState(false)
+  // Answers changed since the last autosave
+  const pendingAnswers = useRef<Record<string, any>>({})
+  const autosaving = useRef<Promise<void> | null>(null)
 
   useEffect(() => {
     if (!sessionId) {
@@ -179,33 +186,34 @@ export default function TestPage() {
       const currentPhase = phaseParam ? parseInt(phaseParam) : 1
       try {
         console.log(`Loading session ${sessionId} for phase ${currentPhase}`)
-        const sessionData = await apiClient.getSession(parseInt(sessionId))
+        const sessionData = await apiClient.getSessionSummary(parseInt(sessionId))
         setSession(sessionData)
 
-        // Generate content if not exists
-        if (currentPhase === 1 && !sessionData.phase1_content) {
-          console.log('Generating phase 1 content...')
-          await apiClient.generatePhase(parseInt(sessionId))
-          const updated = await apiClient.getSession(parseInt(sessionId))
-          setSession(updated)
-          setContent(updated.phase1_content)
-        } else if (currentPhase === 1 && sessionData.phase1_content) {
-          console.log('Phase 1 content already exists, loading...')
-          setContent(sessionData.phase1_content)
-        } else if (currentPhase === 2 && !sessionData.phase2_content) {
-          console.log('Generating phase 2 content...')
-          await apiClient.generatePhase2(parseInt(sessionId))
-          const updated = await apiClient.getSession(parseInt(sessionId))
-          setSession(updated)
-          setContent(updated.phase2_content)
-        } else if (currentPhase === 2 && sessionData.phase2_content) {
-          console.log('Phase 2 content already exists, loading...')
-          setContent(sessionData.phase2_content)
+        const contentHash = currentPhase === 1 ? sessionData.phase1_content_hash : sessionData.phase2_content_hash
+        if (contentHash) {
+          console.log(`Phase ${currentPhase} content already exists, loading...`)
+          setContent(await apiClient.getPhaseContent(parseInt(sessionId), currentPhase === 1 ? 1 : 2))
+        } else {
+          // Show each section as soon as it is generated instead of waiting for the whole test
+          console.log(`Generating phase ${currentPhase} content (stream)...`)
+          setStreaming(true)
+          await apiClient.streamPhase(parseInt(sessionId), currentPhase === 1 ? 1 : 2, (partial) => {
+            setContent({ ...partial })
+            setLoading(false)
+          })
+          // Stored now: load it whole (fields outside the streamed sections included)
+          setContent(await apiClient.getPhaseContent(parseInt(sessionId), currentPhase === 1 ? 1 : 2))
+          setStreaming(false)
         }
 
+        // Restore answers autosaved before a reload (keeping any typed while the content streamed)
+        const saved = await apiClient.getAnswers(parseInt(sessionId), currentPhase === 1 ? 1 : 2)
+        setAnswers((current: any) => ({ ...saved, ...current }))
         setLoading(false)
       } catch (error) {
         console.error('Error loading session:', error)
+        setContent(null)
+        setStreaming(false)
         setLoading(false)
       }
     }
@@ -214,12 +222,56 @@ export default function TestPage() {
     setLoading(true)
     setContent(null)
     setAnswers({})
+    pendingAnswers.current = {}
     setSubmitting(false)  // Reset submitting state when phase changes
+    setStreaming(false)
     loadSession()
   }, [sessionId, phaseParam, router])
 
+  const takePendingAnswers = () => {
+    const delta = pendingAnswers.current
+    pendingAnswers.current = {}
+    return delta
+  }
+
+  // Autosave changed answers every few seconds
+  useEffect(() => {
+    if (!sessionId || submitting) return
+    const timer = setInterval(() => {
+      const delta = takePendingAnswers()
+      if (autosaving.current || Object.keys(delta).length === 0) {
+        pendingAnswers.current = { ...delta, ...pendingAnswers.current }
+        return
+      }
+      autosaving.current = apiClient
+        .saveAnswers(parseInt(sessionId), phase === 1 ? 1 : 2, delta)
+        .catch((error) => {
+          console.error('Autosave failed, retrying:', error)
+          // Keep edits made since then, re-send the rest
+          pendingAnswers.current = { ...delta, ...pendingAnswers.current }
+        })
+        .finally(() => {
+          autosaving.current = null
+        })
+    }, 3000)
+    return () => clearInterval(timer)
+  }, [sessionId, phase, submitting])
+
   const handleAnswerChange = (key: string, value: string) => {
-    setAnswers({ ...answers, [key]: value })
+    // Functional update: inputs are controlled, so a stale `answers` would drop keystrokes
+    setAnswers((current: any) => ({ ...current, [key]: value }))
+    pendingAnswers.current[key] = value
+  }
+
+  // Submit the unsaved answers with the phase; if the request fails they stay pending for the retry
+  const submitPendingAnswers = async (submit: typeof apiClient.submitPhase1) => {
+    const delta = takePendingAnswers()
+    try {
+      return await submit(parseInt(sessionId!), delta)
+    } catch (error) {
+      pendingAnswers.current = { ...delta, ...pendingAnswers.current }
+      throw error
+    }
   }
 
   const handleSubmit = async () => {
@@ -227,19 +279,23 @@ export default function TestPage() {
     setSubmitting(true)
 
     try {
+      // Let a running autosave finish; a failed one puts its answers back into pending
+      await autosaving.current
       if (phase === 1) {
         console.log('Submitting phase 1...')
-        const result = await apiClient.submitPhase1(parseInt(sessionId), answers)
-        console.log('Phase 1 submitted successfully:', result)
+        const job = await submitPendingAnswers(apiClient.submitPhase1)
+        await apiClient.waitForJob(job.id)
+        console.log('Phase 1 scored successfully:', job)
         // Reset submitting before navigation
         setSubmitting(false)
         // Move to phase 2
         router.push(`/test?sessionId=${sessionId}&phase=2`)
       } else {
         console.log('Submitting phase 2...')
-        await apiClient.submitPhase2(parseInt(sessionId), answers)
-        console.log('Phase 2 submitted, aggregating results...')
-        // Aggregate and show results
+        const job = await submitPendingAnswers(apiClient.submitPhase2)
+        await apiClient.waitForJob(job.id)
+        console.log('Phase 2 scored, aggregating results...')
+        // Band scores are ready now; the results page waits for the detailed analysis
         await apiClient.aggregateResults(parseInt(sessionId))
         setSubmitting(false)
         router.push(`/results?sessionId=${sessionId}`)
@@ -293,6 +349,7 @@ export default function TestPage() {
               <ListeningSection
                 key={section.id}
                 section={section}
+                answers={answers}
                 handleAnswerChange={handleAnswerChange}
                 level={session?.level || 'intermediate'}
               />
@@ -320,6 +377,7 @@ export default function TestPage() {
                                 type="radio"
                                 name={`reading_p${passage.id}_q${q.id}`}
                                 value={opt.split('.')[0].trim()}
+                                checked={answers[`reading_p${passage.id}_q${q.id}`] === opt.split('.')[0].trim()}
                                 onChange={(e) => handleAnswerChange(`reading_p${passage.id}_q${q.id}`, e.target.value)}
                                 className="mr-2"
                               />
@@ -332,6 +390,7 @@ export default function TestPage() {
                           type="text"
                           className="w-full border rounded px-3 py-2 mt-2"
                           placeholder="Nhập câu trả lời..."
+                          value={answers[`reading_p${passage.id}_q${q.id}`] ?? ''}
                           onChange={(e) => handleAnswerChange(`reading_p${passage.id}_q${q.id}`, e.target.value)}
                         />
                       )}
@@ -388,6 +447,7 @@ export default function TestPage() {
                   className="w-full border rounded px-3 py-2"
                   rows={8}
                   placeholder={`Viết ${content.writing.task1.word_count} từ...`}
+                  value={answers['writing_task1'] ?? ''}
                   onChange={(e) => handleAnswerChange('writing_task1', e.target.value)}
                 />
                 <div className="text-sm text-gray-500 mt-2">
@@ -408,6 +468,7 @@ export default function TestPage() {
                   className="w-full border rounded px-3 py-2"
                   rows={10}
                   placeholder={`Viết ${content.writing.task2.word_count} từ...`}
+                  value={answers['writing_task2'] ?? ''}
                   onChange={(e) => handleAnswerChange('writing_task2', e.target.value)}
                 />
                 <div className="text-sm text-gray-500 mt-2">
@@ -422,13 +483,13 @@ export default function TestPage() {
         <div className="text-center py-6">
           <button
             onClick={handleSubmit}
-            disabled={submitting}
-            className={`px-8 py-3 rounded-lg text-lg font-semibold transition ${submitting
+            disabled={submitting || streaming}
+            className={`px-8 py-3 rounded-lg text-lg font-semibold transition ${submitting || streaming
               ? 'bg-gray-300 text-gray-500 cursor-not-allowed'
               : 'bg-green-600 text-white hover:bg-green-700'
               }`}
           >
-            {submitting ? 'Đang xử lý...' : phase === 1 ? 'Nộp bài và tiếp tục →' : 'Nộp bài và xem kết quả →'}
+            {submitting ? 'Đang xử lý...' : streaming ? 'Đang tạo đề...' : phase === 1 ? 'Nộp bài và tiếp tục →' : 'Nộp bài và xem kết quả →'}
           </button>
         </div>
       </div>
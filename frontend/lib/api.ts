@@ -31,6 +31,57 @@ export interface SessionResponse {
   updated_at: string | null
 }
 
+// SessionResponse without test content (fetch it with getPhaseContent, cached by the browser)
+export interface SessionSummary {
+  id: number
+  level: string
+  selected_phase: string | null
+  status: string
+  phase1_content_hash: string | null
+  phase2_content_hash: string | null
+  phase1_scores: any
+  phase2_scores: any
+  final_results: any
+  created_at: string
+  updated_at: string | null
+}
+
+export interface JobResponse {
+  id: number
+  session_id: number
+  kind: 'score_phase1' | 'score_phase2' | 'aggregate' | 'analysis' | 'generate_phase2'
+  status: 'queued' | 'running' | 'succeeded' | 'failed'
+  attempts: number
+  error: string | null
+  created_at: string
+  started_at: string | null
+  finished_at: string | null
+}
+
+export interface AnalysisStatus {
+  session_id: number
+  status: 'pending' | 'ready' | 'failed'
+  job_id: number | null
+  detailed_analysis: any
+}
+
+export interface ContentSection {
+  path: string // e.g. "listening.sections.0", "speaking.part2"
+  data: any
+}
+
+// Set a dotted section path inside partially built content (numeric parts are array indexes)
+const setPath = (target: any, path: string[], value: any) => {
+  let node = target
+  path.slice(0, -1).forEach((key, i) => {
+    if (node[key] === undefined) node[key] = /^\d+$/.test(path[i + 1]) ? [] : {}
+    node = node[key]
+  })
+  node[path[path.length - 1]] = value
+}
+
+const isJobFinished = (job: JobResponse) => job.status === 'succeeded' || job.status === 'failed'
+
 export const apiClient = {
   // Create session
   createSession: async (data: SessionCreate): Promise<SessionResponse> => {
@@ -50,20 +101,69 @@ export const apiClient = {
     return response.data
   },
 
+  // Generate phase content as a stream: onContent gets the partially built content after each section
+  streamPhase: (
+    sessionId: number,
+    phase: 1 | 2,
+    onContent: (content: any, section: ContentSection) => void
+  ): Promise<any> =>
+    new Promise((resolve, reject) => {
+      const content: any = {}
+      const source = new EventSource(`${API_URL}/api/sessions/${sessionId}/generate/stream?phase=${phase}`)
+      source.addEventListener('section', (event) => {
+        const section: ContentSection = JSON.parse((event as MessageEvent).data)
+        setPath(content, section.path.split('.'), section.data)
+        onContent(content, section)
+      })
+      source.addEventListener('complete', () => {
+        source.close()
+        resolve(content)
+      })
+      source.addEventListener('error', (event) => {
+        source.close()
+        const data = (event as MessageEvent).data
+        reject(new Error(data ? JSON.parse(data).detail : 'Content stream failed'))
+      })
+    }),
+
   // Get session
   getSession: async (sessionId: number): Promise<SessionResponse> => {
     const response = await api.get(`/api/sessions/${sessionId}`)
     return response.data
   },
 
+  // Get session without test content
+  getSessionSummary: async (sessionId: number): Promise<SessionSummary> => {
+    const response = await api.get(`/api/sessions/${sessionId}/summary`)
+    return response.data
+  },
+
+  // Get phase content (immutable; repeat loads are answered from the HTTP cache or with 304)
+  getPhaseContent: async (sessionId: number, phase: 1 | 2): Promise<any> => {
+    const response = await api.get(`/api/sessions/${sessionId}/content/${phase}`)
+    return response.data
+  },
+
   // Start phase 1
   startPhase1: async (sessionId: number) => {
     const response = await api.post(`/api/sessions/${sessionId}/start-phase1`)
     return response.data
   },
 
-  // Submit phase 1
-  submitPhase1: async (sessionId: number, answers: any): Promise<SessionResponse> => {
+  // Autosave: send only the answers changed since the last save (null removes an answer)
+  saveAnswers: async (sessionId: number, phase: 1 | 2, answers: Record<string, any>) => {
+    const response = await api.patch(`/api/sessions/${sessionId}/answers`, { phase, answers })
+    return response.data
+  },
+
+  // Get autosaved answers (restore after a reload)
+  getAnswers: async (sessionId: number, phase: 1 | 2): Promise<Record<string, any>> => {
+    const response = await api.get(`/api/sessions/${sessionId}/answers/${phase}`)
+    return response.data
+  },
+
+  // Submit phase 1: scores the stored answers plus any not autosaved yet (background job)
+  submitPhase1: async (sessionId: number, answers: Record<string, any> = {}): Promise<JobResponse> => {
     const response = await api.post(`/api/sessions/${sessionId}/submit-phase1`, { answers })
     return response.data
   },
@@ -80,23 +180,75 @@ export const apiClient = {
     return response.data
   },
 
-  // Submit phase 2
-  submitPhase2: async (sessionId: number, answers: any): Promise<SessionResponse> => {
+  // Submit phase 2: scores the stored answers plus any not autosaved yet (background job)
+  submitPhase2: async (sessionId: number, answers: Record<string, any> = {}): Promise<JobResponse> => {
     const response = await api.post(`/api/sessions/${sessionId}/submit-phase2`, { answers })
     return response.data
   },
 
-  // Aggregate results
+  // Aggregate results: band scores right away (detailed analysis runs in a background job)
   aggregateResults: async (sessionId: number): Promise<SessionResponse> => {
     const response = await api.post(`/api/sessions/${sessionId}/aggregate`)
     return response.data
   },
 
-  // Generate detailed analysis (optional, now included in aggregate)
-  generateAnalysis: async (sessionId: number): Promise<SessionResponse> => {
+  // Whether the detailed analysis is ready (does not start any generation)
+  getAnalysisStatus: async (sessionId: number): Promise<AnalysisStatus> => {
+    const response = await api.get(`/api/sessions/${sessionId}/generate-analysis`)
+    return response.data
+  },
+
+  // Queue the detailed analysis if the session has no analysis job yet
+  requestAnalysis: async (sessionId: number): Promise<AnalysisStatus> => {
     const response = await api.post(`/api/sessions/${sessionId}/generate-analysis`)
     return response.data
   },
+
+  // Get background job status
+  getJob: async (jobId: number): Promise<JobResponse> => {
+    const response = await api.get(`/api/jobs/${jobId}`)
+    return response.data
+  },
+
+  // Wait until a background job finishes: listens to the SSE stream, falls back to polling
+  waitForJob: (jobId: number): Promise<JobResponse> =>
+    new Promise((resolve, reject) => {
+      let done = false
+      const finish = (job: JobResponse) => {
+        if (done) return
+        done = true
+        if (job.status === 'succeeded') resolve(job)
+        else reject(new Error(job.error || 'Job failed'))
+      }
+      const poll = async () => {
+        if (done) return
+        try {
+          const job = await apiClient.getJob(jobId)
+          if (isJobFinished(job)) finish(job)
+          else setTimeout(poll, 1000)
+        } catch (error) {
+          done = true
+          reject(error)
+        }
+      }
+
+      if (typeof EventSource === 'undefined') {
+        poll()
+        return
+      }
+      const source = new EventSource(`${API_URL}/api/jobs/${jobId}/events`)
+      source.addEventListener('status', (event) => {
+        const job: JobResponse = JSON.parse((event as MessageEvent).data)
+        if (isJobFinished(job)) {
+          source.close()
+          finish(job)
+        }
+      })
+      source.onerror = () => {
+        source.close()
+        poll()
+      }
+    }),
 }
 
 export default apiClient